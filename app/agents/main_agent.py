@@ -60,54 +60,152 @@
 # app/agents/main_agent.py
 from __future__ import annotations
 
+import asyncio
+import contextvars
 import json
-from typing import Optional, Tuple
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
 
-from langchain_core.prompts import ChatPromptTemplate
-from langchain.agents import AgentExecutor, create_tool_calling_agent
-from langchain_core.runnables.history import RunnableWithMessageHistory
-from langchain_community.chat_message_histories import ChatMessageHistory
-from langchain_core.chat_history import BaseChatMessageHistory
+from . import prompt_cache
+from .session_store import SessionStore
+from ..config import (CHAT_SESSION_TTL_S, CHAT_MAX_SESSIONS, CHAT_HISTORY_MAX_TOKENS, CHAT_HISTORY_SUMMARIZE,
+                      AGENT_TOOL_MAX_WORKERS)
+from ..llm_model.llm_model import get_llm
+from ..tools.metrics import LLM_TOKENS, STAGE_SECONDS
 
-from langchain_core.tools import Tool
-from ..llm_model.llm_model import llm
-from ..tools.fleet_tools import plan_route_to_csv
+if TYPE_CHECKING:
+    from langchain.agents import AgentExecutor
+    from langchain_core.callbacks import BaseCallbackHandler
+    from langchain_core.chat_history import BaseChatMessageHistory
+    from langchain_core.messages import BaseMessage
+    from langchain_core.runnables.history import RunnableWithMessageHistory
 
 # System prompt: hard-nudge the LLM to actually CALL the tool.
 SYSTEM = (
     "You are a helpful, concise assistant for a fleet simulator.\n"
     "When the user asks to generate or update telemetry/CSV, you MUST call the tool `plan_route_to_csv` "
     "with sensible defaults (6-hour duty) unless the user provides specific values.\n"
+    "For several vehicles or trips at once, call `plan_fleet_batch_to_csv` with one spec per trip instead.\n"
+    "For one trip with stops on the way, pass the stops in order as `waypoints` of a single `plan_route_to_csv` call.\n"
     "After using the tool, briefly summarize and include the CSV path. "
     "Avoid long prose; prefer the tool."
 )
 
-prompt = ChatPromptTemplate.from_messages([
-    ("system", SYSTEM),
-    ("placeholder", "{chat_history}"),
-    ("user", "{input}"),
-    ("placeholder", "{agent_scratchpad}")
-])
-
-tools = [plan_route_to_csv]
-agent = create_tool_calling_agent(llm=llm, tools=tools, prompt=prompt)
-
-# IMPORTANT: return_intermediate_steps=True to capture tool outputs
-agent_executor = AgentExecutor(
-    agent=agent,
-    tools=tools,
-    verbose=True,
-    handle_parsing_errors=True,
-    return_intermediate_steps=True,
+_executor: Optional[AgentExecutor] = None
+_executor_lock = threading.Lock()
+_tool_pool: Optional[ThreadPoolExecutor] = None
+_tool_pool_lock = threading.Lock()
+_aslots: Tuple = (None, None)   # (event loop, semaphore) for async tool calls
+
+def _get_tool_pool() -> ThreadPoolExecutor:
+    # Shared by every agent turn, so concurrent requests can't multiply the tool workers.
+    global _tool_pool
+    with _tool_pool_lock:
+        if _tool_pool is None:
+            _tool_pool = ThreadPoolExecutor(max_workers=AGENT_TOOL_MAX_WORKERS, thread_name_prefix="agent-tool")
+        return _tool_pool
+
+def _async_tool_slots() -> asyncio.Semaphore:
+    # asyncio primitives belong to one loop; recreate if called from a new one (e.g. repeated asyncio.run).
+    global _aslots
+    loop = asyncio.get_running_loop()
+    if _aslots[0] is not loop:
+        _aslots = (loop, asyncio.Semaphore(AGENT_TOOL_MAX_WORKERS))
+    return _aslots[1]
+
+@lru_cache(maxsize=None)
+def _parallel_executor_class():
+    from langchain.agents import AgentExecutor
+
+    class ParallelAgentExecutor(AgentExecutor):
+        """
+        AgentExecutor that runs the tool calls of one model turn concurrently,
+        at most AGENT_TOOL_MAX_WORKERS at a time; steps keep the model's order.
+        """
+
+        def _perform_agent_action(self, name_to_tool_map, color_mapping, agent_action, run_manager=None):
+            # Started here, awaited in _iter_next_step once every call of the turn is submitted.
+            ctx = contextvars.copy_context()
+            return _get_tool_pool().submit(ctx.run, super()._perform_agent_action, name_to_tool_map,
+                                           color_mapping, agent_action, run_manager)
+
+        def _iter_next_step(self, *args, **kwargs):
+            items = list(super()._iter_next_step(*args, **kwargs))
+            for item in items:
+                yield item.result() if isinstance(item, Future) else item
+
+        async def _aperform_agent_action(self, *args, **kwargs):
+            # The base class already gathers a turn's calls; bound how many run at once.
+            async with _async_tool_slots():
+                return await super()._aperform_agent_action(*args, **kwargs)
+
+    return ParallelAgentExecutor
+
+def get_agent_executor() -> AgentExecutor:
+    """Build the prompt, agent and executor on first use (imports langchain and the LLM provider)."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            from langchain.agents import create_tool_calling_agent
+            from langchain_core.prompts import ChatPromptTemplate
+            from ..tools.fleet_tools import plan_route_to_csv, plan_fleet_batch_to_csv
+
+            prompt = ChatPromptTemplate.from_messages([
+                ("system", SYSTEM),
+                ("placeholder", "{chat_history}"),
+                ("user", "{input}"),
+                ("placeholder", "{agent_scratchpad}")
+            ])
+
+            tools = [plan_route_to_csv, plan_fleet_batch_to_csv]
+            agent = create_tool_calling_agent(llm=get_llm(), tools=tools, prompt=prompt)
+
+            # IMPORTANT: return_intermediate_steps=True to capture tool outputs
+            _executor = _parallel_executor_class()(
+                agent=agent,
+                tools=tools,
+                verbose=True,
+                handle_parsing_errors=True,
+                return_intermediate_steps=True,
+            )
+        return _executor
+
+SUMMARY_PROMPT = (
+    "Summarize this conversation between a user and a fleet simulator assistant in at most 120 words. "
+    "Keep places, vehicle/trip IDs, parameters and output file paths; drop pleasantries."
 )
 
-# Simple in-memory chat store
-_store = {}
+def _summarize_history(messages: List[BaseMessage]) -> str:
+    from langchain_core.messages import HumanMessage, SystemMessage
+    transcript = "\n".join(f"{m.type}: {m.content}" for m in messages)
+    t0 = time.perf_counter()
+    summary = get_llm().invoke([SystemMessage(content=SUMMARY_PROMPT), HumanMessage(content=transcript)])
+    STAGE_SECONDS.observe(time.perf_counter() - t0, stage="history_summary")
+    return summary.content
+
+# Per-client chat histories, bounded by idle TTL, session count and a token budget per session.
+chat_sessions = SessionStore(CHAT_SESSION_TTL_S, CHAT_MAX_SESSIONS, CHAT_HISTORY_MAX_TOKENS,
+                             summarize=_summarize_history if CHAT_HISTORY_SUMMARIZE else None)
 
 def _get_history(session_id: str) -> BaseChatMessageHistory:
-    if session_id not in _store:
-        _store[session_id] = ChatMessageHistory()
-    return _store[session_id]
+    return chat_sessions.get(session_id)
+
+
+def _extract_tool_results(result_dict) -> List[dict]:
+    """Every generation tool output of the turn, parsed, in the order the model called them."""
+    results = []
+    for action, output in result_dict.get("intermediate_steps") or []:
+        if getattr(action, "tool", "") in ("plan_route_to_csv", "plan_fleet_batch_to_csv") and isinstance(output, str):
+            try:
+                j = json.loads(output)
+            except Exception:
+                continue
+            if isinstance(j, dict) and j.get("ok") is not None:
+                results.append(j)
+    return results
 
 
 def _extract_tool_json(result_dict) -> Optional[dict]:
@@ -119,7 +217,7 @@ def _extract_tool_json(result_dict) -> Optional[dict]:
     steps = result_dict.get("intermediate_steps") or []
     for action, output in reversed(steps):
         try:
-            if getattr(action, "tool", "") == "plan_route_to_csv" and isinstance(output, str):
+            if getattr(action, "tool", "") in ("plan_route_to_csv", "plan_fleet_batch_to_csv") and isinstance(output, str):
                 j = json.loads(output)
                 if isinstance(j, dict) and j.get("ok") is not None:
                     return j
@@ -139,22 +237,173 @@ def _extract_tool_json(result_dict) -> Optional[dict]:
     return None
 
 
-def run_general_chat_agent(user_input: str, session_id: str = "default"):
-    with_history = RunnableWithMessageHistory(
-        agent_executor,
+def _with_history(session_id: str) -> RunnableWithMessageHistory:
+    from langchain_core.runnables.history import RunnableWithMessageHistory
+    return RunnableWithMessageHistory(
+        get_agent_executor(),
         lambda: _get_history(session_id),
         input_messages_key="input",
         history_messages_key="chat_history",
     )
-    result = with_history.invoke(
-        {"input": user_input},
-        config={"configurable": {"session_id": session_id}},
-    )
 
+
+def _token_usage(response) -> Tuple[int, int]:
+    # Chat models report usage_metadata on the message; older integrations use llm_output["token_usage"].
+    inp = out = 0
+    for gens in response.generations:
+        for g in gens:
+            usage = getattr(getattr(g, "message", None), "usage_metadata", None) or {}
+            inp += usage.get("input_tokens", 0)
+            out += usage.get("output_tokens", 0)
+    if not (inp or out):
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        inp, out = usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+    return inp, out
+
+
+@lru_cache(maxsize=None)
+def _usage_handler_class():
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class LLMUsageHandler(BaseCallbackHandler):
+        """Span per LLM call of one agent turn: duration and token counts, also sent to the metrics."""
+        run_inline = True
+
+        def __init__(self):
+            self._started: Dict = {}
+            self.usage = {"llm_calls": 0, "llm_s": 0.0, "input_tokens": 0, "output_tokens": 0}
+
+        def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+            self._started[run_id] = time.perf_counter()
+
+        def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+            self._started[run_id] = time.perf_counter()
+
+        def _end(self, run_id) -> None:
+            t0 = self._started.pop(run_id, None)
+            if t0 is None:
+                return
+            seconds = time.perf_counter() - t0
+            STAGE_SECONDS.observe(seconds, stage="llm")
+            self.usage["llm_calls"] += 1
+            self.usage["llm_s"] = round(self.usage["llm_s"] + seconds, 4)
+
+        def on_llm_end(self, response, *, run_id, **kwargs):
+            self._end(run_id)
+            inp, out = _token_usage(response)
+            LLM_TOKENS.inc(inp, kind="input")
+            LLM_TOKENS.inc(out, kind="output")
+            self.usage["input_tokens"] += inp
+            self.usage["output_tokens"] += out
+
+        def on_llm_error(self, error, *, run_id, **kwargs):
+            self._end(run_id)
+
+    return LLMUsageHandler
+
+
+def _agent_response(result, usage: Optional[Dict] = None) -> dict:
     # Final text to show the user
     final_text = result.get("output") if isinstance(result, dict) else result
 
-    # Structured tool output (JSON) for the UI
+    # Structured tool output (JSON) for the UI: the last call, and all of them
     tool_json = _extract_tool_json(result if isinstance(result, dict) else {})
+    tool_results = _extract_tool_results(result if isinstance(result, dict) else {})
+
+    return {"response": final_text, "tool_result": tool_json, "tool_results": tool_results, "usage": usage}
+
+
+def _run_config(session_id: str) -> Tuple[dict, "BaseCallbackHandler"]:
+    handler = _usage_handler_class()()
+    return {"configurable": {"session_id": session_id}, "callbacks": [handler]}, handler
+
+
+def _agent_input(user_input: str, params: Optional[Dict]) -> str:
+    return f"{user_input}\n\nParams: {json.dumps(params)}" if params else user_input
+
+
+def _prompt_cache_key(user_input: str, params: Optional[Dict], session_id: str) -> Optional[str]:
+    # Only context-free turns are cached: a fresh session, or a request carrying explicit params.
+    if not prompt_cache.enabled():
+        return None
+    if not params and _get_history(session_id).messages:
+        return None
+    return prompt_cache.prompt_cache_key(user_input, params)
+
+
+def _cacheable_tools() -> dict:
+    from ..tools.fleet_tools import plan_route_to_csv, plan_fleet_batch_to_csv
+    return {t.name: t for t in (plan_route_to_csv, plan_fleet_batch_to_csv)}
+
+
+def _replayed_turn(agent_input: str, session_id: str, calls: List[Dict], outputs: List[str], t0: float) -> dict:
+    # Answer like the agent would have, and keep the session's history consistent with it.
+    from langchain_core.messages import AIMessage, HumanMessage
+    results = [json.loads(out) for out in outputs]
+    text = "\n\n".join(prompt_cache.summarize(c["tool"], r) for c, r in zip(calls, results))
+    _get_history(session_id).add_messages([HumanMessage(content=agent_input), AIMessage(content=text)])
+    STAGE_SECONDS.observe(time.perf_counter() - t0, stage="agent_replay")
+    usage = {"llm_calls": 0, "llm_s": 0.0, "input_tokens": 0, "output_tokens": 0, "prompt_cache": "hit"}
+    return {"response": text, "tool_result": results[-1], "tool_results": results, "usage": usage}
+
+
+def _remember_calls(key: Optional[str], result, usage: Dict) -> None:
+    if key is None:
+        return
+    calls = prompt_cache.tool_calls_from_steps(result.get("intermediate_steps") if isinstance(result, dict) else None)
+    if calls:
+        prompt_cache.put(key, calls)
+    usage["prompt_cache"] = "miss"
+
+
+def run_general_chat_agent(user_input: str, session_id: str = "default", params: Optional[Dict] = None):
+    """
+    Run one agent turn; `usage` reports the turn's LLM calls, LLM seconds and token counts.
+
+    `params` (structured request fields) are appended to the prompt. With the
+    prompt cache enabled, a repeat of a context-free request replays the
+    tool calls the agent made for it last time, without calling the LLM.
+    """
+    agent_input = _agent_input(user_input, params)
+    t0 = time.perf_counter()
+    key = _prompt_cache_key(user_input, params, session_id)
+    calls = prompt_cache.get(key) if key else None
+    if calls:
+        tools = _cacheable_tools()
+        outputs = list(_get_tool_pool().map(lambda c: tools[c["tool"]].invoke(c["args"]), calls))
+        response = _replayed_turn(agent_input, session_id, calls, outputs, t0)
+        chat_sessions.compact(session_id)
+        return response
+
+    config, handler = _run_config(session_id)
+    result = _with_history(session_id).invoke({"input": agent_input}, config=config)
+    STAGE_SECONDS.observe(time.perf_counter() - t0, stage="agent")
+    _remember_calls(key, result, handler.usage)
+    chat_sessions.compact(session_id)
+    return _agent_response(result, handler.usage)
+
+
+async def arun_general_chat_agent(user_input: str, session_id: str = "default", params: Optional[Dict] = None):
+    """Async variant: LLM calls and tools (geocode/route/simulate) run without blocking the loop."""
+    agent_input = _agent_input(user_input, params)
+    t0 = time.perf_counter()
+    key = _prompt_cache_key(user_input, params, session_id)
+    calls = await asyncio.to_thread(prompt_cache.get, key) if key else None
+    if calls:
+        tools = _cacheable_tools()
+
+        async def call(c: Dict) -> str:
+            async with _async_tool_slots():
+                return await tools[c["tool"]].ainvoke(c["args"])
+        outputs = await asyncio.gather(*(call(c) for c in calls))
+        response = _replayed_turn(agent_input, session_id, calls, outputs, t0)
+        await asyncio.to_thread(chat_sessions.compact, session_id)
+        return response
 
-    return {"response": final_text, "tool_result": tool_json}
+    config, handler = _run_config(session_id)
+    result = await _with_history(session_id).ainvoke({"input": agent_input}, config=config)
+    STAGE_SECONDS.observe(time.perf_counter() - t0, stage="agent")
+    await asyncio.to_thread(_remember_calls, key, result, handler.usage)
+    # may summarize with the LLM; keep it off the event loop
+    await asyncio.to_thread(chat_sessions.compact, session_id)
+    return _agent_response(result, handler.usage)
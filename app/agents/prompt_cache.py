@@ -0,0 +1,75 @@
+"""Opt-in cache in front of the agent: repeat prompts replay the tool calls without the LLM.
+
+A miss runs the agent as usual and remembers the tool calls it resolved
+(tool name + arguments). A hit re-runs those calls directly -- the route and
+simulation caches make that fast -- and answers with a templated summary.
+"""
+import hashlib
+import json
+from typing import Dict, List, Optional
+
+from ..config import CACHE_DB_PATH, PROMPT_CACHE_MAX_ENTRIES, PROMPT_CACHE_TTL_S
+from ..tools.cache import PersistentCache
+
+# Bump when the agent's prompt or tools change in a way that would resolve calls differently.
+PROMPT_CACHE_VERSION = 2
+
+CACHEABLE_TOOLS = ("plan_route_to_csv", "plan_fleet_batch_to_csv")
+
+response_cache = PersistentCache(CACHE_DB_PATH, "prompt", ttl_s=PROMPT_CACHE_TTL_S,
+                                 max_entries=max(1, PROMPT_CACHE_MAX_ENTRIES), memory_entries=256)
+
+
+def enabled() -> bool:
+    return PROMPT_CACHE_MAX_ENTRIES > 0
+
+
+def _normalize_prompt(prompt: str) -> str:
+    # Case, spacing and trailing punctuation don't change what the user asked for.
+    return " ".join(prompt.lower().split()).rstrip(" .!?")
+
+
+def prompt_cache_key(prompt: str, params: Optional[Dict] = None) -> str:
+    payload = json.dumps([PROMPT_CACHE_VERSION, _normalize_prompt(prompt), params or {}],
+                         sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def tool_calls_from_steps(steps) -> Optional[List[Dict]]:
+    """The (tool, args) calls of one agent turn, or None if the turn isn't worth caching."""
+    calls = []
+    for action, output in steps or []:
+        tool = getattr(action, "tool", "")
+        args = getattr(action, "tool_input", None)
+        if tool not in CACHEABLE_TOOLS or not isinstance(args, dict):
+            return None
+        try:
+            if not json.loads(output).get("ok"):
+                return None   # don't pin failures (e.g. a geocoder outage)
+        except Exception:
+            return None
+        calls.append({"tool": tool, "args": args})
+    return calls or None
+
+
+def get(key: str) -> Optional[List[Dict]]:
+    raw = response_cache.get(key)
+    return json.loads(raw) if raw is not None else None
+
+
+def put(key: str, calls: List[Dict]) -> None:
+    response_cache.set(key, json.dumps(calls).encode("utf-8"))
+
+
+def summarize(tool: str, result: Dict) -> str:
+    """Templated stand-in for the LLM's closing summary of a tool result."""
+    if not result.get("ok"):
+        return result.get("message", "Generation failed.")
+    meta = result.get("meta") or {}
+    if tool == "plan_fleet_batch_to_csv":
+        totals = meta.get("totals", {})
+        paths = [t["path"] for t in meta.get("trips", []) if t.get("ok")]
+        return (f"{result['message']}: {totals.get('rows', 0)} rows over {totals.get('distance_km', 0)} km.\n"
+                + "\n".join(f"- {p}" for p in paths))
+    return (f"{result['message']}: {meta.get('rows')} rows, {meta.get('distance_km')} km over "
+            f"{meta.get('days')} day(s), {meta.get('fuel_used_l')} l fuel.\nFile: {result.get('path')}")
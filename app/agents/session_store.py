@@ -0,0 +1,161 @@
+"""Bounded in-memory chat histories for the agent, one per client session."""
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from langchain_core.chat_history import BaseChatMessageHistory
+    from langchain_core.messages import BaseMessage
+
+
+@lru_cache(maxsize=None)
+def _history_class() -> type:
+    from langchain_core.chat_history import InMemoryChatMessageHistory
+    from pydantic import PrivateAttr
+
+    class LockedChatMessageHistory(InMemoryChatMessageHistory):
+        """In-memory history whose writes hold `lock`, the lock `SessionStore.compact` rewrites it under."""
+
+        _lock: Any = PrivateAttr(default_factory=threading.RLock)
+
+        @property
+        def lock(self) -> threading.RLock:
+            return self._lock
+
+        def add_message(self, message: BaseMessage) -> None:
+            with self._lock:
+                super().add_message(message)
+
+        def add_messages(self, messages) -> None:
+            with self._lock:
+                super().add_messages(messages)
+
+        def clear(self) -> None:
+            with self._lock:
+                super().clear()
+
+    return LockedChatMessageHistory
+
+
+class SessionStore:
+    """
+    Chat histories keyed by session ID, bounded in count, age and size.
+
+    Sessions idle for more than `ttl_s` expire, and beyond `max_sessions` the
+    least recently used one is dropped. `compact` (run after each turn) keeps
+    a session under `max_tokens` (approximate count): the oldest turns are
+    dropped, or, with a `summarize` callable, folded into one summary turn at
+    the head of the history. Prompt size then stays flat however long a
+    session or deployment runs.
+    """
+
+    def __init__(self, ttl_s: float, max_sessions: int, max_tokens: int,
+                 summarize: Optional[Callable[[List[BaseMessage]], str]] = None):
+        self.ttl_s = ttl_s
+        self.max_sessions = max_sessions
+        self.max_tokens = max_tokens
+        self.summarize = summarize
+        # session_id -> [history, last_used], oldest use first
+        self._sessions: "OrderedDict[str, list]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.expired = 0
+        self.evicted = 0
+        self.trimmed_messages = 0
+        self.summaries = 0
+
+    def _prune(self, now: float) -> None:
+        # Caller holds the lock. Entries are in last-use order, so expired ones are at the front.
+        while self._sessions:
+            _, entry = next(iter(self._sessions.items()))
+            if now - entry[1] <= self.ttl_s:
+                break
+            self._sessions.popitem(last=False)
+            self.expired += 1
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self.evicted += 1
+
+    def _entry(self, session_id: str) -> list:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                entry = self._sessions[session_id] = [_history_class()(), now]
+            else:
+                entry[1] = now
+                self._sessions.move_to_end(session_id)
+            self._prune(now)
+            return entry
+
+    def get(self, session_id: str) -> BaseChatMessageHistory:
+        """The session's history, created on first use; marks the session as used."""
+        return self._entry(session_id)[0]
+
+    def drop(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def _split(self, messages: List[BaseMessage], budget: int) -> Tuple[List[BaseMessage], List[BaseMessage]]:
+        # Keep the newest whole turns (starting on a user message) that fit in `budget` tokens.
+        from langchain_core.messages.utils import count_tokens_approximately, trim_messages
+        if count_tokens_approximately(messages) <= self.max_tokens:
+            return [], messages
+        kept = trim_messages(messages, max_tokens=budget, token_counter=count_tokens_approximately,
+                             strategy="last", start_on="human")
+        return messages[:len(messages) - len(kept)], kept
+
+    def compact(self, session_id: str) -> None:
+        """
+        Bring one session back under `max_tokens`; a no-op while it fits.
+
+        Appends take the history's own lock, so they can't interleave with the
+        rewrite. The summary is written outside it: turns appended meanwhile
+        are kept, and if another compaction rewrote the head first this one
+        gives up.
+        """
+        from langchain_core.messages import AIMessage, HumanMessage
+        with self._lock:
+            entry = self._sessions.get(session_id)
+        if entry is None:
+            return
+        history = entry[0]
+        with history.lock:
+            messages = list(history.messages)
+        # Summaries leave room for a few more turns before the next one is needed.
+        budget = self.max_tokens // 2 if self.summarize else self.max_tokens
+        dropped, _ = self._split(messages, budget)
+        if not dropped:
+            return
+        head = []
+        if self.summarize:
+            # A (user, assistant) pair rather than a system message: providers differ on
+            # system messages mid-conversation. An earlier summary is among `dropped`.
+            summary = self.summarize(dropped)
+            head = [HumanMessage(content=f"Summary of our earlier conversation:\n{summary}"),
+                    AIMessage(content="Noted.")]
+        with history.lock:
+            current = history.messages
+            if len(current) < len(dropped) or any(a is not b for a, b in zip(current, dropped)):
+                return
+            history.messages = head + current[len(dropped):]
+            if self.summarize:
+                self.summaries += 1
+            self.trimmed_messages += len(dropped)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            sessions = len(self._sessions)
+        return {
+            "sessions": sessions,
+            "max_sessions": self.max_sessions,
+            "ttl_s": self.ttl_s,
+            "max_tokens": self.max_tokens,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "trimmed_messages": self.trimmed_messages,
+            "summaries": self.summaries,
+        }
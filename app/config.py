@@ -1,10 +1,51 @@
 import os
 
-OSRM_BASE = os.getenv("OSRM_BASE", "https://router.project-osrm.org")
+OSRM_PUBLIC_BASE = "https://router.project-osrm.org"
+OSRM_BASE = os.getenv("OSRM_BASE", OSRM_PUBLIC_BASE)
+# osrm-public | osrm-self-hosted (OSRM_BASE) | stub (local in-process server, for tests/offline)
+ROUTING_BACKEND = os.getenv("ROUTING_BACKEND", "osrm-self-hosted" if os.getenv("OSRM_BASE") else "osrm-public")
+ROUTING_TIMEOUT_S = float(os.getenv("ROUTING_TIMEOUT_S", "20"))
+ROUTING_MAX_CONNECTIONS = int(os.getenv("ROUTING_MAX_CONNECTIONS", "20"))
+ROUTING_MAX_CONCURRENCY = int(os.getenv("ROUTING_MAX_CONCURRENCY", "8"))
+ROUTING_RETRIES = int(os.getenv("ROUTING_RETRIES", "3"))
 DEFAULT_PROFILE = "driving-truck"          # maps to OSRM "driving"
 DEFAULT_SPEED_PROFILE = "normal"         # eco | normal | aggressive
 DEFAULT_SAMPLE_EVERY_S = 60
+DEFAULT_STOP_DWELL_S = int(os.getenv("DEFAULT_STOP_DWELL_S", "600"))   # standing time at each waypoint
+SIM_ENGINE = os.getenv("SIM_ENGINE", "numpy")   # numpy | python (reference loop)
 DEFAULT_DRIVER_HOURS = 6                 # your requirement
 DEFAULT_START_LOCAL = "2025-09-20 08:00" # used if user didn't specify
 OUTPUT_DIR = os.getenv("OUTPUT_DIR", "outputs")
+OUTPUT_CATALOG_PATH = os.getenv("OUTPUT_CATALOG_PATH", ".cache/output_catalog.sqlite")  # one row per written file
+DEFAULT_OUTPUT_FORMAT = os.getenv("DEFAULT_OUTPUT_FORMAT", "csv")   # csv | parquet | feather | arrow
+PARQUET_ROW_GROUP_ROWS = int(os.getenv("PARQUET_ROW_GROUP_ROWS", "131072"))
+STREAM_CHUNK_POINTS = int(os.getenv("STREAM_CHUNK_POINTS", "2048"))   # resampled points per pipeline chunk
 TIMEZONE = os.getenv("TIMEZONE", "Asia/Kolkata")
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH", ".cache/fleet_cache.sqlite")
+ROUTE_CACHE_TTL_S = int(os.getenv("ROUTE_CACHE_TTL_S", str(7 * 24 * 3600)))
+ROUTE_CACHE_MAX_ENTRIES = int(os.getenv("ROUTE_CACHE_MAX_ENTRIES", "5000"))
+TABLE_CACHE_MAX_ENTRIES = int(os.getenv("TABLE_CACHE_MAX_ENTRIES", "1000000"))   # matrix cells
+OSRM_TABLE_MAX_SIZE = int(os.getenv("OSRM_TABLE_MAX_SIZE", "100"))   # table requests: at most N sources x N destinations
+ROUTE_CACHE_WARM_FILE = os.getenv("ROUTE_CACHE_WARM_FILE")  # optional "start;end" per line, warmed on API startup
+GEOCODE_CACHE_TTL_S = int(os.getenv("GEOCODE_CACHE_TTL_S", str(30 * 24 * 3600)))
+GEOCODE_NEGATIVE_TTL_S = int(os.getenv("GEOCODE_NEGATIVE_TTL_S", "3600"))  # failed lookups
+GEOCODE_CACHE_MAX_ENTRIES = int(os.getenv("GEOCODE_CACHE_MAX_ENTRIES", "20000"))
+NOMINATIM_MIN_INTERVAL_S = float(os.getenv("NOMINATIM_MIN_INTERVAL_S", "1.0"))  # Nominatim policy: ~1 req/s
+SIM_CACHE_TTL_S = int(os.getenv("SIM_CACHE_TTL_S", str(7 * 24 * 3600)))
+SIM_CACHE_MAX_ENTRIES = int(os.getenv("SIM_CACHE_MAX_ENTRIES", "1000"))
+SIM_CACHE_MAX_BYTES = int(os.getenv("SIM_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))  # 0 disables the cache
+SIM_CACHE_MAX_ENTRY_BYTES = int(os.getenv("SIM_CACHE_MAX_ENTRY_BYTES", str(64 * 1024 * 1024)))  # uncompressed
+SIM_FLIGHT_WAIT_S = float(os.getenv("SIM_FLIGHT_WAIT_S", "5"))  # then simulate without the shared run
+STAGE_MEMO_MAX_BYTES = int(os.getenv("STAGE_MEMO_MAX_BYTES", str(256 * 1024 * 1024)))  # in-process; 0 disables
+PROMPT_CACHE_MAX_ENTRIES = int(os.getenv("PROMPT_CACHE_MAX_ENTRIES", "0"))  # opt-in; 0 disables the prompt cache
+PROMPT_CACHE_TTL_S = int(os.getenv("PROMPT_CACHE_TTL_S", str(24 * 3600)))
+CHAT_SESSION_TTL_S = int(os.getenv("CHAT_SESSION_TTL_S", "3600"))          # idle sessions expire
+CHAT_MAX_SESSIONS = int(os.getenv("CHAT_MAX_SESSIONS", "1000"))            # LRU bound on live sessions
+CHAT_HISTORY_MAX_TOKENS = int(os.getenv("CHAT_HISTORY_MAX_TOKENS", "2000"))  # per session, approximate
+CHAT_HISTORY_SUMMARIZE = os.getenv("CHAT_HISTORY_SUMMARIZE", "0").lower() in ("1", "true", "yes")
+AGENT_TOOL_MAX_WORKERS = int(os.getenv("AGENT_TOOL_MAX_WORKERS", "4"))  # concurrent tool calls per API worker
+FLEET_BATCH_MAX_WORKERS = int(os.getenv("FLEET_BATCH_MAX_WORKERS", str(os.cpu_count() or 1)))
+FLEET_API_URL = os.getenv("FLEET_API_URL", "")  # e.g. http://localhost:8000; enables streamed downloads in the UI
+UI_DOWNLOAD_MAX_MB = float(os.getenv("UI_DOWNLOAD_MAX_MB", "100"))  # larger files are not buffered by Streamlit
+UI_PREVIEW_POINTS = int(os.getenv("UI_PREVIEW_POINTS", "2000"))  # points in the UI map/speed preview
+MAX_INFLIGHT_REQUESTS = int(os.getenv("MAX_INFLIGHT_REQUESTS", "32"))  # beyond this the API answers 429
@@ -1,19 +1,39 @@
 import os
+from functools import lru_cache
 from dotenv import load_dotenv
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_openai import ChatOpenAI
 
 load_dotenv()
 
-gemini_llm = ChatGoogleGenerativeAI(
-    model="models/gemini-2.5-flash",
-    google_api_key=os.getenv("GOOGLE_API_KEY"),
-    temperature=0.4,
-)
-openai_llm = ChatOpenAI(
-    model="gpt-4o",
-    temperature=0.4
-)
-
 llm_type = os.getenv("LLM_PROVIDER", "gemini")  # "gemini" | "openai"
-llm = gemini_llm if llm_type == "gemini" else openai_llm
+
+# Provider packages are imported, and clients built, only when first asked for.
+@lru_cache(maxsize=None)
+def _gemini_llm():
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(
+        model="models/gemini-2.5-flash",
+        google_api_key=os.getenv("GOOGLE_API_KEY"),
+        temperature=0.4,
+    )
+
+@lru_cache(maxsize=None)
+def _openai_llm():
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(
+        model="gpt-4o",
+        temperature=0.4
+    )
+
+def get_llm():
+    """The chat model for LLM_PROVIDER; only that provider's package and API key are needed."""
+    return _gemini_llm() if llm_type == "gemini" else _openai_llm()
+
+def __getattr__(name: str):
+    # Keeps `from app.llm_model.llm_model import llm` working, resolved on first access.
+    if name == "llm":
+        return get_llm()
+    if name == "gemini_llm":
+        return _gemini_llm()
+    if name == "openai_llm":
+        return _openai_llm()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,7 +1,25 @@
-from fastapi import FastAPI
+import asyncio
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Annotated, Dict, Iterator, Literal, Optional, Tuple
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from app.agents.main_agent import run_general_chat_agent
-from app.models.schemas import PromptRequest, AgentResponse
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
+from starlette.concurrency import iterate_in_threadpool
+from app.agents.main_agent import arun_general_chat_agent, chat_sessions
+from app.agents.prompt_cache import response_cache
+from app.models.schemas import (PromptRequest, AgentResponse, FleetBatchParams, MatrixParams, MatrixResult,
+                                OutputListing, OutputRecord, PlanRouteCSVParams, PlanRouteStreamParams, ToolResult)
+from app.config import OUTPUT_DIR, ROUTE_CACHE_WARM_FILE, MAX_INFLIGHT_REQUESTS
+from app.tools.geo_tools import (ageocode, route_cache, geocode_cache, sim_cache, geocode_cache_entries,
+                                 seed_geocode_cache, warm_route_cache)
+from app.tools.matrix import aroute_matrix, table_cache
+from app.tools.stages import stage_memo
+from app.tools.warm_routes import read_corridors
+from app.tools.routing_client import get_routing_client
+from app.tools.metrics import HTTP_SECONDS, StageTimer, register_collector, render
 
 app = FastAPI(title="Fleet Synthetic Data Agent", version="0.1.0")
 app.add_middleware(
@@ -9,17 +27,255 @@ app.add_middleware(
     allow_methods=["*"], allow_headers=["*"]
 )
 
+# In-flight request counter. All handlers run on the one event loop, so a plain int is safe.
+_inflight = {"active": 0}
+
+def _acquire_slot():
+    if _inflight["active"] >= MAX_INFLIGHT_REQUESTS:
+        raise HTTPException(status_code=429, detail="Too many requests in flight; retry shortly.",
+                            headers={"Retry-After": "1"})
+    _inflight["active"] += 1
+
+def _collect_gauges():
+    # Read at scrape time: in-flight requests and the persistent caches' counters.
+    yield ("fleet_inflight_requests", "gauge", "Requests currently admitted (streams until their last byte).",
+           [("fleet_inflight_requests", {}, _inflight["active"])])
+    caches = {"route": route_cache.stats(), "table": table_cache.stats(), "geocode": geocode_cache.stats(),
+              "simulation": sim_cache.stats(), "prompt": response_cache.stats(), "stages": stage_memo.stats()}
+    for field, kind, help in (("hits", "counter", "Cache lookups served from the cache."),
+                              ("misses", "counter", "Cache lookups that missed."),
+                              ("hit_ratio", "gauge", "Cache hits / lookups since startup."),
+                              ("entries", "gauge", "Entries stored in the cache."),
+                              ("bytes", "gauge", "Bytes stored in the cache.")):
+        name = f"fleet_cache_{field}_total" if kind == "counter" else f"fleet_cache_{field}"
+        yield name, kind, help, [(name, {"cache": c}, st[field]) for c, st in caches.items()]
+    yield ("fleet_chat_sessions", "gauge", "Live agent chat sessions.",
+           [("fleet_chat_sessions", {}, chat_sessions.stats()["sessions"])])
+
+register_collector(_collect_gauges)
+
+@app.middleware("http")
+async def time_requests(request: Request, call_next):
+    t0 = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template, not raw path, to keep the series count bounded.
+    route = request.scope.get("route")
+    HTTP_SECONDS.observe(time.perf_counter() - t0, method=request.method,
+                         route=getattr(route, "path", "unmatched"), status=str(response.status_code))
+    return response
+
+async def admit_request():
+    """Backpressure: reject with 429 instead of queueing once MAX_INFLIGHT_REQUESTS are running."""
+    _acquire_slot()
+    try:
+        yield
+    finally:
+        _inflight["active"] -= 1
+
+def _preload_pipeline():
+    # The generation pipeline (pandas, langchain tools) is imported lazily so workers start fast;
+    # pull it in off the request path right after startup.
+    import app.tools.fleet_tools  # noqa: F401
+
+@app.on_event("startup")
+def preload_pipeline():
+    threading.Thread(target=_preload_pipeline, daemon=True).start()
+
+@app.on_event("startup")
+def warm_routes():
+    # Warm in the background so startup isn't blocked on the network.
+    if ROUTE_CACHE_WARM_FILE:
+        corridors = read_corridors(ROUTE_CACHE_WARM_FILE)
+        threading.Thread(target=warm_route_cache, args=(corridors,), daemon=True).start()
+
 @app.get("/")
 def root():
     return {"status": "ok", "service": "fleet-synth-agent"}
 
-@app.post("/prompt", response_model=AgentResponse)
-def user_prompt(req: PromptRequest):
-    # You can prepend params as natural language if provided
-    if req.params:
-        req_text = f"{req.prompt}\n\nParams: {req.params}"
-    else:
-        req_text = req.prompt
-    print(f"Prompt: {req_text}")
-    result = run_general_chat_agent(req_text, session_id="default")
-    return AgentResponse(response=result["response"], tool_result=result.get("tool_result"))
+@app.get("/cache/stats")
+def cache_stats():
+    return {"route": route_cache.stats(), "table": table_cache.stats(), "geocode": geocode_cache.stats(),
+            "simulation": sim_cache.stats(), "prompt": response_cache.stats(), "stages": stage_memo.stats()}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    # Prometheus scrape target: stage/LLM/HTTP latency histograms, cache counters, in-flight gauge, rows.
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/routing/stats")
+def routing_stats():
+    return get_routing_client().latency_stats()
+
+def _matrix_rows(m) -> list:
+    # JSON has no NaN: unreachable cells become null.
+    return [[None if v != v else round(v, 3) for v in row] for row in m.tolist()]
+
+@app.post("/routing/matrix", response_model=MatrixResult, dependencies=[Depends(admit_request)])
+async def routing_matrix(params: MatrixParams):
+    # Distance/duration between every origin and destination from the OSRM table service, cached per cell.
+    try:
+        places = list(dict.fromkeys(params.origins + (params.destinations or [])))
+        points = dict(zip(places, await asyncio.gather(*(ageocode(p) for p in places))))
+        origins = [points[p][:2] for p in params.origins]
+        destinations = [points[p][:2] for p in params.destinations] if params.destinations else None
+        result = await aroute_matrix(origins, destinations, params.profile, params.avoid)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Tool error: {e}")
+    return MatrixResult(distance_km=_matrix_rows(result["distance_km"]),
+                        duration_sec=_matrix_rows(result["duration_sec"]),
+                        requests=result["requests"], cached_cells=result["cached_cells"])
+
+@app.get("/cache/geocode")
+def list_geocodes():
+    return {"entries": geocode_cache_entries()}
+
+@app.post("/cache/geocode")
+def seed_geocodes(entries: Dict[str, Tuple[float, float, str]]):
+    return {"seeded": seed_geocode_cache(entries)}
+
+@app.get("/sessions/stats")
+def session_stats():
+    return chat_sessions.stats()
+
+@app.delete("/sessions/{session_id}")
+def end_session(session_id: str):
+    return {"dropped": chat_sessions.drop(session_id)}
+
+@app.post("/prompt", response_model=AgentResponse, dependencies=[Depends(admit_request)])
+async def user_prompt(req: PromptRequest, response: Response,
+                      x_session_id: Optional[str] = Header(None, max_length=128)):
+    # Each client keeps its own conversation: session_id from the body or X-Session-ID,
+    # else a new one, returned in the body and the X-Session-ID header.
+    session_id = req.session_id or x_session_id or uuid.uuid4().hex
+    response.headers["X-Session-ID"] = session_id
+    # Params are appended to the prompt as JSON by the agent (and key the prompt cache)
+    print(f"Prompt: {req.prompt} Params: {req.params}")
+    result = await arun_general_chat_agent(req.prompt, session_id=session_id, params=req.params)
+    return AgentResponse(response=result["response"], tool_result=result.get("tool_result"),
+                         tool_results=result.get("tool_results") or [], session_id=session_id,
+                         usage=result.get("usage"))
+
+@app.post("/generate", response_model=ToolResult, dependencies=[Depends(admit_request)])
+async def generate(params: PlanRouteCSVParams):
+    # Structured params go straight to the pipeline: no LLM round-trips.
+    from app.tools.fleet_tools import agenerate_trip
+    return ToolResult(**await agenerate_trip(**params.model_dump()))
+
+@app.post("/generate/batch", response_model=ToolResult, dependencies=[Depends(admit_request)])
+async def generate_batch(params: FleetBatchParams):
+    # One file per (vehicle_id, trip_id): shared places and routes are resolved once and the
+    # trips are simulated across a process pool. Per-trip failures are reported in meta["trips"].
+    from app.tools.fleet_batch import generate_fleet_batch
+    specs = [t.model_dump() for t in params.trips]
+    try:
+        result = await asyncio.to_thread(generate_fleet_batch, specs, params.max_workers)
+    except Exception as e:
+        result = {"ok": False, "message": f"Tool error: {e}"}
+    return ToolResult(**result)
+
+class _StreamSlot:
+    """One in-flight slot held by a stream; releasing it more than once is a no-op."""
+
+    def __init__(self):
+        _acquire_slot()
+        self._held = True
+
+    def release(self):
+        if self._held:
+            self._held = False
+            _inflight["active"] -= 1
+
+class _SlotStreamingResponse(StreamingResponse):
+    # The body generator's finally only runs once the body has started; a client that disconnects
+    # (or a send that fails) before the first chunk would otherwise leak the slot.
+    def __init__(self, content, slot: _StreamSlot, **kwargs):
+        super().__init__(content, **kwargs)
+        self._slot = slot
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self._slot.release()
+
+async def _release_after(chunks: Iterator[str], slot: _StreamSlot):
+    # Chunks are produced on a worker thread; the slot is held until the body is done.
+    try:
+        async for part in iterate_in_threadpool(chunks):
+            yield part
+    finally:
+        slot.release()
+
+async def _stream_trip(params: PlanRouteCSVParams, stream_format: str) -> StreamingResponse:
+    from app.tools.fleet_tools import aresolve_trip, iter_trip_stream, STREAM_MEDIA_TYPES
+    # A stream counts as in flight until its last byte is sent, not just until headers go out.
+    slot = _StreamSlot()
+    try:
+        timer = StageTimer()
+        route, _, _ = await aresolve_trip(params.start, params.end, params.profile, timer, params.waypoints)
+        trip = params.model_dump(include={"speed_profile", "driver_hours", "sample_every_s", "start_time_local",
+                                          "vehicle_id", "trip_id", "split_across_days", "duty_windows",
+                                          "stop_dwell_s"})
+        chunks = iter_trip_stream(route, stream_format, timer=timer, **trip)
+    except Exception as e:
+        slot.release()
+        raise HTTPException(status_code=400, detail=f"Tool error: {e}")
+    ext = "csv" if stream_format == "csv" else "ndjson"
+    return _SlotStreamingResponse(
+        _release_after(chunks, slot), slot, media_type=STREAM_MEDIA_TYPES[stream_format],
+        headers={"Content-Disposition": f'attachment; filename="{params.trip_id}.{ext}"'},
+    )
+
+@app.post("/generate/stream")
+async def generate_stream(params: PlanRouteCSVParams,
+                          stream_format: Literal["ndjson", "csv"] = Query("ndjson", alias="format")):
+    # Rows are sent as they are simulated; nothing is written to disk.
+    return await _stream_trip(params, stream_format)
+
+@app.get("/generate/stream")
+async def generate_stream_get(params: Annotated[PlanRouteStreamParams, Query()]):
+    # Same as the POST form, addressable as a plain link (e.g. from the Streamlit UI).
+    return await _stream_trip(params, params.format)
+
+# Media types of the generated files, by extension.
+FILE_MEDIA_TYPES = {
+    ".csv": "text/csv",
+    ".parquet": "application/vnd.apache.parquet",
+    ".feather": "application/vnd.apache.arrow.file",
+    ".arrow": "application/vnd.apache.arrow.file",
+}
+
+@app.get("/files/{name}")
+def download_file(name: str):
+    # A generated file straight from OUTPUT_DIR: sent from disk in chunks (Range requests work),
+    # so a large trip is never held in memory here or in the Streamlit process.
+    path = Path(OUTPUT_DIR) / name
+    if Path(name).name != name or path.suffix not in FILE_MEDIA_TYPES or not path.is_file():
+        raise HTTPException(status_code=404, detail=f"No generated file named {name!r}")
+    return FileResponse(path, media_type=FILE_MEDIA_TYPES[path.suffix], filename=name)
+
+@app.get("/outputs", response_model=OutputListing)
+def list_outputs(vehicle_id: Optional[str] = None, trip_id: Optional[str] = None,
+                 output_format: Optional[Literal["csv", "parquet", "feather", "arrow"]] = Query(None, alias="format"),
+                 limit: int = Query(50, ge=1, le=1000), offset: int = Query(0, ge=0)):
+    # Served from the output catalog's indexes; OUTPUT_DIR is never scanned.
+    from app.tools.catalog import get_output_catalog
+    catalog = get_output_catalog()
+    return {"total": catalog.count(vehicle_id, trip_id, output_format),
+            "outputs": catalog.list(vehicle_id, trip_id, output_format, limit=limit, offset=offset)}
+
+@app.get("/outputs/latest", response_model=OutputRecord)
+def latest_output(vehicle_id: Optional[str] = None, trip_id: Optional[str] = None):
+    from app.tools.catalog import get_output_catalog
+    record = get_output_catalog().latest(vehicle_id, trip_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="No matching output in the catalog")
+    return record
+
+@app.get("/outputs/{name}", response_model=OutputRecord)
+def get_output(name: str):
+    from app.tools.catalog import get_output_catalog
+    record = get_output_catalog().get(name)
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"No output named {name!r} in the catalog")
+    return record
@@ -1,21 +1,54 @@
 from pydantic import BaseModel, Field
 from typing import Optional, Literal, List, Dict
+from ..config import DEFAULT_OUTPUT_FORMAT, DEFAULT_STOP_DWELL_S
 
 class PromptRequest(BaseModel):
     prompt: str
     params: Optional[Dict] = None
+    session_id: Optional[str] = Field(None, max_length=128,
+                                      description="Conversation to continue; a new one is started if omitted")
 
 class PlanRouteCSVParams(BaseModel):
     start: str = Field(..., description="Start place or 'lat,lon'")
     end: str = Field(..., description="End place or 'lat,lon'")
-    profile: Literal["driving-car", "cycling-regular", "foot-walking"] = "driving-car"
+    waypoints: Optional[List[str]] = Field(None, description="Stops between start and end, in order")
+    stop_dwell_s: int = Field(DEFAULT_STOP_DWELL_S, ge=0, description="Seconds standing at each waypoint")
+    profile: str = Field("driving-car", description="OSRM profile; unknown values route as driving")
     speed_profile: Literal["eco", "normal", "aggressive"] = "normal"
-    driver_hours: float = 6.0
-    sample_every_s: int = 10
+    driver_hours: float = Field(6.0, gt=0)
+    sample_every_s: int = Field(10, gt=0)
     start_time_local: Optional[str] = None
     vehicle_id: str = "WB4555"
     trip_id: str = "trip-0001"
     out_name: Optional[str] = None
+    split_across_days: bool = True
+    per_day_files: bool = False
+    duty_windows: Optional[List[str]] = Field(None, description='e.g. ["08:00-12:00", "13:00-17:00"]')
+    output_format: Literal["csv", "parquet", "feather", "arrow"] = DEFAULT_OUTPUT_FORMAT
+
+class PlanRouteStreamParams(PlanRouteCSVParams):
+    format: Literal["ndjson", "csv"] = "ndjson"
+
+class FleetTripSpec(BaseModel):
+    vehicle_id: str = Field(..., description="Vehicle identifier")
+    trip_id: str = Field(..., description="Trip identifier (also used in the default file name)")
+    start: str = Field(..., description="Start place or 'lat,lon'")
+    end: str = Field(..., description="End place or 'lat,lon'")
+    profile: str = "driving-truck"
+    speed_profile: Literal["eco", "normal", "aggressive"] = "normal"
+    driver_hours: float = 6.0
+    sample_every_s: int = 60
+    start_time_local: Optional[str] = None
+    split_across_days: bool = True
+    per_day_files: bool = False
+    duty_windows: Optional[List[str]] = None
+    out_name: Optional[str] = None
+    output_format: Literal["csv", "parquet", "feather", "arrow"] = DEFAULT_OUTPUT_FORMAT
+    seed: Optional[int] = Field(None, description="Defaults to a stable hash of vehicle_id/trip_id")
+
+class FleetBatchParams(BaseModel):
+    trips: List[FleetTripSpec]
+    max_workers: Optional[int] = Field(None, description="Simulation processes; defaults to the CPU count")
 
 class ToolResult(BaseModel):
     ok: bool
@@ -26,3 +59,37 @@ class ToolResult(BaseModel):
 class AgentResponse(BaseModel):
     response: str
     tool_result: Optional[ToolResult] = None
+    tool_results: List[ToolResult] = Field(default_factory=list, description="Every tool call of the turn, in order")
+    session_id: Optional[str] = None
+    usage: Optional[Dict] = Field(None, description="LLM calls, LLM seconds and token counts for this turn")
+
+class MatrixParams(BaseModel):
+    origins: List[str] = Field(..., min_length=1, description="Places or 'lat,lon'")
+    destinations: Optional[List[str]] = Field(None, description="Defaults to the origins")
+    profile: str = Field("driving-car", description="OSRM profile; unknown values route as driving")
+    avoid: Optional[List[str]] = Field(None, description='e.g. ["tolls", "ferries", "highways"]')
+
+class MatrixResult(BaseModel):
+    distance_km: List[List[Optional[float]]] = Field(..., description="Row per origin; null where unreachable")
+    duration_sec: List[List[Optional[float]]]
+    requests: int = Field(..., description="OSRM table requests sent")
+    cached_cells: int = Field(..., description="Cells served from the cache")
+
+class OutputRecord(BaseModel):
+    path: str
+    name: str
+    vehicle_id: str
+    trip_id: str
+    start_label: str
+    end_label: str
+    start_time: Optional[str] = None
+    end_time: Optional[str] = None
+    rows: int
+    bytes: int
+    format: str
+    sha256: str
+    created_at: str
+
+class OutputListing(BaseModel):
+    total: int = Field(..., description="Records matching the filters")
+    outputs: List[OutputRecord] = Field(..., description="Newest first, one page")
@@ -0,0 +1,259 @@
+"""Offline microbenchmarks for the telemetry pipeline.
+
+Synthetic routes of each length (no geocoding or routing) are pushed through
+every stage on its own -- resample, simulate, schedule, frame, write -- and
+through the whole chunked pipeline (`_write_trip`, simulation cache bypassed).
+Each stage reports its median/min wall time over --repeat runs, rows/s and
+the peak Python-heap allocation of one extra traced run.
+
+    python -m app.tools.bench --out bench.json                       # run, save results
+    python -m app.tools.bench --lengths 10,1000 --baseline bench.json  # exit 1 on regressions
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from . import sim_engine
+from .columnar import Geometry, Telemetry
+from .fleet_tools import _FrameWriter, _build_trip_frame, _parse_dt, _schedule_across_days, _write_trip
+from .geo_tools import resample_arrays, simulate
+from .stages import stage_memo
+from ..config import SIM_ENGINE
+
+DEFAULT_LENGTHS_KM = (10, 100, 1000, 5000)
+DEFAULT_SAMPLE_EVERY_S = (1, 10)
+START_TIME = "2025-01-06T08:00:00"
+DRIVER_HOURS = 6.0
+SEED = 7
+
+# Timings below this many seconds (or peaks below this many MB) apart are noise, not regressions.
+MIN_DELTA_S = 0.005
+MIN_DELTA_MB = 1.0
+
+
+def synthetic_route(km: float, seed: int = 0) -> Dict:
+    """A route-shaped dict of ~1 km segments wandering east from central India, like the OSRM stub's."""
+    n = max(1, int(round(km)))
+    rng = np.random.default_rng(seed)
+    heading = np.radians(90.0 + np.cumsum(rng.normal(0.0, 4.0, n)).clip(-60.0, 60.0))
+    step_km = km / n
+    lat = np.empty(n + 1)
+    lon = np.empty(n + 1)
+    lat[0], lon[0] = 21.0, 72.0
+    for i in range(n):
+        lat[i + 1] = lat[i] + step_km * np.cos(heading[i]) / 111.32
+        lon[i + 1] = lon[i] + step_km * np.sin(heading[i]) / (111.32 * np.cos(np.radians(lat[i])))
+    return {
+        "distance_km": float(km),
+        "duration_sec": int(km / 50.0 * 3600),
+        "geometry": Geometry(lat, lon),
+    }
+
+
+def _n_rows(telemetry) -> int:
+    # numpy engine: Telemetry columns; python engine: list of rows
+    return telemetry.rows if isinstance(telemetry, Telemetry) else len(telemetry)
+
+
+def _frame(telemetry) -> pd.DataFrame:
+    return telemetry.to_pandas() if isinstance(telemetry, Telemetry) else pd.DataFrame(telemetry)
+
+
+def _measure(fn: Callable[[], int], repeat: int) -> Dict:
+    # Timed runs first, then one run under tracemalloc (which slows allocation-heavy code).
+    times = []
+    rows = 0
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        rows = fn()
+        times.append(time.perf_counter() - t0)
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    median = statistics.median(times)
+    return {
+        "median_s": round(median, 5),
+        "min_s": round(min(times), 5),
+        "rows": rows,
+        "rows_per_s": round(rows / median) if median > 0 else None,
+        "peak_mb": round(peak / 2**20, 2),
+    }
+
+
+def bench_case(km: float, sample_every_s: int, repeat: int = 3, output_format: str = "csv",
+               stages: Optional[List[str]] = None) -> Dict:
+    """Benchmark one (route length, sampling interval) case; each stage gets its input precomputed."""
+    route = synthetic_route(km)
+    geometry = route["geometry"]
+    start_dt = _parse_dt(START_TIME)
+    lat_in, lon_in = geometry.lat, geometry.lon
+    lat, lon, heading = resample_arrays(lat_in, lon_in, step_m=100.0)
+
+    def simulate_stage():
+        if SIM_ENGINE == "python":   # the reference loop resamples internally
+            return simulate(geometry, sample_every_s, "normal", SEED, engine="python")
+        return sim_engine.simulate_arrays(lat, lon, heading, sample_every_s, "normal", SEED)
+
+    telemetry = simulate_stage()["telemetry"]
+    frame = _build_trip_frame(telemetry, start_dt, DRIVER_HOURS, sample_every_s, "TRK-BENCH", "TRIP-BENCH")
+    rows = len(frame)
+
+    with tempfile.TemporaryDirectory(prefix="fleet-bench-") as tmp:
+        out_path = Path(tmp) / f"bench.{output_format}"
+
+        def write_stage():
+            writer = _FrameWriter(out_path, output_format)
+            try:
+                writer.write(frame)
+            finally:
+                writer.close()
+            return writer.rows
+
+        def end_to_end():
+            stage_memo.clear()   # measure the pipeline, not memoized stages of the previous run
+            result = _write_trip(route, out_path, "normal", DRIVER_HOURS, sample_every_s, START_TIME,
+                                 "TRK-BENCH", "TRIP-BENCH", True, False, None, None, output_format)
+            return result["meta"]["rows"]
+
+        runs: Dict[str, Callable[[], int]] = {
+            "resample": lambda: len(resample_arrays(lat_in, lon_in, step_m=100.0)[0]),
+            "simulate": lambda: _n_rows(simulate_stage()["telemetry"]),
+            "schedule": lambda: len(_schedule_across_days(_frame(telemetry), start_dt, DRIVER_HOURS,
+                                                          sample_every_s)),
+            "frame": lambda: len(_build_trip_frame(telemetry, start_dt, DRIVER_HOURS, sample_every_s,
+                                                   "TRK-BENCH", "TRIP-BENCH")),
+            "write": write_stage,
+            "end_to_end": end_to_end,
+        }
+        results = {name: _measure(fn, repeat) for name, fn in runs.items() if not stages or name in stages}
+
+    return {
+        "case": case_id(km, sample_every_s),
+        "km": km,
+        "sample_every_s": sample_every_s,
+        "route_vertices": len(geometry),
+        "resampled_points": len(lat),
+        "rows": rows,
+        "stages": results,
+    }
+
+
+def case_id(km: float, sample_every_s: int) -> str:
+    return f"{km:g}km@{sample_every_s}s"
+
+
+def run(lengths_km=DEFAULT_LENGTHS_KM, sample_every_s=DEFAULT_SAMPLE_EVERY_S, repeat: int = 3,
+        output_format: str = "csv", stages: Optional[List[str]] = None, log=None) -> Dict:
+    cases = []
+    for km in lengths_km:
+        for s in sample_every_s:
+            t0 = time.perf_counter()
+            cases.append(bench_case(km, s, repeat, output_format, stages))
+            if log:
+                log(f"{case_id(km, s):>12}  {cases[-1]['rows']:>9} rows  {time.perf_counter() - t0:6.1f} s")
+    return {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "engine": SIM_ENGINE,
+            "output_format": output_format,
+            "repeat": repeat,
+        },
+        "cases": cases,
+    }
+
+
+def compare(current: Dict, baseline: Dict, threshold: float = 0.15) -> List[Dict]:
+    """
+    Per (case, stage) changes against `baseline`; an entry is a regression when
+    median time or peak memory grew by more than `threshold` (a fraction) and by
+    more than the MIN_DELTA_* noise floor. Cases missing from either side are skipped.
+    """
+    base = {(c["case"], name): r for c in baseline["cases"] for name, r in c["stages"].items()}
+    out = []
+    for c in current["cases"]:
+        for name, r in c["stages"].items():
+            b = base.get((c["case"], name))
+            if b is None:
+                continue
+            time_ratio = r["median_s"] / b["median_s"] if b["median_s"] else 1.0
+            mem_ratio = r["peak_mb"] / b["peak_mb"] if b["peak_mb"] else 1.0
+            slower = time_ratio > 1 + threshold and r["median_s"] - b["median_s"] > MIN_DELTA_S
+            bigger = mem_ratio > 1 + threshold and r["peak_mb"] - b["peak_mb"] > MIN_DELTA_MB
+            out.append({
+                "case": c["case"], "stage": name,
+                "median_s": r["median_s"], "baseline_median_s": b["median_s"], "time_ratio": round(time_ratio, 3),
+                "peak_mb": r["peak_mb"], "baseline_peak_mb": b["peak_mb"], "mem_ratio": round(mem_ratio, 3),
+                "regression": [k for k, bad in (("time", slower), ("memory", bigger)) if bad],
+            })
+    return out
+
+
+def _print_results(results: Dict) -> None:
+    print(f"{'case':>12} {'stage':>10} {'median s':>10} {'rows/s':>12} {'peak MB':>9}")
+    for c in results["cases"]:
+        for name, r in c["stages"].items():
+            print(f"{c['case']:>12} {name:>10} {r['median_s']:>10.4f} {r['rows_per_s'] or 0:>12,} {r['peak_mb']:>9.1f}")
+
+
+def _print_comparison(rows: List[Dict]) -> None:
+    print(f"{'case':>12} {'stage':>10} {'time x':>8} {'mem x':>8}")
+    for r in rows:
+        flag = "  REGRESSION (" + ", ".join(r["regression"]) + ")" if r["regression"] else ""
+        print(f"{r['case']:>12} {r['stage']:>10} {r['time_ratio']:>8.2f} {r['mem_ratio']:>8.2f}{flag}")
+
+
+def _floats(s: str) -> Tuple[float, ...]:
+    return tuple(float(x) for x in s.split(",") if x.strip())
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--lengths", type=_floats, default=DEFAULT_LENGTHS_KM, help="Route lengths in km (comma list)")
+    ap.add_argument("--sample-every", type=_floats, default=DEFAULT_SAMPLE_EVERY_S,
+                    help="Sampling intervals in seconds (comma list)")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--format", dest="output_format", default="csv", choices=["csv", "parquet", "feather", "arrow"])
+    ap.add_argument("--stages", type=lambda s: s.split(","), help="Only these stages (comma list)")
+    ap.add_argument("--out", help="Write results JSON here (default: stdout)")
+    ap.add_argument("--baseline", help="Results JSON to compare against; exit 1 on regressions")
+    ap.add_argument("--threshold", type=float, default=0.15, help="Allowed slowdown/growth fraction (default 0.15)")
+    args = ap.parse_args(argv)
+
+    results = run(args.lengths, [int(s) for s in args.sample_every], args.repeat, args.output_format,
+                  args.stages, log=lambda m: print(m, file=sys.stderr))
+    if args.out:
+        Path(args.out).write_text(json.dumps(results, indent=2), encoding="utf-8")
+        _print_results(results)
+    elif not args.baseline:
+        print(json.dumps(results, indent=2))
+
+    if not args.baseline:
+        return 0
+    rows = compare(results, json.loads(Path(args.baseline).read_text(encoding="utf-8")), args.threshold)
+    _print_comparison(rows)
+    regressions = [r for r in rows if r["regression"]]
+    print(f"{len(regressions)} regression(s) in {len(rows)} comparisons (threshold {args.threshold:.0%})")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,232 @@
+"""Small persistent key/value cache backed by SQLite (stdlib only)."""
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache_entries (
+    ns TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value BLOB NOT NULL,
+    expires REAL NOT NULL,
+    accessed REAL NOT NULL,
+    PRIMARY KEY (ns, key)
+);
+CREATE INDEX IF NOT EXISTS ix_cache_entries_lru ON cache_entries (ns, accessed);
+"""
+
+
+class PersistentCache:
+    """
+    Namespaced bytes cache stored in one SQLite file.
+
+    Entries expire after `ttl_s` seconds; once a namespace holds more than
+    `max_entries` rows the least recently read ones are evicted. Several
+    namespaces (routes, geocodes, ...) can share the same file.
+
+    With `memory_entries` > 0, recently used entries are also kept in an
+    in-process LRU so repeat lookups skip SQLite entirely. Reads served from
+    memory do not refresh the on-disk access time.
+
+    With `max_bytes` > 0, least recently read entries are also evicted once
+    the namespace's values add up to more than `max_bytes`.
+    """
+
+    def __init__(self, path: str, namespace: str, ttl_s: float, max_entries: int,
+                 memory_entries: int = 0, max_bytes: int = 0):
+        self.path = path
+        self.namespace = namespace
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.max_bytes = max_bytes
+        self._memory: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _db(self) -> sqlite3.Connection:
+        # Opened lazily so importing a module that owns a cache never touches disk.
+        if self._conn is None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _remember(self, key: str, value: bytes, expires: float) -> None:
+        if self.memory_entries <= 0:
+            return
+        self._memory[key] = (value, expires)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[bytes]:
+        now = time.time()
+        with self._lock:
+            mem = self._memory.get(key)
+            if mem is not None and mem[1] >= now:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return mem[0]
+            db = self._db()
+            row = db.execute(
+                "SELECT value, expires FROM cache_entries WHERE ns = ? AND key = ?",
+                (self.namespace, key),
+            ).fetchone()
+            if row is None or row[1] < now:
+                if row is not None:
+                    db.execute("DELETE FROM cache_entries WHERE ns = ? AND key = ?", (self.namespace, key))
+                    db.commit()
+                self.misses += 1
+                return None
+            db.execute("UPDATE cache_entries SET accessed = ? WHERE ns = ? AND key = ?",
+                       (now, self.namespace, key))
+            db.commit()
+            self.hits += 1
+            value = bytes(row[0])
+            self._remember(key, value, row[1])
+            return value
+
+    def set(self, key: str, value: bytes, ttl_s: Optional[float] = None) -> None:
+        now = time.time()
+        expires = now + (self.ttl_s if ttl_s is None else ttl_s)
+        with self._lock:
+            db = self._db()
+            db.execute(
+                "INSERT OR REPLACE INTO cache_entries (ns, key, value, expires, accessed) VALUES (?, ?, ?, ?, ?)",
+                (self.namespace, key, sqlite3.Binary(value), expires, now),
+            )
+            db.execute("DELETE FROM cache_entries WHERE ns = ? AND expires < ?", (self.namespace, now))
+            (count,) = db.execute("SELECT COUNT(*) FROM cache_entries WHERE ns = ?", (self.namespace,)).fetchone()
+            if count > self.max_entries:
+                cur = db.execute(
+                    "DELETE FROM cache_entries WHERE ns = ? AND key IN ("
+                    " SELECT key FROM cache_entries WHERE ns = ? ORDER BY accessed LIMIT ?)",
+                    (self.namespace, self.namespace, count - self.max_entries),
+                )
+                self.evictions += cur.rowcount
+            if self.max_bytes > 0:
+                self._evict_bytes(db)
+            db.commit()
+            self._remember(key, value, expires)
+
+    def get_many(self, keys: List[str]) -> Dict[str, bytes]:
+        """`get` for many keys in one transaction; returns only the keys found."""
+        now = time.time()
+        found: Dict[str, bytes] = {}
+        with self._lock:
+            rest = []
+            for key in keys:
+                mem = self._memory.get(key)
+                if mem is not None and mem[1] >= now:
+                    self._memory.move_to_end(key)
+                    found[key] = mem[0]
+                else:
+                    rest.append(key)
+            if rest:
+                db = self._db()
+                expired = []
+                # Stay well under SQLite's bound-parameter limit.
+                for i in range(0, len(rest), 500):
+                    part = rest[i:i + 500]
+                    marks = ",".join("?" * len(part))
+                    for key, value, expires in db.execute(
+                            f"SELECT key, value, expires FROM cache_entries WHERE ns = ? AND key IN ({marks})",
+                            (self.namespace, *part)):
+                        if expires < now:
+                            expired.append((self.namespace, key))
+                            continue
+                        found[key] = bytes(value)
+                        self._remember(key, found[key], expires)
+                if expired:
+                    db.executemany("DELETE FROM cache_entries WHERE ns = ? AND key = ?", expired)
+                db.executemany("UPDATE cache_entries SET accessed = ? WHERE ns = ? AND key = ?",
+                               [(now, self.namespace, k) for k in rest if k in found])
+                db.commit()
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+            return found
+
+    def set_many(self, items: Dict[str, bytes], ttl_s: Optional[float] = None) -> None:
+        """`set` for many entries in one transaction, with a single eviction pass."""
+        if not items:
+            return
+        now = time.time()
+        expires = now + (self.ttl_s if ttl_s is None else ttl_s)
+        with self._lock:
+            db = self._db()
+            db.executemany(
+                "INSERT OR REPLACE INTO cache_entries (ns, key, value, expires, accessed) VALUES (?, ?, ?, ?, ?)",
+                [(self.namespace, k, sqlite3.Binary(v), expires, now) for k, v in items.items()],
+            )
+            db.execute("DELETE FROM cache_entries WHERE ns = ? AND expires < ?", (self.namespace, now))
+            (count,) = db.execute("SELECT COUNT(*) FROM cache_entries WHERE ns = ?", (self.namespace,)).fetchone()
+            if count > self.max_entries:
+                cur = db.execute(
+                    "DELETE FROM cache_entries WHERE ns = ? AND key IN ("
+                    " SELECT key FROM cache_entries WHERE ns = ? ORDER BY accessed LIMIT ?)",
+                    (self.namespace, self.namespace, count - self.max_entries),
+                )
+                self.evictions += cur.rowcount
+            if self.max_bytes > 0:
+                self._evict_bytes(db)
+            db.commit()
+            for k, v in items.items():
+                self._remember(k, v, expires)
+
+    def _evict_bytes(self, db: sqlite3.Connection) -> None:
+        (total,) = db.execute("SELECT COALESCE(SUM(LENGTH(value)), 0) FROM cache_entries WHERE ns = ?",
+                              (self.namespace,)).fetchone()
+        if total <= self.max_bytes:
+            return
+        victims = []
+        for key, size in db.execute("SELECT key, LENGTH(value) FROM cache_entries WHERE ns = ? ORDER BY accessed",
+                                    (self.namespace,)):
+            victims.append((self.namespace, key))
+            total -= size
+            if total <= self.max_bytes:
+                break
+        db.executemany("DELETE FROM cache_entries WHERE ns = ? AND key = ?", victims)
+        for _, key in victims:
+            self._memory.pop(key, None)
+        self.evictions += len(victims)
+
+    def items(self) -> List[Tuple[str, bytes, float]]:
+        """All live (key, value, expires_at) entries in this namespace, most recently used first."""
+        with self._lock:
+            return [(k, bytes(v), e) for k, v, e in self._db().execute(
+                "SELECT key, value, expires FROM cache_entries WHERE ns = ? AND expires >= ? ORDER BY accessed DESC",
+                (self.namespace, time.time()),
+            )]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            self._db().execute("DELETE FROM cache_entries WHERE ns = ?", (self.namespace,))
+            self._db().commit()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            size, nbytes = self._db().execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM cache_entries WHERE ns = ?",
+                (self.namespace,)
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "namespace": self.namespace,
+            "entries": size,
+            "bytes": nbytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,181 @@
+"""Catalog of generated output files: one SQLite row per write, via SQLAlchemy.
+
+Each trip file written by `plan_route_to_csv` (and each file of a fleet batch)
+is recorded with its vehicle, trip, route endpoints, time range, row count,
+byte size, format and SHA-256. Lookups by path, name, vehicle, trip, format
+and recency go through indexes, so finding an output never scans OUTPUT_DIR.
+Rewriting a path replaces its record.
+"""
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from sqlalchemy import DateTime, Index, Integer, String, create_engine, event, func, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import DeclarativeBase, Mapped, Session, mapped_column
+
+from ..config import OUTPUT_CATALOG_PATH
+
+
+class _Base(DeclarativeBase):
+    pass
+
+
+class OutputRow(_Base):
+    __tablename__ = "outputs"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    path: Mapped[str] = mapped_column(String, unique=True)
+    name: Mapped[str] = mapped_column(String, index=True)
+    vehicle_id: Mapped[str] = mapped_column(String)
+    trip_id: Mapped[str] = mapped_column(String)
+    start_label: Mapped[str] = mapped_column(String)
+    end_label: Mapped[str] = mapped_column(String)
+    start_time: Mapped[Optional[datetime]] = mapped_column(DateTime)
+    end_time: Mapped[Optional[datetime]] = mapped_column(DateTime)
+    rows: Mapped[int] = mapped_column(Integer)
+    bytes: Mapped[int] = mapped_column(Integer)
+    format: Mapped[str] = mapped_column(String(16))
+    sha256: Mapped[str] = mapped_column(String(64), index=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, index=True)
+
+    # Newest-first listings of one vehicle, one of its trips, a trip ID across vehicles or one
+    # format, read straight off an index.
+    __table_args__ = (Index("ix_outputs_vehicle_created", "vehicle_id", "created_at"),
+                      Index("ix_outputs_vehicle_trip_created", "vehicle_id", "trip_id", "created_at"),
+                      Index("ix_outputs_trip_created", "trip_id", "created_at"),
+                      Index("ix_outputs_format_created", "format", "created_at"))
+
+    def to_dict(self) -> Dict:
+        return {
+            "path": self.path,
+            "name": self.name,
+            "vehicle_id": self.vehicle_id,
+            "trip_id": self.trip_id,
+            "start_label": self.start_label,
+            "end_label": self.end_label,
+            "start_time": self.start_time.isoformat() if self.start_time else None,
+            "end_time": self.end_time.isoformat() if self.end_time else None,
+            "rows": self.rows,
+            "bytes": self.bytes,
+            "format": self.format,
+            "sha256": self.sha256,
+            "created_at": self.created_at.isoformat(),
+        }
+
+
+def _parse_time(value) -> Optional[datetime]:
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+
+class OutputCatalog:
+    """Records of generated files in one SQLite file; safe to share between threads."""
+
+    def __init__(self, path: str):
+        self.path = path
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._engine = create_engine(f"sqlite:///{path}", connect_args={"timeout": 10})
+
+        @event.listens_for(self._engine, "connect")
+        def _pragmas(conn, _):
+            # WAL: API workers, the UI and batch runs can read while one of them writes.
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+
+        _Base.metadata.create_all(self._engine)
+        # create_all skips tables that already exist: add indexes introduced since a catalog was made.
+        for index in OutputRow.__table__.indexes:
+            index.create(self._engine, checkfirst=True)
+
+    def record(self, path: str, vehicle_id: str, trip_id: str, start_label: str, end_label: str,
+               start_time, end_time, rows: int, bytes: int, format: str, sha256: str) -> None:
+        """Insert the record for `path`, or replace it when the path was written before."""
+        values = {
+            "path": str(path), "name": Path(path).name, "vehicle_id": vehicle_id, "trip_id": trip_id,
+            "start_label": start_label, "end_label": end_label,
+            "start_time": _parse_time(start_time), "end_time": _parse_time(end_time),
+            "rows": rows, "bytes": bytes, "format": format, "sha256": sha256,
+            "created_at": datetime.now(),
+        }
+        stmt = insert(OutputRow).values(**values)
+        stmt = stmt.on_conflict_do_update(index_elements=["path"],
+                                          set_={k: v for k, v in values.items() if k != "path"})
+        with Session(self._engine) as session, session.begin():
+            session.execute(stmt)
+
+    @staticmethod
+    def _filtered(stmt, vehicle_id: Optional[str], trip_id: Optional[str], format: Optional[str]):
+        if vehicle_id is not None:
+            stmt = stmt.where(OutputRow.vehicle_id == vehicle_id)
+        if trip_id is not None:
+            stmt = stmt.where(OutputRow.trip_id == trip_id)
+        if format is not None:
+            stmt = stmt.where(OutputRow.format == format)
+        return stmt
+
+    def list(self, vehicle_id: Optional[str] = None, trip_id: Optional[str] = None,
+             format: Optional[str] = None, limit: int = 50, offset: int = 0) -> List[Dict]:
+        """Records matching the filters, newest first."""
+        stmt = self._filtered(select(OutputRow), vehicle_id, trip_id, format)
+        stmt = stmt.order_by(OutputRow.created_at.desc(), OutputRow.id.desc()).limit(limit).offset(offset)
+        with Session(self._engine) as session:
+            return [r.to_dict() for r in session.scalars(stmt)]
+
+    def count(self, vehicle_id: Optional[str] = None, trip_id: Optional[str] = None,
+              format: Optional[str] = None) -> int:
+        stmt = self._filtered(select(func.count()).select_from(OutputRow), vehicle_id, trip_id, format)
+        with Session(self._engine) as session:
+            return session.scalar(stmt)
+
+    def latest(self, vehicle_id: Optional[str] = None, trip_id: Optional[str] = None) -> Optional[Dict]:
+        """The most recently written record, optionally for one vehicle/trip."""
+        records = self.list(vehicle_id, trip_id, limit=1)
+        return records[0] if records else None
+
+    def get(self, name_or_path: str) -> Optional[Dict]:
+        """The record of one file, by full path or (newest with that) file name."""
+        column = OutputRow.path if "/" in name_or_path or "\\" in name_or_path else OutputRow.name
+        stmt = (select(OutputRow).where(column == name_or_path)
+                .order_by(OutputRow.created_at.desc()).limit(1))
+        with Session(self._engine) as session:
+            row = session.scalars(stmt).first()
+            return row.to_dict() if row else None
+
+    def forget(self, path: str) -> bool:
+        """Drop the record of `path` (e.g. after the file was deleted)."""
+        with Session(self._engine) as session, session.begin():
+            row = session.scalars(select(OutputRow).where(OutputRow.path == str(path))).first()
+            if row is None:
+                return False
+            session.delete(row)
+            return True
+
+    def close(self) -> None:
+        self._engine.dispose()
+
+
+_catalog: Optional[OutputCatalog] = None
+_catalog_lock = threading.Lock()
+
+
+def get_output_catalog() -> OutputCatalog:
+    """Shared catalog at OUTPUT_CATALOG_PATH, created on first use."""
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = OutputCatalog(OUTPUT_CATALOG_PATH)
+        return _catalog
+
+
+def record_output(result: Dict, vehicle_id: str, trip_id: str, start_label: str, end_label: str) -> None:
+    """Catalog the file of a successful `_write_trip` result (a no-op for failures)."""
+    if not result.get("ok"):
+        return
+    meta = result["meta"]
+    get_output_catalog().record(
+        result["path"], vehicle_id, trip_id, start_label, end_label, meta.get("start_time"),
+        meta.get("end_time"), meta["rows"], meta["bytes"], meta["format"], meta["sha256"],
+    )
@@ -0,0 +1,114 @@
+"""Thread- and asyncio-level helpers for sharing and pacing outbound work."""
+import asyncio
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls for the same key into one execution.
+
+    The first caller runs `fn`; callers arriving while it is in flight block
+    and receive the same result (or the same exception).
+    """
+
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result: Any = None
+            self.error: BaseException = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, "SingleFlight._Call"] = {}
+        self.coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        leader, call = self.join(key)
+        if leader:
+            try:
+                result = fn()
+            except BaseException as e:
+                self.finish(key, call, error=e)
+            else:
+                self.finish(key, call, result)
+        else:
+            call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def join(self, key: Hashable) -> Tuple[bool, "SingleFlight._Call"]:
+        """
+        Low-level form of `do` for work that cannot be wrapped in one call
+        (e.g. a generator). Returns (leader, call): the leader must call
+        `finish(key, call, ...)` exactly once; others wait on `call.done`.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = SingleFlight._Call()
+                return True, call
+            self.coalesced += 1
+            return False, call
+
+    def finish(self, key: Hashable, call: "SingleFlight._Call", result: Any = None,
+               error: Optional[BaseException] = None) -> None:
+        call.result, call.error = result, error
+        with self._lock:
+            del self._calls[key]
+        call.done.set()
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+
+class AsyncSingleFlight:
+    """asyncio counterpart of `SingleFlight`: concurrent awaiters of one key share a single task."""
+
+    def __init__(self):
+        self._tasks: Dict[Hashable, asyncio.Future] = {}
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        fut = self._tasks.get(key)
+        if fut is None:
+            fut = asyncio.ensure_future(fn())
+            self._tasks[key] = fut
+            fut.add_done_callback(lambda _: self._tasks.pop(key, None))
+        else:
+            self.coalesced += 1
+        # shield: one cancelled waiter must not cancel the shared lookup
+        return await asyncio.shield(fut)
+
+
+class RateLimiter:
+    """
+    Space calls at least `min_interval_s` apart; callers queue rather than fail.
+
+    Sync (`acquire`) and async (`acquire_async`) callers share one schedule.
+    """
+
+    def __init__(self, min_interval_s: float):
+        self.min_interval_s = min_interval_s
+        self._lock = threading.Lock()
+        self._next_at = 0.0
+
+    def _reserve(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next_at - now
+            self._next_at = max(now, self._next_at) + self.min_interval_s
+        return wait
+
+    def acquire(self) -> None:
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self) -> None:
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
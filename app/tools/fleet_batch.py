@@ -0,0 +1,165 @@
+"""Generate telemetry for many vehicles/trips in one call.
+
+Geocoding and routing are deduplicated across the batch and resolved on
+threads (they are network bound and already cached/rate limited); the
+CPU-bound simulate -> schedule -> write work fans out over a process pool.
+Each worker writes its own file as soon as it finishes.
+"""
+import threading
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .geo_tools import geocode, route_coords
+from .metrics import ROWS_GENERATED, observe_stages
+from ..config import FLEET_BATCH_MAX_WORKERS, ROUTING_MAX_CONCURRENCY
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def _get_pool(max_workers: int) -> ProcessPoolExecutor:
+    # One long-lived pool; "spawn" keeps workers safe to start from a threaded server.
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != max_workers or getattr(_pool, "_broken", False):
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=get_context("spawn"))
+            _pool_workers = max_workers
+        return _pool
+
+
+def _trip_seed(vehicle_id: str, trip_id: str) -> int:
+    # Stable per trip, so two trucks on the same corridor don't produce identical telemetry.
+    return zlib.crc32(f"{vehicle_id}/{trip_id}".encode("utf-8"))
+
+
+def _run_trip(job: Dict) -> Dict:
+    """Worker: simulate, schedule and write one trip (runs in a pool process)."""
+    from .fleet_tools import _write_trip
+
+    spec = job["spec"]
+    t0 = time.perf_counter()
+    result = _write_trip(job["route"], Path(job["out_path"]), spec["speed_profile"], spec["driver_hours"],
+                         spec["sample_every_s"], spec["start_time_local"], spec["vehicle_id"], spec["trip_id"],
+                         spec["split_across_days"], spec["per_day_files"], spec["duty_windows"], spec["seed"],
+                         spec["output_format"])
+    if result["ok"]:
+        result["meta"]["elapsed_s"] = round(time.perf_counter() - t0, 3)
+    return result
+
+
+def generate_fleet_batch(trips: List[Dict], max_workers: Optional[int] = None) -> Dict:
+    """
+    Generate one telemetry file per trip spec.
+
+    `trips` are dicts shaped like `FleetTripSpec` (already defaulted). Returns
+    a ToolResult-shaped dict whose meta holds per-trip results (input order)
+    and batch totals.
+    """
+    t0 = time.perf_counter()
+    from .fleet_tools import _catalog_trip, _output_path
+
+    specs = [dict(t) for t in trips]
+    for s in specs:
+        if s.get("seed") is None:
+            s["seed"] = _trip_seed(s["vehicle_id"], s["trip_id"])
+    results: List[Optional[Dict]] = [None] * len(specs)
+
+    # 1) Geocode each distinct place once.
+    places = sorted({s["start"] for s in specs} | {s["end"] for s in specs})
+    geo: Dict[str, Tuple] = {}
+    with ThreadPoolExecutor(max_workers=min(8, max(1, len(places)))) as ex:
+        futs = {ex.submit(geocode, p): p for p in places}
+        for f in as_completed(futs):
+            try:
+                geo[futs[f]] = f.result()
+            except Exception as e:
+                geo[futs[f]] = e
+
+    # 2) Route each distinct (start, end, profile) once.
+    def route_key(s: Dict) -> Tuple:
+        return (s["start"], s["end"], s["profile"])
+
+    routes: Dict[Tuple, object] = {}
+
+    def do_route(key: Tuple):
+        start, end, profile = key
+        for place in (start, end):
+            if isinstance(geo[place], Exception):
+                raise geo[place]
+        return route_coords(geo[start][:2], geo[end][:2], profile=profile)
+
+    keys = sorted({route_key(s) for s in specs})
+    with ThreadPoolExecutor(max_workers=max(1, min(ROUTING_MAX_CONCURRENCY, len(keys)))) as ex:
+        futs = {ex.submit(do_route, k): k for k in keys}
+        for f in as_completed(futs):
+            try:
+                routes[futs[f]] = f.result()
+            except Exception as e:
+                routes[futs[f]] = e
+
+    # 3) Fan simulation/scheduling/writing out over processes.
+    workers = max_workers or FLEET_BATCH_MAX_WORKERS
+    pool = _get_pool(workers)
+    futs = {}
+    # Trip IDs repeat across vehicles, so default names include the vehicle; two specs
+    # that still land on one path (e.g. the same out_name) would overwrite each other's file.
+    claimed: Dict[Path, int] = {}
+    for i, s in enumerate(specs):
+        route = routes[route_key(s)]
+        if isinstance(route, Exception):
+            results[i] = {"ok": False, "message": f"Tool error: {route}"}
+            continue
+        try:
+            out_path = _output_path(s.get("out_name"), f"{s['vehicle_id']}-{s['trip_id']}",
+                                    geo[s["start"]][2], geo[s["end"]][2], s["output_format"])
+        except ValueError as e:
+            results[i] = {"ok": False, "message": f"Tool error: {e}"}
+            continue
+        if out_path in claimed:
+            first = specs[claimed[out_path]]
+            results[i] = {"ok": False, "message": f"Tool error: output path {out_path.name} is already used by "
+                                                  f"{first['vehicle_id']}/{first['trip_id']} in this batch"}
+            continue
+        claimed[out_path] = i
+        job = {"spec": s, "route": route, "out_path": str(out_path)}
+        futs[pool.submit(_run_trip, job)] = i
+    for f in as_completed(futs):
+        i = futs[f]
+        try:
+            results[i] = f.result()
+        except Exception as e:
+            results[i] = {"ok": False, "message": f"Tool error: {e}"}
+
+    trips_out = []
+    for s, r in zip(specs, results):
+        trips_out.append({"vehicle_id": s["vehicle_id"], "trip_id": s["trip_id"], **r})
+    done = [r for r in results if r["ok"]]
+    # Workers' own metrics die with their process; record their trips here, and catalog
+    # their files from this one process rather than from every worker at once.
+    for s, r in zip(specs, results):
+        if not r["ok"]:
+            continue
+        ROWS_GENERATED.inc(r["meta"]["rows"], format=r["meta"]["format"], mode="file")
+        observe_stages(r["meta"]["timings_s"])
+        _catalog_trip(r, s["vehicle_id"], s["trip_id"], geo[s["start"]][2], geo[s["end"]][2])
+    totals = {
+        "trips": len(specs),
+        "succeeded": len(done),
+        "failed": len(specs) - len(done),
+        "rows": sum(r["meta"]["rows"] for r in done),
+        "distance_km": round(sum(r["meta"]["distance_km"] for r in done), 3),
+        "fuel_used_l": round(sum(r["meta"]["fuel_used_l"] for r in done), 2),
+        "unique_places": len(places),
+        "unique_routes": len(keys),
+        "workers": workers,
+        "elapsed_s": round(time.perf_counter() - t0, 3),
+    }
+    return {"ok": bool(done), "message": f"{len(done)}/{len(specs)} trips generated",
+            "meta": {"totals": totals, "trips": trips_out}}
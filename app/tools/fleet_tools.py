@@ -1,11 +1,24 @@
+import asyncio
+import copy
+import hashlib
 import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
-from typing import Optional, Dict, List
+from typing import Optional, Dict, Iterator, List, Tuple
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
-from langchain_core.tools import tool
-from .geo_tools import geocode, route_coords, simulate
-from ..config import OUTPUT_DIR, DEFAULT_PROFILE, DEFAULT_SPEED_PROFILE, DEFAULT_SAMPLE_EVERY_S
+from langchain_core.tools import StructuredTool, tool
+from .columnar import EVENT_NAMES, Telemetry
+from .geo_tools import geocode, ageocode, route_coords, aroute_coords, simulate_chunks, _sim_cache_key
+from .fleet_batch import generate_fleet_batch
+from .metrics import ROWS_GENERATED, StageTimer
+from .stages import StageMemo, memo_chunks, stage_memo
+from ..config import (OUTPUT_DIR, DEFAULT_PROFILE, DEFAULT_SPEED_PROFILE, DEFAULT_SAMPLE_EVERY_S,
+                      DEFAULT_OUTPUT_FORMAT, DEFAULT_STOP_DWELL_S, PARQUET_ROW_GROUP_ROWS, STREAM_CHUNK_POINTS,
+                      SIM_ENGINE)
+from ..models.schemas import FleetBatchParams, FleetTripSpec
 import json
 
 # Ensures the parent directory of p exists (creates it recursively if not).
@@ -21,6 +34,70 @@ def _parse_dt(s: Optional[str]) -> datetime:
     # allow both "YYYY-MM-DD HH:MM" and full ISO
     return datetime.fromisoformat(s)
 
+# Parse duty windows like ["08:00-12:00", "13:00-17:00"] into sorted (start_s, end_s) pairs.
+def _parse_duty_windows(windows: Optional[List[str]]) -> Optional[List[Tuple[int, int]]]:
+    if not windows:
+        return None
+    parsed = []
+    for w in windows:
+        a, b = [x.strip() for x in w.split("-", 1)]
+        ha, ma = [int(x) for x in a.split(":")]
+        hb, mb = [int(x) for x in b.split(":")]
+        parsed.append((ha * 3600 + ma * 60, hb * 3600 + mb * 60))
+    parsed.sort()
+    for (s0, e0), (s1, _) in zip(parsed, parsed[1:] + [(86400, 86400)]):
+        if not 0 <= s0 < e0 <= s1:
+            raise ValueError(f"Invalid duty windows: {windows}")
+    return parsed
+
+_NS = 1_000_000_000
+_DAY_NS = 86400 * _NS
+
+# Closed-form timestamps for `n` consecutive telemetry rows.
+# Each day has a fixed number of row slots (one per sample inside each duty window), so
+# row k lands in day k // slots_per_day at slot k % slots_per_day -- no per-row loop needed.
+def _duty_timestamps(
+    n: int,
+    start_time: datetime,
+    driver_hours: float,
+    sample_every_s: int,
+    duty_windows: Optional[List[Tuple[int, int]]] = None,
+    row_offset: int = 0
+) -> Tuple[np.ndarray, np.ndarray]:
+    step_ns = int(sample_every_s) * _NS
+    start_ns = np.datetime64(start_time, "ns").astype(np.int64)
+    midnight_ns = start_ns - start_ns % _DAY_NS
+    tod_ns = start_ns - midnight_ns
+    # Row numbers within the whole trip, so a chunk starting at row_offset schedules the same.
+    k = np.arange(row_offset, row_offset + n, dtype=np.int64)
+
+    if duty_windows:
+        # Slots are wall-clock offsets from midnight; skip the ones before start_time on day 1.
+        slots = np.concatenate([
+            ws * _NS + np.arange(-(-(we - ws) // sample_every_s), dtype=np.int64) * step_ns
+            for ws, we in duty_windows
+        ])
+        skip = int(np.searchsorted(slots, tod_ns, side="left"))
+        k = k + skip
+        day, slot = np.divmod(k, len(slots))
+        ts = midnight_ns + day * _DAY_NS + slots[slot]
+        return ts.view("datetime64[ns]"), day - skip // len(slots) + 1
+
+    sec_per_day = int(driver_hours * 3600)
+    if sec_per_day <= 0:
+        raise ValueError("driver_hours must be positive")
+    rows_per_day = -(-sec_per_day // sample_every_s)
+    day, slot = np.divmod(k, rows_per_day)
+
+    # Day 1 starts at start_time; each later day starts at the next calendar day (after the
+    # previous duty window ends) at start_time's HH:MM.
+    hm_ns = (start_time.hour * 3600 + start_time.minute * 60) * _NS
+    first_gap = (tod_ns + sec_per_day * _NS) // _DAY_NS + 1
+    gap = (hm_ns + sec_per_day * _NS) // _DAY_NS + 1
+    later_start = midnight_ns + (first_gap + (day - 1) * gap) * _DAY_NS + hm_ns
+    ts = np.where(day == 0, start_ns, later_start) + slot * step_ns
+    return ts.view("datetime64[ns]"), day + 1
+
 # Assign timestamps so the driver only 'moves' during on-duty time windows.
 # This function maps those rows onto the calendar so that only driver_hours per day get timestamps.
 # When the day’s budget is exhausted, it jumps to next day 08:00 and continues.
@@ -28,64 +105,631 @@ def _schedule_across_days(
     df: pd.DataFrame,
     start_time: datetime,
     driver_hours: float,
-    sample_every_s: int
+    sample_every_s: int,
+    duty_windows: Optional[List[Tuple[int, int]]] = None,
+    row_offset: int = 0
 ) -> pd.DataFrame:
     """
     Assign timestamps so the driver only 'moves' during on-duty time windows.
     We consume the telemetry rows sequentially, but only 6h/day (driver_hours).
     At the end of each day's budget, we jump to next day 08:00 and continue.
-    """
-    df = df.copy().reset_index(drop=True)
-    sec_per_day = int(driver_hours * 3600)
-
-    # current duty window start/end
-    cur = start_time
-    duty_end = cur + timedelta(seconds=sec_per_day)
-
-    assigned_ts: List[datetime] = []
-    day_index: List[int] = []
-    is_on_duty: List[bool] = []
 
-    remaining_today = sec_per_day
-    day = 1
+    With `duty_windows` (parsed by `_parse_duty_windows`), each day instead runs
+    every window in turn (e.g. two shifts around a lunch break) and
+    `driver_hours` is ignored. Columns are added to `df` in place.
 
+    `row_offset` is the trip row number of `df`'s first row, for scheduling
+    one chunk of a longer trip.
+    """
     # we ignore df['ts_s'] for timestamping (ts_s is sim-time, not wall-clock)
-    for _ in range(len(df)):
-        # if out of daily budget, move to next day 08:00
-        if remaining_today <= 0:
-            # next day, same 08:00 start as start_time provided
-            base = (cur + timedelta(days=1)).replace(
-                hour=start_time.hour, minute=start_time.minute, second=0, microsecond=0
-            )
-            cur = base
-            duty_end = cur + timedelta(seconds=sec_per_day)
-            remaining_today = sec_per_day
-            day += 1
-
-        # assign this row to current time
-        assigned_ts.append(cur)
-        day_index.append(day)
-        is_on_duty.append(True)
-
-        # advance clock by sampling step
-        cur = cur + timedelta(seconds=sample_every_s)
-        remaining_today -= sample_every_s
-
-        # guard against overshoot a little: keep timestamps <= duty_end (cosmetic)
-        if cur > duty_end and remaining_today < 0:
-            cur = duty_end
-
-    df["timestamp"] = assigned_ts
-    df["drive_day"] = day_index
-    df["is_on_duty"] = is_on_duty
+    ts, day = _duty_timestamps(len(df), start_time, driver_hours, sample_every_s, duty_windows, row_offset)
+    df["timestamp"] = ts
+    df["drive_day"] = day
+    df["is_on_duty"] = True
     return df
 
 def json_dumps(d: Dict) -> str:
     return json.dumps(d, ensure_ascii=False)
 
-# Tool to plan a route and generate a telemetry CSV.
-@tool("plan_route_to_csv", return_direct=False)
-def plan_route_to_csv(
+# Turn simulated telemetry into the scheduled, column-ordered trip table.
+def _build_trip_frame(
+    telemetry,
+    start_dt: datetime,
+    driver_hours: float,
+    sample_every_s: int,
+    vehicle_id: str,
+    trip_id: str,
+    split_across_days: bool = True,
+    duty_windows: Optional[List[str]] = None,
+    row_offset: int = 0
+) -> pd.DataFrame:
+    df = _schedule_frame(telemetry, start_dt, driver_hours, sample_every_s, split_across_days, duty_windows,
+                         row_offset)
+    return _label_frame(df, vehicle_id, trip_id)
+
+# Schedule stage: simulated telemetry with wall-clock timestamps and drive days (no vehicle/trip yet).
+def _schedule_frame(
+    telemetry,
+    start_dt: datetime,
+    driver_hours: float,
+    sample_every_s: int,
+    split_across_days: bool = True,
+    duty_windows: Optional[List[str]] = None,
+    row_offset: int = 0
+) -> pd.DataFrame:
+    df = telemetry.to_pandas() if isinstance(telemetry, Telemetry) else pd.DataFrame(telemetry)
+    if df.empty:
+        return df
+
+    # Multi-day scheduling
+    if split_across_days:
+        df = _schedule_across_days(df, start_dt, driver_hours, sample_every_s,
+                                   _parse_duty_windows(duty_windows), row_offset)
+    else:
+        # legacy: single-window truncate/pad (kept for compatibility)
+        # Assign timestamps as simple start + ts_s, then trim to driver_hours
+        df["timestamp"] = pd.Timestamp(start_dt) + pd.to_timedelta(df["ts_s"].to_numpy(), unit="s")
+        window_end = start_dt + timedelta(hours=driver_hours)
+        df = df[df["timestamp"] <= window_end].reset_index(drop=True)
+        df["drive_day"] = 1
+        # df["is_on_duty"] = True
+    return df
+
+TRIP_COLUMNS = [
+    "timestamp", "vehicleID", "tripID", "drive_day", "leg",
+    "lat", "lon", "speed_kmph", "heading_deg", "event", "fuel_l_cumulative", "ts_s"
+]
+
+# Add the vehicle/trip columns and tidy the order, in a new frame (`df` may be a memoized one).
+# One-value categoricals cost a byte per row, not a string reference.
+def _label_frame(df: pd.DataFrame, vehicle_id: str, trip_id: str) -> pd.DataFrame:
+    if df.empty:
+        return df
+    out = df[[c for c in TRIP_COLUMNS if c in df.columns]]
+    codes = np.zeros(len(out), dtype=np.int8)
+    out.insert(1, "vehicleID", pd.Categorical.from_codes(codes, categories=[vehicle_id]))
+    out.insert(2, "tripID", pd.Categorical.from_codes(codes, categories=[trip_id]))
+    return out
+
+# IDs and place labels become part of a file name: no path separators.
+def _name_part(s: str) -> str:
+    return s.replace(" ", "_").replace("/", "_").replace("\\", "_")
+
+def _default_out_name(trip_id: str, start_label: str, end_label: str) -> str:
+    return f"{_name_part(trip_id)}-{_name_part(start_label[:12])}-{_name_part(end_label[:12])}.csv"
+
+# File extension per output format ("arrow" is an alias for Feather v2 / Arrow IPC).
+OUTPUT_FORMATS = {"csv": ".csv", "parquet": ".parquet", "feather": ".feather", "arrow": ".arrow"}
+
+def _output_path(out_name: Optional[str], trip_id: str, start_label: str, end_label: str,
+                 output_format: str = "csv") -> Path:
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output_format: {output_format} (expected one of {sorted(OUTPUT_FORMATS)})")
+    # Files are only ever written inside OUTPUT_DIR (API callers choose out_name and trip_id).
+    if out_name and (Path(out_name).name != out_name or out_name in (".", "..") or "\\" in out_name):
+        raise ValueError(f"out_name must be a file name without directories: {out_name!r}")
+    path = Path(OUTPUT_DIR) / (out_name or _default_out_name(trip_id, start_label, end_label))
+    if output_format != "csv":
+        path = path.with_suffix(OUTPUT_FORMATS[output_format])
+    return path
+
+# Every chunk shares one event dictionary, so chunks append to the same Parquet/Arrow schema.
+_EVENT_DTYPE = pd.CategoricalDtype([name for name in EVENT_NAMES if name])
+
+# Narrow dtypes for the binary formats: categorical strings, float32 measurements,
+# int32 sim-time and int16 day/leg numbers. Timestamps stay datetime64[ns].
+def _compact_frame(df: pd.DataFrame) -> pd.DataFrame:
+    dtypes = {
+        "vehicleID": "category", "tripID": "category", "event": _EVENT_DTYPE,
+        "lat": "float32", "lon": "float32", "speed_kmph": "float32", "heading_deg": "float32",
+        "fuel_l_cumulative": "float32", "ts_s": "int32", "drive_day": "int16", "leg": "int16",
+    }
+    return df.astype({c: t for c, t in dtypes.items() if c in df.columns})
+
+class _FrameWriter:
+    """
+    Append trip chunks to one output file, opened on the first write.
+
+    CSV chunks are written as they arrive (header once), so the file is the
+    same as one `to_csv` over the whole table. Parquet and Arrow IPC rows are
+    buffered into row groups / record batches of PARQUET_ROW_GROUP_ROWS, which
+    keeps compression as good as a single whole-table write.
+    """
+
+    def __init__(self, path: Path, output_format: str = "csv"):
+        self.path = path
+        self.output_format = output_format
+        self.rows = 0
+        self._fh = None
+        self._writer = None
+        self._pending: List = []
+        self._pending_rows = 0
+
+    def write(self, df: pd.DataFrame) -> None:
+        if self.output_format == "csv":
+            if self._fh is None:
+                _ensure_dir(self.path)
+                self._fh = open(self.path, "w", newline="", encoding="utf-8")
+            df.to_csv(self._fh, index=False, header=self.rows == 0)
+        else:
+            import pyarrow as pa
+            self._pending.append(pa.Table.from_pandas(_compact_frame(df), preserve_index=False))
+            self._pending_rows += len(df)
+            if self._pending_rows >= PARQUET_ROW_GROUP_ROWS:
+                self._flush()
+        self.rows += len(df)
+
+    def _flush(self) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        if not self._pending:
+            return
+        table = pa.concat_tables(self._pending).combine_chunks()
+        self._pending, self._pending_rows = [], 0
+        if self._writer is None:
+            _ensure_dir(self.path)
+            if self.output_format == "parquet":
+                self._writer = pq.ParquetWriter(str(self.path), table.schema, compression="zstd")
+            else:
+                self._writer = pa.ipc.new_file(str(self.path), table.schema,
+                                               options=pa.ipc.IpcWriteOptions(compression="zstd"))
+        if self.output_format == "parquet":
+            self._writer.write_table(table, row_group_size=PARQUET_ROW_GROUP_ROWS)
+        else:
+            self._writer.write_table(table, max_chunksize=PARQUET_ROW_GROUP_ROWS)
+
+    def close(self) -> None:
+        self._flush()
+        for h in (self._fh, self._writer):
+            if h is not None:
+                h.close()
+
+# Append chunks to the combined file and, optionally, one file per drive_day.
+# Returns (rows, days, per_day_paths). Days only move forward, so one per-day file is open at a time.
+def _write_trip_chunks(frames: Iterator[pd.DataFrame], out_path: Path, per_day_files: bool = False,
+                       output_format: str = "csv", timer: Optional[StageTimer] = None) -> Tuple[int, int, List[str]]:
+    timer = timer or StageTimer()
+    combined = _FrameWriter(out_path, output_format)
+    day_writer: Optional[_FrameWriter] = None
+    per_day_paths: List[str] = []
+    days = 0
+    try:
+        for df in frames:
+            with timer.stage("write"):
+                combined.write(df)
+                days = max(days, int(df["drive_day"].iloc[-1]))
+                if not per_day_files:
+                    continue
+                for d, g in df.groupby("drive_day", sort=True):
+                    per_path = out_path.parent / f"{out_path.stem}-day{d}{out_path.suffix}"
+                    if day_writer is None or day_writer.path != per_path:
+                        if day_writer is not None:
+                            day_writer.close()
+                        day_writer = _FrameWriter(per_path, output_format)
+                        per_day_paths.append(str(per_path))
+                    day_writer.write(g)
+    finally:
+        with timer.stage("write"):
+            combined.close()
+            if day_writer is not None:
+                day_writer.close()
+    return combined.rows, days, per_day_paths
+
+def _trip_meta(route: Dict, summary: Dict, rows: int, days: int, per_day_paths: List[str]) -> Dict:
+    return {
+        "distance_km": route["distance_km"],
+        "route_duration_sec": route["duration_sec"],
+        "sim_avg_speed_kmph": summary["avg_speed_kmph"],
+        "fuel_used_l": summary["fuel_used_l"],
+        "events": summary["events"],
+        "rows": rows,
+        "days": days,
+        "per_day_files": per_day_paths
+    }
+
+# Geometry indices of the intermediate stops of a multi-leg route (empty for a plain trip).
+def _route_stops(route: Dict) -> List[int]:
+    return [leg["end_index"] for leg in route.get("legs", [])[:-1]]
+
+# Label each leg of a routed trip with the places it runs between.
+def _label_legs(route: Dict, labels: List[str]) -> Dict:
+    if len(labels) > 2:
+        route["legs"] = [{**leg, "from": a, "to": b}
+                         for leg, a, b in zip(route["legs"], labels, labels[1:])]
+    return route
+
+# Geocode the endpoints and waypoints, then route through all of them in one request;
+# returns (route, start_label, end_label). Waypoints are geocoded concurrently.
+def resolve_trip(start: str, end: str, profile: str = DEFAULT_PROFILE,
+                 timer: Optional[StageTimer] = None,
+                 waypoints: Optional[List[str]] = None) -> Tuple[Dict, str, str]:
+    timer = timer or StageTimer()
+    places = [start, *(waypoints or []), end]
+    with timer.stage("geocode"):
+        if len(places) > 2:
+            with ThreadPoolExecutor(max_workers=min(8, len(places))) as pool:
+                points = list(pool.map(geocode, places))
+        else:
+            points = [geocode(start), geocode(end)]
+    coords = [(lat, lon) for lat, lon, _ in points]
+    with timer.stage("route"):
+        route = route_coords(coords[0], coords[-1], profile=profile, via=coords[1:-1])
+    labels = [label for _, _, label in points]
+    return _label_legs(route, labels), labels[0], labels[-1]
+
+async def aresolve_trip(start: str, end: str, profile: str = DEFAULT_PROFILE,
+                        timer: Optional[StageTimer] = None,
+                        waypoints: Optional[List[str]] = None) -> Tuple[Dict, str, str]:
+    timer = timer or StageTimer()
+    places = [start, *(waypoints or []), end]
+    with timer.stage("geocode"):
+        points = await asyncio.gather(*(ageocode(p) for p in places))
+    coords = [(lat, lon) for lat, lon, _ in points]
+    with timer.stage("route"):
+        route = await aroute_coords(coords[0], coords[-1], profile=profile, via=coords[1:-1])
+    labels = [label for _, _, label in points]
+    return _label_legs(route, labels), labels[0], labels[-1]
+
+# Per-leg rows, times, distance and fuel of a multi-stop trip, accumulated chunk by chunk
+# from the `leg` column. A leg's fuel includes the dwell at its end stop.
+def _update_leg_stats(stats: Dict[int, Dict], df: pd.DataFrame) -> None:
+    for leg, part in df.groupby("leg", sort=True):
+        s = stats.get(int(leg))
+        if s is None:
+            s = stats[int(leg)] = {"leg": int(leg), "rows": 0, "start_time": part["timestamp"].iloc[0]}
+        s["rows"] += len(part)
+        s["end_time"] = part["timestamp"].iloc[-1]
+        s["fuel_end_l"] = float(part["fuel_l_cumulative"].iloc[-1])
+
+def _legs_meta(route: Dict, stats: Dict[int, Dict]) -> List[Dict]:
+    legs, fuel = [], 0.0
+    for i, leg in enumerate(route["legs"], start=1):
+        s = stats.get(i)
+        entry = {"leg": i, "from": leg.get("from"), "to": leg.get("to"),
+                 "distance_km": leg["distance_km"], "route_duration_sec": leg["duration_sec"],
+                 "rows": s["rows"] if s else 0}
+        if s:
+            entry.update(start_time=s["start_time"].isoformat(), end_time=s["end_time"].isoformat(),
+                         fuel_used_l=round(s["fuel_end_l"] - fuel, 2))
+            fuel = s["fuel_end_l"]
+        legs.append(entry)
+    return legs
+
+# Simulate, schedule and write a routed trip chunk by chunk (the CPU-bound half of the pipeline).
+# Memory follows STREAM_CHUNK_POINTS rather than the trip length, plus what `stage_memo` keeps:
+# seeded trips reuse the scheduled chunks, or the whole written result, when only later stages'
+# inputs changed. Per-stage seconds (including geocode/route when `timer` came from resolve_trip)
+# are returned in meta["timings_s"]; stages served from the memo don't appear.
+def _write_trip(
+    route: Dict,
+    out_path: Path,
+    speed_profile: str,
+    driver_hours: float,
+    sample_every_s: int,
+    start_time_local: Optional[str],
+    vehicle_id: str,
+    trip_id: str,
+    split_across_days: bool,
+    per_day_files: bool,
+    duty_windows: Optional[List[str]],
+    seed: int,
+    output_format: str = DEFAULT_OUTPUT_FORMAT,
+    timer: Optional[StageTimer] = None,
+    stop_dwell_s: int = DEFAULT_STOP_DWELL_S
+) -> Dict:
+    timer = timer or StageTimer()
+    start_dt = _parse_dt(start_time_local)
+    schedule_key = write_key = None
+    if seed is not None:
+        # Stage keys, each on top of the one before (see stages.py); unseeded runs are never reused.
+        sim_key = _sim_cache_key(route["geometry"], sample_every_s, speed_profile, seed, SIM_ENGINE,
+                                 _route_stops(route), stop_dwell_s)
+        schedule_key = StageMemo.key("schedule", sim_key, start_dt, driver_hours, split_across_days, duty_windows)
+        write_key = StageMemo.key("write", schedule_key, vehicle_id, trip_id, output_format, per_day_files,
+                                  str(out_path), route["distance_km"], route["duration_sec"],
+                                  [(leg.get("from"), leg.get("to")) for leg in route.get("legs", [])])
+        written = stage_memo.get("write", write_key)
+        if written is not None and _files_unchanged(written["files"]):
+            result = copy.deepcopy(written["result"])
+            result["meta"]["timings_s"] = timer.finish()
+            return result
+
+    summary: Dict = {}
+    span: Dict = {}
+    leg_stats: Dict[int, Dict] = {}
+
+    def scheduled():
+        return _iter_scheduled(route, speed_profile, driver_hours, sample_every_s, start_dt, split_across_days,
+                               duty_windows, seed, STREAM_CHUNK_POINTS, timer, stop_dwell_s)
+
+    def frames():
+        # 2) Resample and simulate, 3) schedule across days -- per chunk, reused when only later stages changed
+        chunks = memo_chunks("schedule", schedule_key, scheduled, _chunk_bytes) if schedule_key else scheduled()
+        for df, summary_so_far in chunks:
+            summary.update(summary_so_far)
+            if not df.empty:
+                # 4) Vehicle/trip columns and column order
+                with timer.stage("write"):
+                    df = _label_frame(df, vehicle_id, trip_id)
+                span.setdefault("start_time", df["timestamp"].iloc[0])
+                span["end_time"] = df["timestamp"].iloc[-1]
+                if "leg" in df.columns:
+                    _update_leg_stats(leg_stats, df)
+                yield df
+
+    # 5) Append to the combined file, 6) optionally per-day files
+    rows, days, per_day_paths = _write_trip_chunks(frames(), out_path, per_day_files, output_format, timer)
+    if rows:
+        # 7) Size and content hash, for the output catalog
+        with timer.stage("hash"):
+            with open(out_path, "rb") as fh:
+                sha256 = hashlib.file_digest(fh, "sha256").hexdigest()
+    timings = timer.finish()
+    if not rows:
+        return {"ok": False, "message": "No telemetry generated (empty geometry?)"}
+
+    ROWS_GENERATED.inc(rows, format=output_format, mode="file")
+    meta = _trip_meta(route, summary, rows, days, per_day_paths)
+    meta["format"] = output_format
+    meta["start_time"] = span["start_time"].isoformat()
+    meta["end_time"] = span["end_time"].isoformat()
+    meta["bytes"] = out_path.stat().st_size
+    meta["sha256"] = sha256
+    if leg_stats:
+        meta["legs"] = _legs_meta(route, leg_stats)
+    meta["timings_s"] = timings
+    result = {"ok": True, "message": f"{output_format.upper()} generated", "path": str(out_path), "meta": meta}
+    if write_key is not None:
+        stage_memo.put("write", write_key, {"result": copy.deepcopy(result),
+                                            "files": _file_stats([out_path, *per_day_paths])}, 4096)
+    return result
+
+def _chunk_bytes(chunk: Tuple[pd.DataFrame, Dict]) -> int:
+    return int(chunk[0].memory_usage(index=False).sum())
+
+# (path, size, mtime) of written files: a memoized write is only reused while its files are untouched.
+def _file_stats(paths) -> List[Tuple[str, int, int]]:
+    stats = []
+    for p in paths:
+        st = os.stat(p)
+        stats.append((str(p), st.st_size, st.st_mtime_ns))
+    return stats
+
+def _files_unchanged(stats: List[Tuple[str, int, int]]) -> bool:
+    try:
+        return _file_stats([p for p, _, _ in stats]) == stats
+    except OSError:
+        return False
+
+def _finish_trip(
+    route: Dict,
+    start_label: str,
+    end_label: str,
+    speed_profile: str,
+    driver_hours: float,
+    sample_every_s: int,
+    start_time_local: Optional[str],
+    vehicle_id: str,
+    trip_id: str,
+    out_name: Optional[str],
+    split_across_days: bool,
+    per_day_files: bool,
+    duty_windows: Optional[List[str]],
+    seed: int,
+    output_format: str = DEFAULT_OUTPUT_FORMAT,
+    timer: Optional[StageTimer] = None,
+    stop_dwell_s: int = DEFAULT_STOP_DWELL_S
+) -> Dict:
+    out_path = _output_path(out_name, trip_id, start_label, end_label, output_format)
+    result = _write_trip(route, out_path, speed_profile, driver_hours, sample_every_s, start_time_local,
+                         vehicle_id, trip_id, split_across_days, per_day_files, duty_windows, seed,
+                         output_format, timer, stop_dwell_s)
+    _catalog_trip(result, vehicle_id, trip_id, start_label, end_label)
+    return result
+
+# Record a written trip in the output catalog. The file is already complete, so a catalog
+# failure (e.g. a locked database) is reported but doesn't fail the trip.
+def _catalog_trip(result: Dict, vehicle_id: str, trip_id: str, start_label: str, end_label: str) -> None:
+    from .catalog import record_output
+    try:
+        record_output(result, vehicle_id, trip_id, start_label, end_label)
+    except Exception as e:
+        print(f"Output catalog: could not record {result.get('path')}: {e}")
+
+def generate_trip(
+    start: str,
+    end: str,
+    profile: str = DEFAULT_PROFILE,
+    speed_profile: str = DEFAULT_SPEED_PROFILE,
+    driver_hours: float = 6.0,
+    sample_every_s: int = DEFAULT_SAMPLE_EVERY_S,
+    start_time_local: Optional[str] = None,
+    vehicle_id: str = "WB4222",
+    trip_id: str = "trip-0002",
+    out_name: Optional[str] = None,
+    split_across_days: bool = True,
+    per_day_files: bool = False,
+    duty_windows: Optional[List[str]] = None,
+    seed: int = 42,
+    output_format: str = DEFAULT_OUTPUT_FORMAT,
+    waypoints: Optional[List[str]] = None,
+    stop_dwell_s: int = DEFAULT_STOP_DWELL_S
+) -> Dict:
+    """The `plan_route_to_csv` pipeline as a plain function; returns the ToolResult dict."""
+    try:
+        # 1) Geocode and route (through the waypoints, if any)
+        timer = StageTimer()
+        route, start_label, end_label = resolve_trip(start, end, profile, timer, waypoints)
+        return _finish_trip(route, start_label, end_label, speed_profile, driver_hours, sample_every_s,
+                            start_time_local, vehicle_id, trip_id, out_name, split_across_days,
+                            per_day_files, duty_windows, seed, output_format, timer, stop_dwell_s)
+    except Exception as e:
+        return {"ok": False, "message": f"Tool error: {e}"}
+
+async def agenerate_trip(
+    start: str,
+    end: str,
+    profile: str = DEFAULT_PROFILE,
+    speed_profile: str = DEFAULT_SPEED_PROFILE,
+    driver_hours: float = 6.0,
+    sample_every_s: int = DEFAULT_SAMPLE_EVERY_S,
+    start_time_local: Optional[str] = None,
+    vehicle_id: str = "WB4222",
+    trip_id: str = "trip-0002",
+    out_name: Optional[str] = None,
+    split_across_days: bool = True,
+    per_day_files: bool = False,
+    duty_windows: Optional[List[str]] = None,
+    seed: int = 42,
+    output_format: str = DEFAULT_OUTPUT_FORMAT,
+    waypoints: Optional[List[str]] = None,
+    stop_dwell_s: int = DEFAULT_STOP_DWELL_S
+) -> Dict:
+    """
+    Async `generate_trip`: geocoding and routing are awaited (all places
+    concurrently), and the CPU-bound simulate/schedule/write step runs in the
+    loop's default executor so the event loop stays free.
+    """
+    try:
+        timer = StageTimer()
+        route, start_label, end_label = await aresolve_trip(start, end, profile, timer, waypoints)
+        return await asyncio.get_running_loop().run_in_executor(None, partial(
+            _finish_trip, route, start_label, end_label, speed_profile, driver_hours, sample_every_s,
+            start_time_local, vehicle_id, trip_id, out_name, split_across_days,
+            per_day_files, duty_windows, seed, output_format, timer, stop_dwell_s))
+    except Exception as e:
+        return {"ok": False, "message": f"Tool error: {e}"}
+
+# Streaming: the scheduled trip table in chunks, so memory stays bounded by the chunk size.
+STREAM_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+# One scheduled chunk per block of resampled points, with the simulation summary so far.
+# In legacy single-window mode, chunks past the window come back empty but are still simulated,
+# so the summary covers the whole route as it does for the unchunked pipeline.
+def _iter_trip_chunks(
+    route: Dict,
+    speed_profile: str,
+    driver_hours: float,
+    sample_every_s: int,
+    start_time_local: Optional[str],
+    vehicle_id: str,
+    trip_id: str,
+    split_across_days: bool,
+    duty_windows: Optional[List[str]],
+    seed: int,
+    chunk_points: int = STREAM_CHUNK_POINTS,
+    timer: Optional[StageTimer] = None,
+    stop_dwell_s: int = DEFAULT_STOP_DWELL_S
+) -> Iterator[Tuple[pd.DataFrame, Dict]]:
+    timer = timer or StageTimer()
+    for df, summary in _iter_scheduled(route, speed_profile, driver_hours, sample_every_s,
+                                       _parse_dt(start_time_local), split_across_days, duty_windows, seed,
+                                       chunk_points, timer, stop_dwell_s):
+        with timer.stage("schedule"):
+            df = _label_frame(df, vehicle_id, trip_id)
+        yield df, summary
+
+# Simulated chunks with timestamps and drive days (`_schedule_frame`), without the vehicle/trip
+# columns, and the simulation summary so far.
+def _iter_scheduled(
+    route: Dict,
+    speed_profile: str,
+    driver_hours: float,
+    sample_every_s: int,
+    start_dt: datetime,
+    split_across_days: bool,
+    duty_windows: Optional[List[str]],
+    seed: int,
+    chunk_points: int,
+    timer: StageTimer,
+    stop_dwell_s: int
+) -> Iterator[Tuple[pd.DataFrame, Dict]]:
+    row_offset = 0
+    closed = False
+    # "simulate" covers resampling too: both run lazily inside simulate_chunks
+    for cols, summary in timer.timed("simulate", simulate_chunks(
+            route["geometry"], sample_every_s=sample_every_s, speed_profile=speed_profile, seed=seed,
+            chunk_points=chunk_points, stops=_route_stops(route), dwell_s=stop_dwell_s)):
+        n = cols.rows
+        if closed:
+            yield pd.DataFrame(), summary
+            continue
+        with timer.stage("schedule"):
+            df = _schedule_frame(cols, start_dt, driver_hours, sample_every_s, split_across_days,
+                                 duty_windows, row_offset)
+        row_offset += n
+        closed = len(df) < n
+        yield df, summary
+
+def iter_trip_frames(
+    route: Dict,
+    speed_profile: str = DEFAULT_SPEED_PROFILE,
+    driver_hours: float = 6.0,
+    sample_every_s: int = DEFAULT_SAMPLE_EVERY_S,
+    start_time_local: Optional[str] = None,
+    vehicle_id: str = "WB4222",
+    trip_id: str = "trip-0002",
+    split_across_days: bool = True,
+    duty_windows: Optional[List[str]] = None,
+    seed: int = 42,
+    chunk_points: int = STREAM_CHUNK_POINTS,
+    timer: Optional[StageTimer] = None,
+    stop_dwell_s: int = DEFAULT_STOP_DWELL_S
+) -> Iterator[pd.DataFrame]:
+    """
+    Yield the scheduled trip table for a routed trip, `chunk_points` resampled
+    points at a time. Concatenated, the chunks equal `_build_trip_frame` over
+    the whole simulation for the same seed. Multi-leg routes (from `waypoints`)
+    get a `leg` column and `stop_dwell_s` of standing rows at each stop.
+    """
+    chunks = _iter_trip_chunks(route, speed_profile, driver_hours, sample_every_s, start_time_local,
+                               vehicle_id, trip_id, split_across_days, duty_windows, seed, chunk_points, timer,
+                               stop_dwell_s)
+    try:
+        for df, _ in chunks:
+            if df.empty:
+                # past the legacy single window: nothing more to send
+                return
+            yield df
+    finally:
+        chunks.close()
+
+def _encode_frame(df: pd.DataFrame, stream_format: str, header: bool) -> str:
+    if stream_format == "csv":
+        return df.to_csv(index=False, header=header)
+    # float32 speed/heading hold values the engine rounded to 0.1; widen them so JSON says 42.3, not 42.2999992371
+    wide = {c: df[c].astype(np.float64).round(1) for c in df.columns if df[c].dtype == np.float32}
+    text = df.assign(**wide).to_json(orient="records", lines=True, date_format="iso", date_unit="s")
+    return text if text.endswith("\n") else text + "\n"
+
+def iter_trip_stream(route: Dict, stream_format: str = "ndjson", timer: Optional[StageTimer] = None,
+                     **trip) -> Iterator[str]:
+    """
+    Encode `iter_trip_frames(route, **trip)` as NDJSON lines or CSV text (header once).
+    Stage timings and streamed rows are recorded in the metrics when the stream ends.
+    """
+    if stream_format not in STREAM_MEDIA_TYPES:
+        raise ValueError(f"Unknown stream format: {stream_format} (expected one of {sorted(STREAM_MEDIA_TYPES)})")
+    timer = timer or StageTimer()
+    rows = 0
+    try:
+        for i, df in enumerate(iter_trip_frames(route, timer=timer, **trip)):
+            with timer.stage("encode"):
+                text = _encode_frame(df, stream_format, header=(i == 0))
+            rows += len(df)
+            yield text
+    finally:
+        timer.finish()
+        ROWS_GENERATED.inc(rows, format=stream_format, mode="stream")
+
+def _log_tool_call(start, end, profile, speed_profile, driver_hours, sample_every_s, start_time_local,
+                   vehicle_id, trip_id, out_name, waypoints=None):
+    print(f"Tool called with start={start}, end={end}, waypoints={waypoints}, profile={profile}, "
+        f"speed_profile={speed_profile}, "
+        f"driver_hours={driver_hours}, sample_every_s={sample_every_s}, start_time_local={start_time_local}, "
+        f"vehicle_id={vehicle_id}, trip_id={trip_id}, out_name={out_name}")
+
+def _plan_route_to_csv(
     start: str,
     end: str,
     profile: str = DEFAULT_PROFILE,
@@ -97,7 +741,11 @@ def plan_route_to_csv(
     trip_id: str = "trip-0002",
     out_name: Optional[str] = None,
     split_across_days: bool = True,
-    per_day_files: bool = False
+    per_day_files: bool = False,
+    duty_windows: Optional[List[str]] = None,
+    output_format: str = DEFAULT_OUTPUT_FORMAT,
+    waypoints: Optional[List[str]] = None,
+    stop_dwell_s: int = DEFAULT_STOP_DWELL_S
 ) -> str:
     """
     Build a telemetry CSV for one trip.
@@ -107,78 +755,77 @@ def plan_route_to_csv(
     telemetry rows are assigned (i.e., until the route is 'completed').
 
     If per_day_files=True, also writes separate CSVs per drive_day.
+
+    duty_windows (e.g. ["08:00-12:00", "13:00-17:00"]) replaces the single
+    driver_hours window with several shifts per day, with breaks in between.
+
+    output_format: "csv" (default), "parquet" (zstd) or "feather"/"arrow"
+    (Arrow IPC); the binary formats use compact dtypes.
+
+    waypoints (e.g. ["Durgapur", "Asansol"]) are stops between start and end,
+    in order: the trip is one continuous drive through them, standing
+    stop_dwell_s seconds at each, and the file gets a `leg` column.
     """
+    _log_tool_call(start, end, profile, speed_profile, driver_hours, sample_every_s, start_time_local,
+                   vehicle_id, trip_id, out_name, waypoints)
+    return json_dumps(generate_trip(
+        start, end, profile=profile, speed_profile=speed_profile, driver_hours=driver_hours,
+        sample_every_s=sample_every_s, start_time_local=start_time_local, vehicle_id=vehicle_id,
+        trip_id=trip_id, out_name=out_name, split_across_days=split_across_days,
+        per_day_files=per_day_files, duty_windows=duty_windows, output_format=output_format,
+        waypoints=waypoints, stop_dwell_s=stop_dwell_s
+    ))
 
-    print(f"Tool called with start={start}, end={end}, profile={profile}, speed_profile={speed_profile}, "
-        f"driver_hours={driver_hours}, sample_every_s={sample_every_s}, start_time_local={start_time_local}, "
-        f"vehicle_id={vehicle_id}, trip_id={trip_id}, out_name={out_name}")
-    try:
-        # 1) Geocode and route
-        start_lat, start_lon, start_label = geocode(start)
-        end_lat, end_lon, end_label = geocode(end)
-        route = route_coords((start_lat, start_lon), (end_lat, end_lon), profile=profile)
-
-        # 2) Simulate full route once (this yields the whole geometry’s telemetry)
-        sim = simulate(
-            route["geometry"],
-            sample_every_s=sample_every_s,
-            speed_profile=speed_profile,
-            seed=42
-        )
-        df = pd.DataFrame(sim["telemetry"])
-        if df.empty:
-            return json_dumps({"ok": False, "message": "No telemetry generated (empty geometry?)"})
-
-        # 3) Multi-day scheduling
-        start_dt = _parse_dt(start_time_local)
-        if split_across_days:
-            df = _schedule_across_days(df, start_dt, driver_hours, sample_every_s)
-        else:
-            # legacy: single-window truncate/pad (kept for compatibility)
-            # Assign timestamps as simple start + ts_s, then trim to driver_hours
-            df = df.copy()
-            df["timestamp"] = [start_dt + timedelta(seconds=int(t)) for t in df["ts_s"]]
-            window_end = start_dt + timedelta(hours=driver_hours)
-            df = df[df["timestamp"] <= window_end].reset_index(drop=True)
-            df["drive_day"] = 1
-            # df["is_on_duty"] = True
-
-        # 4) Add required columns and tidy order
-        df.insert(0, "vehicleID", vehicle_id)
-        df.insert(1, "tripID", trip_id)
-
-        cols = [
-            "timestamp", "vehicleID", "tripID", "drive_day",
-            "lat", "lon", "speed_kmph", "heading_deg", "event", "fuel_l_cumulative", "ts_s"
-        ]
-        df = df[[c for c in cols if c in df.columns]]
-
-        # 5) Save combined CSV
-        out_dir = Path(OUTPUT_DIR)
-        _ensure_dir(out_dir)
-        base_name = out_name or f"{trip_id}-{start_label[:12].replace(' ','_')}-{end_label[:12].replace(' ','_')}.csv"
-        out_path = out_dir / base_name
-        df.to_csv(out_path, index=False)
-
-        # 6) Optionally save per-day files
-        per_day_paths: List[str] = []
-        if per_day_files:
-            for d, g in df.groupby("drive_day", sort=True):
-                per_path = out_dir / f"{Path(base_name).stem}-day{d}{Path(base_name).suffix}"
-                g.to_csv(per_path, index=False)
-                per_day_paths.append(str(per_path))
-
-        meta = {
-            "distance_km": route["distance_km"],
-            "route_duration_sec": route["duration_sec"],
-            "sim_avg_speed_kmph": sim["summary"]["avg_speed_kmph"],
-            "fuel_used_l": sim["summary"]["fuel_used_l"],
-            "events": sim["summary"]["events"],
-            "rows": len(df),
-            "days": int(df["drive_day"].max()),
-            "per_day_files": per_day_paths
-        }
-        return json_dumps({"ok": True, "message": "CSV generated", "path": str(out_path), "meta": meta})
+async def _aplan_route_to_csv(
+    start: str,
+    end: str,
+    profile: str = DEFAULT_PROFILE,
+    speed_profile: str = DEFAULT_SPEED_PROFILE,
+    driver_hours: float = 6.0,
+    sample_every_s: int = DEFAULT_SAMPLE_EVERY_S,
+    start_time_local: Optional[str] = None,
+    vehicle_id: str = "WB4222",
+    trip_id: str = "trip-0002",
+    out_name: Optional[str] = None,
+    split_across_days: bool = True,
+    per_day_files: bool = False,
+    duty_windows: Optional[List[str]] = None,
+    output_format: str = DEFAULT_OUTPUT_FORMAT,
+    waypoints: Optional[List[str]] = None,
+    stop_dwell_s: int = DEFAULT_STOP_DWELL_S
+) -> str:
+    _log_tool_call(start, end, profile, speed_profile, driver_hours, sample_every_s, start_time_local,
+                   vehicle_id, trip_id, out_name, waypoints)
+    return json_dumps(await agenerate_trip(
+        start, end, profile=profile, speed_profile=speed_profile, driver_hours=driver_hours,
+        sample_every_s=sample_every_s, start_time_local=start_time_local, vehicle_id=vehicle_id,
+        trip_id=trip_id, out_name=out_name, split_across_days=split_across_days,
+        per_day_files=per_day_files, duty_windows=duty_windows, output_format=output_format,
+        waypoints=waypoints, stop_dwell_s=stop_dwell_s
+    ))
+
+# Tool to plan a route and generate a telemetry CSV.
+# Built with both implementations so agent `ainvoke` runs the async path natively.
+plan_route_to_csv = StructuredTool.from_function(
+    func=_plan_route_to_csv,
+    coroutine=_aplan_route_to_csv,
+    name="plan_route_to_csv",
+    return_direct=False,
+)
 
+# Tool to generate many vehicles' trips in one call.
+@tool("plan_fleet_batch_to_csv", args_schema=FleetBatchParams, return_direct=False)
+def plan_fleet_batch_to_csv(trips: List[FleetTripSpec], max_workers: Optional[int] = None) -> str:
+    """
+    Build telemetry CSVs for a whole fleet: one file per (vehicle_id, trip_id).
+
+    Use this instead of calling plan_route_to_csv repeatedly when the user asks
+    for several vehicles or trips. Shared places and routes are resolved once
+    and simulations run in parallel.
+    """
+    specs = [t.model_dump() if isinstance(t, FleetTripSpec) else FleetTripSpec(**t).model_dump() for t in trips]
+    print(f"Fleet batch tool called with {len(specs)} trips, max_workers={max_workers}")
+    try:
+        return json_dumps(generate_fleet_batch(specs, max_workers=max_workers))
     except Exception as e:
         return json_dumps({"ok": False, "message": f"Tool error: {e}"})
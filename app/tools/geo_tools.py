@@ -1,13 +1,70 @@
-from typing import Tuple, List, Dict, Optional
-import os, json, urllib.parse, urllib.request, math
-import polyline
-from geopy.geocoders import Nominatim
-from haversine import haversine, Unit
-
-_geocoder = Nominatim(user_agent="route-agent-demo")
-OSRM_BASE = os.getenv("OSRM_BASE", "https://router.project-osrm.org")
-
-def geocode(q: str) -> Tuple[float, float, str]:
+from typing import Tuple, Iterator, List, Dict, Optional
+import asyncio, hashlib, io, json, math
+import numpy as np
+import zstandard
+from haversine import haversine_vector, Unit
+from . import sim_engine
+from .cache import PersistentCache
+from .columnar import Geometry, Telemetry, as_geometry, decode_polyline
+from .concurrency import SingleFlight, AsyncSingleFlight, RateLimiter
+from .routing_client import get_routing_client
+from .stages import StageMemo, memo_chunks, stage_memo
+from ..config import (SIM_ENGINE, CACHE_DB_PATH, ROUTE_CACHE_TTL_S, ROUTE_CACHE_MAX_ENTRIES,
+                      GEOCODE_CACHE_TTL_S, GEOCODE_NEGATIVE_TTL_S, GEOCODE_CACHE_MAX_ENTRIES,
+                      NOMINATIM_MIN_INTERVAL_S, SIM_CACHE_TTL_S, SIM_CACHE_MAX_ENTRIES, SIM_CACHE_MAX_BYTES,
+                      SIM_CACHE_MAX_ENTRY_BYTES, SIM_FLIGHT_WAIT_S)
+
+_geocoder = None
+
+def _get_geocoder():
+    # geopy (and its aiohttp adapter) is only imported once a lookup actually goes to Nominatim.
+    global _geocoder
+    if _geocoder is None:
+        from geopy.geocoders import Nominatim
+        _geocoder = Nominatim(user_agent="route-agent-demo")
+    return _geocoder
+
+# Routes keyed by rounded endpoints/profile/excludes; the geometry is stored as the OSRM polyline.
+route_cache = PersistentCache(CACHE_DB_PATH, "route", ttl_s=ROUTE_CACHE_TTL_S,
+                              max_entries=ROUTE_CACHE_MAX_ENTRIES)
+
+def _route_cache_key(coords: List[Tuple[float, float]], osrm_profile: str, excludes: str) -> str:
+    # 5 decimal places is ~1 m, well inside OSRM's own snapping tolerance.
+    pts = ";".join(f"{lat:.5f},{lon:.5f}" for lat, lon in coords)
+    return f"{get_routing_client().base_url}|{osrm_profile}|{excludes}|{pts}"
+
+# Geocodes keyed by normalised query; failed lookups are cached too, for a shorter time.
+geocode_cache = PersistentCache(CACHE_DB_PATH, "geocode", ttl_s=GEOCODE_CACHE_TTL_S,
+                                max_entries=GEOCODE_CACHE_MAX_ENTRIES, memory_entries=2048)
+_geocode_flight = SingleFlight()
+_ageocode_flight = AsyncSingleFlight()
+_nominatim_limiter = RateLimiter(NOMINATIM_MIN_INTERVAL_S)
+
+def _normalize_query(q: str) -> str:
+    return " ".join(q.casefold().split())
+
+def _store_geocode(q: str, key: str, loc) -> Tuple[float, float, str]:
+    if not loc:
+        geocode_cache.set(key, json.dumps({"miss": True}).encode("utf-8"), ttl_s=GEOCODE_NEGATIVE_TTL_S)
+        raise ValueError(f"Could not geocode: {q}")
+    result = (loc.latitude, loc.longitude, loc.address)
+    geocode_cache.set(key, json.dumps(result).encode("utf-8"))
+    return result
+
+def _geocode_remote(q: str, key: str) -> Tuple[float, float, str]:
+    _nominatim_limiter.acquire()
+    return _store_geocode(q, key, _get_geocoder().geocode(q, timeout=10))
+
+async def _ageocode_remote(q: str, key: str) -> Tuple[float, float, str]:
+    from geopy.adapters import AioHTTPAdapter
+    from geopy.geocoders import Nominatim
+    await _nominatim_limiter.acquire_async()
+    async with Nominatim(user_agent="route-agent-demo", adapter_factory=AioHTTPAdapter) as geocoder:
+        loc = await geocoder.geocode(q, timeout=10)
+    return await asyncio.to_thread(_store_geocode, q, key, loc)
+
+# Resolve "lat,lon" literals and cache hits without any I/O; None means a remote lookup is needed.
+def _geocode_local(q: str) -> Optional[Tuple[float, float, str]]:
     if "," in q:
         # allow "lat,lon"
         try:
@@ -15,30 +72,100 @@ def geocode(q: str) -> Tuple[float, float, str]:
             return (lat, lon, f"{lat},{lon}")
         except Exception:
             pass
-    loc = _geocoder.geocode(q, timeout=10)
-    if not loc:
-        raise ValueError(f"Could not geocode: {q}")
-    return (loc.latitude, loc.longitude, loc.address)
+    cached = geocode_cache.get(_normalize_query(q))
+    if cached is not None:
+        entry = json.loads(cached)
+        if isinstance(entry, dict):
+            raise ValueError(f"Could not geocode: {q}")
+        return tuple(entry)
+    return None
 
-def route_coords(start: Tuple[float, float], end: Tuple[float, float],
-                profile: str = "driving-car",
-                avoid: Optional[List[str]] = None) -> Dict:
+def geocode(q: str) -> Tuple[float, float, str]:
+    hit = _geocode_local(q)
+    if hit is not None:
+        return hit
+    # Concurrent lookups of the same place share one rate-limited Nominatim request.
+    key = _normalize_query(q)
+    return _geocode_flight.do(key, lambda: _geocode_remote(q, key))
+
+async def ageocode(q: str) -> Tuple[float, float, str]:
+    """Async `geocode`; shares the cache and the Nominatim rate limit with sync callers."""
+    # The cache is SQLite: read and write it off the event loop.
+    hit = await asyncio.to_thread(_geocode_local, q)
+    if hit is not None:
+        return hit
+    key = _normalize_query(q)
+    return await _ageocode_flight.do(key, lambda: _ageocode_remote(q, key))
+
+def seed_geocode_cache(entries: Dict[str, Tuple[float, float, str]]) -> int:
+    """Pre-seed the cache with known places, e.g. {"Kolkata": (22.57, 88.36, "Kolkata, West Bengal, India")}."""
+    for q, (lat, lon, label) in entries.items():
+        geocode_cache.set(_normalize_query(q), json.dumps([lat, lon, label]).encode("utf-8"))
+    return len(entries)
+
+def geocode_cache_entries() -> List[Dict]:
+    """Inspect cached geocodes (including negative entries)."""
+    out = []
+    for key, value, expires in geocode_cache.items():
+        entry = json.loads(value)
+        row = {"query": key, "expires_at": expires}
+        if isinstance(entry, dict):
+            row["miss"] = True
+        else:
+            row.update({"lat": entry[0], "lon": entry[1], "label": entry[2]})
+        out.append(row)
+    return out
+
+# OSRM profile and `exclude` classes for a profile name and avoid list (shared with the matrix service).
+def _osrm_profile(profile: str, avoid: Optional[List[str]]) -> Tuple[str, str]:
     profile_map = {"driving-car": "driving", "cycling-regular": "cycling", "foot-walking": "foot"}
     osrm_profile = profile_map.get(profile, "driving")
     avoid = avoid or []
     avoid_map = {"ferries": "ferry", "tolls": "toll", "highways": "motorway"}
     excludes = ",".join(sorted({avoid_map[a] for a in avoid if a in avoid_map}))
+    return osrm_profile, excludes
+
+# Build the cache key and OSRM query for a route request.
+def _route_request(coords: List[Tuple[float, float]], profile: str,
+                   avoid: Optional[List[str]]) -> Tuple[str, str, Dict]:
+    osrm_profile, excludes = _osrm_profile(profile, avoid)
 
-    coords_part = f"{start[1]},{start[0]};{end[1]},{end[0]}"
     query = {"overview": "full", "geometries": "polyline", "steps": "false", "alternatives": "false"}
     if excludes:
         query["exclude"] = excludes
-    url = f"{OSRM_BASE}/route/v1/{osrm_profile}/{coords_part}?{urllib.parse.urlencode(query)}"
-
-    req = urllib.request.Request(url, headers={"User-Agent": "route-agent-demo"})
-    with urllib.request.urlopen(req, timeout=20) as resp:
-        data = json.loads(resp.read().decode("utf-8"))
-
+    return _route_cache_key(coords, osrm_profile, excludes), osrm_profile, query
+
+# `legs` are [{"distance_km", "duration_sec", "end_index"}], end_index being the geometry vertex of the
+# leg's last waypoint; a plain start/end route is one leg ending at the last vertex.
+def _route_result(distance_km: float, duration_sec: int, poly: str, legs: Optional[List[Dict]] = None) -> Dict:
+    geometry = Geometry.from_polyline(poly)
+    if not legs:
+        legs = [{"distance_km": distance_km, "duration_sec": duration_sec, "end_index": max(0, len(geometry) - 1)}]
+    return {"distance_km": distance_km, "duration_sec": duration_sec, "polyline": poly, "geometry": geometry,
+            "legs": legs}
+
+def _route_from_cache(cache_key: str) -> Optional[Dict]:
+    cached = route_cache.get(cache_key)
+    if cached is None:
+        return None
+    entry = json.loads(cached)
+    return _route_result(entry["distance_km"], entry["duration_sec"], entry["polyline"], entry.get("legs"))
+
+# Geometry vertex of each intermediate waypoint. OSRM's full overview is the legs' geometries
+# joined end to end, so each snapped waypoint is a vertex (to polyline precision): take the first
+# one after the previous stop, falling back to the nearest vertex.
+def _leg_end_indices(poly: str, waypoints: List[Dict]) -> List[int]:
+    pts_lat, pts_lon = decode_polyline(poly)
+    ends, prev = [], 0
+    for wp in waypoints[1:-1]:
+        lon, lat = wp["location"]
+        d2 = (pts_lat[prev:] - lat) ** 2 + (pts_lon[prev:] - lon) ** 2
+        close = np.flatnonzero(d2 <= 2e-10)   # within ~1.5e-5 degrees
+        prev += int(close[0]) if len(close) else int(np.argmin(d2))
+        ends.append(prev)
+    return ends + [len(pts_lat) - 1]
+
+def _route_from_response(data: Dict, cache_key: str) -> Dict:
     if data.get("code") != "Ok" or not data.get("routes"):
         raise ValueError(f"OSRM error: {data.get('message', data.get('code'))}")
 
@@ -46,9 +173,59 @@ def route_coords(start: Tuple[float, float], end: Tuple[float, float],
     distance_km = route.get("distance", 0.0) / 1000.0
     duration_sec = int(route.get("duration", 0.0))
     poly = route.get("geometry", "")
-    decoded = polyline.decode(poly, precision=5) if poly else []
-    geometry = [{"lat": lat, "lon": lon} for lat, lon in decoded]
-    return {"distance_km": round(distance_km, 3), "duration_sec": duration_sec, "polyline": poly, "geometry": geometry}
+    entry = {"distance_km": round(distance_km, 3), "duration_sec": duration_sec, "polyline": poly}
+    waypoints = data.get("waypoints") or []
+    if len(waypoints) > 2 and len(route.get("legs") or []) == len(waypoints) - 1:
+        entry["legs"] = [
+            {"distance_km": round(leg.get("distance", 0.0) / 1000.0, 3), "duration_sec": int(leg.get("duration", 0.0)),
+             "end_index": end}
+            for leg, end in zip(route["legs"], _leg_end_indices(poly, waypoints))
+        ]
+    route_cache.set(cache_key, json.dumps(entry).encode("utf-8"))
+    return _route_result(entry["distance_km"], duration_sec, poly, entry.get("legs"))
+
+def route_coords(start: Tuple[float, float], end: Tuple[float, float],
+                profile: str = "driving-car",
+                avoid: Optional[List[str]] = None,
+                via: Optional[List[Tuple[float, float]]] = None) -> Dict:
+    """
+    Route from `start` to `end` through the `via` stops in order, in one OSRM request.
+    The result's `legs` mark where each stop falls in the geometry.
+    """
+    coords = [start, *(via or []), end]
+    cache_key, osrm_profile, query = _route_request(coords, profile, avoid)
+    cached = _route_from_cache(cache_key)
+    if cached is not None:
+        return cached
+    data = get_routing_client().route(coords, osrm_profile, query)
+    return _route_from_response(data, cache_key)
+
+async def aroute_coords(start: Tuple[float, float], end: Tuple[float, float],
+                        profile: str = "driving-car",
+                        avoid: Optional[List[str]] = None,
+                        via: Optional[List[Tuple[float, float]]] = None) -> Dict:
+    """Async `route_coords` over the routing client's async pool; shares the route cache."""
+    coords = [start, *(via or []), end]
+    cache_key, osrm_profile, query = _route_request(coords, profile, avoid)
+    # Cache reads/writes (SQLite) and polyline decoding run off the event loop.
+    cached = await asyncio.to_thread(_route_from_cache, cache_key)
+    if cached is not None:
+        return cached
+    data = await get_routing_client().aroute(coords, osrm_profile, query)
+    return await asyncio.to_thread(_route_from_response, data, cache_key)
+
+def warm_route_cache(corridors: List[Tuple[str, str]], profile: str = "driving-car") -> Dict:
+    """Geocode and route each (start, end) pair so later requests are served from the route cache."""
+    warmed, failed = 0, []
+    for start, end in corridors:
+        try:
+            s_lat, s_lon, _ = geocode(start)
+            e_lat, e_lon, _ = geocode(end)
+            route_coords((s_lat, s_lon), (e_lat, e_lon), profile=profile)
+            warmed += 1
+        except Exception as e:
+            failed.append({"start": start, "end": end, "error": str(e)})
+    return {"warmed": warmed, "failed": failed, "cache": route_cache.stats()}
 
 def _bearing(a, b):
     lat1 = math.radians(a["lat"]); lon1 = math.radians(a["lon"])
@@ -59,50 +236,343 @@ def _bearing(a, b):
     deg = (math.degrees(math.atan2(x, y)) + 360) % 360
     return deg
 
-def _interp(a, b, t):
-    return {"lat": a["lat"] + (b["lat"] - a["lat"]) * t, "lon": a["lon"] + (b["lon"] - a["lon"]) * t}
+# Vectorised `_bearing` between consecutive points; the first point reuses the first segment.
+def _bearings(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    if len(lat) < 2:
+        return np.zeros(len(lat))
+    lat_r = np.radians(lat); lon_r = np.radians(lon)
+    lat1, lat2 = lat_r[:-1], lat_r[1:]
+    dlon = lon_r[1:] - lon_r[:-1]
+    x = np.sin(dlon)*np.cos(lat2)
+    y = np.cos(lat1)*np.sin(lat2) - np.sin(lat1)*np.cos(lat2)*np.cos(dlon)
+    deg = (np.degrees(np.arctan2(x, y)) + 360) % 360
+    return np.concatenate((deg[:1], deg))
+
+# Place points every `step_m` metres along consecutive segments, starting `carry` metres in.
+# Returns the new points and the carry into the next segment (shared by the whole-route and
+# chunked resamplers, so both place every point with the same arithmetic).
+def _resample_segments(lat: np.ndarray, lon: np.ndarray, step_m: float,
+                       carry: float = 0.0) -> Tuple[np.ndarray, np.ndarray, float]:
+    seg = haversine_vector(np.column_stack((lat[:-1], lon[:-1])),
+                           np.column_stack((lat[1:], lon[1:])), unit=Unit.METERS)
+
+    # Offset of the first point inside each segment and how many points it emits.
+    carry_in: List[float] = []
+    counts: List[int] = []
+    for s in seg.tolist():
+        carry_in.append(carry)
+        if s == 0:
+            counts.append(0)
+            continue
+        rest = s - carry
+        k = int(rest // step_m) if rest >= step_m else 0
+        counts.append(k)
+        carry = rest - k * step_m
+
+    counts_a = np.asarray(counts, dtype=np.int64)
+    seg_idx = np.repeat(np.arange(len(seg)), counts_a)
+    k = np.arange(len(seg_idx)) - np.repeat(np.cumsum(counts_a) - counts_a, counts_a) + 1
+    t = (np.asarray(carry_in)[seg_idx] + k * step_m) / seg[seg_idx]
+    return (lat[seg_idx] + (lat[seg_idx + 1] - lat[seg_idx]) * t,
+            lon[seg_idx] + (lon[seg_idx + 1] - lon[seg_idx]) * t, carry)
+
+def resample_arrays(lat: np.ndarray, lon: np.ndarray,
+                    step_m: float = 100.0) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Resample a polyline every `step_m` metres, returning (lat, lon, heading_deg) arrays.
+
+    Segment lengths come from one vectorised haversine pass. The per-segment
+    carry is the only state that crosses segment boundaries, so it is scanned
+    with scalar floats; every output point is then placed with a single
+    indexed interpolation and all bearings are computed in the same pass.
+
+    Against the original per-segment `while` loop the points are the same
+    ones, but the placement arithmetic differs, so coordinates may differ in
+    the last bits (~1e-14 degrees). Rounded as the files are written (lat/lon
+    to 6 dp, heading to 0.1 degree) they agree; tests/test_resample.py pins this.
+    """
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    if len(lat) < 2:
+        return lat.copy(), lon.copy(), np.zeros(len(lat))
+
+    new_lat, new_lon, _ = _resample_segments(lat, lon, step_m)
+    out_lat = np.concatenate(([lat[0]], new_lat))
+    out_lon = np.concatenate(([lon[0]], new_lon))
+    if out_lat[-1] != lat[-1] or out_lon[-1] != lon[-1]:
+        out_lat = np.append(out_lat, lat[-1])
+        out_lon = np.append(out_lon, lon[-1])
+    return out_lat, out_lon, _bearings(out_lat, out_lon)
+
+def iter_resample(geometry: Geometry, step_m: float = 100.0,
+                  chunk_vertices: int = 4096) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    Chunked `resample_arrays`: yields (lat, lon, heading_deg) blocks while
+    reading `geometry` `chunk_vertices` vertices at a time. The carry and the
+    last emitted point cross block boundaries, so the concatenated blocks
+    equal `resample_arrays` over the whole polyline.
+    """
+    geometry = as_geometry(geometry)
+    n = len(geometry)
+    if n < 2:
+        if n:
+            yield resample_arrays(geometry.lat, geometry.lon, step_m)
+        return
 
-def resample_by_distance(geometry: List[Dict], step_m: float = 100.0) -> List[Dict]:
-    out = []
-    if not geometry:
-        return out
-    out.append(geometry[0])
     carry = 0.0
-    for i in range(len(geometry) - 1):
-        A, B = geometry[i], geometry[i+1]
-        seg = haversine((A["lat"], A["lon"]), (B["lat"], B["lon"]), unit=Unit.METERS)
-        if seg == 0:
+    prev: Optional[Tuple[float, float]] = None   # last point already yielded
+    pend_lat = geometry.lat[:1].copy()
+    pend_lon = geometry.lon[:1].copy()
+    for i in range(0, n - 1, chunk_vertices):
+        lat = geometry.lat[i:i + chunk_vertices + 1]
+        lon = geometry.lon[i:i + chunk_vertices + 1]
+        new_lat, new_lon, carry = _resample_segments(lat, lon, step_m, carry)
+        out_lat = np.concatenate((pend_lat, new_lat))
+        out_lon = np.concatenate((pend_lon, new_lon))
+        last = i + chunk_vertices >= n - 1
+        if last:
+            tail = (out_lat[-1], out_lon[-1]) if len(out_lat) else prev
+            if tail != (lat[-1], lon[-1]):
+                out_lat = np.append(out_lat, lat[-1])
+                out_lon = np.append(out_lon, lon[-1])
+
+        if prev is None:
+            # The first heading needs the second point; hold the start back until there is one.
+            if len(out_lat) < 2 and not last:
+                pend_lat, pend_lon = out_lat, out_lon
+                continue
+            heading = _bearings(out_lat, out_lon)
+        elif len(out_lat):
+            heading = _bearings(np.concatenate(([prev[0]], out_lat)),
+                                np.concatenate(([prev[1]], out_lon)))[1:]
+        else:
             continue
-        cursor = carry
-        while cursor + step_m <= seg:
-            t = (cursor + step_m) / seg
-            out.append(_interp(A, B, t))
-            cursor += step_m
-        carry = seg - cursor
-    if out[-1] != geometry[-1]:
-        out.append(geometry[-1])
-    return out
+        pend_lat = pend_lon = np.empty(0)
+        prev = (out_lat[-1], out_lon[-1])
+        yield out_lat, out_lon, heading
+
+def _resampled_blocks(geometry: Geometry, chunk_points: int,
+                      step_m: float = 100.0) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    `iter_resample` in blocks of at most `chunk_points` points, reading the
+    geometry `chunk_points` vertices at a time. Memoized per geometry in
+    `stage_memo` when the whole resampled route fits there; otherwise only one
+    block is held at a time. Blocks may be shared, so don't modify them.
+    """
+    geometry = as_geometry(geometry)
+
+    def produce() -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        for lat, lon, heading in iter_resample(geometry, step_m, chunk_vertices=chunk_points):
+            yield from _blocks(lat, lon, heading, chunk_points)
+
+    key = StageMemo.key("resample", geometry.digest(), step_m, chunk_points)
+    return memo_chunks("resample", key, produce, lambda block: sum(a.nbytes for a in block))
+
+def resample_by_distance(geometry: Geometry, step_m: float = 100.0) -> List[Dict]:
+    geometry = as_geometry(geometry)
+    if not len(geometry):
+        return []
+    lat, lon, _ = resample_arrays(geometry.lat, geometry.lon, step_m)
+    return [{"lat": a, "lon": b} for a, b in zip(lat.tolist(), lon.tolist())]
+
+# Simulated telemetry, content-addressed: the same geometry, sampling, profile, seed and engine
+# always give the same rows, so results are shared across requests (and restarts).
+sim_cache = PersistentCache(CACHE_DB_PATH, "simulation", ttl_s=SIM_CACHE_TTL_S,
+                            max_entries=SIM_CACHE_MAX_ENTRIES, max_bytes=SIM_CACHE_MAX_BYTES)
+_sim_flight = SingleFlight()
+
+def _sim_cache_key(geometry: Geometry, sample_every_s: int, speed_profile: str,
+                   seed: int, engine: str, stops: Optional[List[int]] = None, dwell_s: int = 0) -> str:
+    h = hashlib.sha256()
+    geometry = as_geometry(geometry)
+    h.update(np.column_stack((geometry.lat, geometry.lon)).tobytes())   # (lat, lon) pairs, as always
+    params = [sample_every_s, speed_profile, seed, engine, sim_engine.ENGINE_VERSION]
+    if stops:
+        params += [stops, dwell_s]   # only multi-stop keys change, so existing entries stay valid
+    h.update(json.dumps(params).encode("utf-8"))
+    return h.hexdigest()
+
+# Columns are stored as one zstd-compressed .npz, in their Telemetry dtypes (events as int8 codes).
+def _pack_sim(cols: Telemetry, summary: Dict) -> bytes:
+    buf = io.BytesIO()
+    np.savez(buf, summary=np.frombuffer(json.dumps(summary).encode("utf-8"), dtype=np.uint8), **cols)
+    return zstandard.ZstdCompressor(level=3).compress(buf.getvalue())
+
+def _unpack_sim(blob: bytes) -> Tuple[Telemetry, Dict]:
+    with np.load(io.BytesIO(zstandard.ZstdDecompressor().decompress(blob))) as z:
+        # Entries written before the columnar container hold float64 speed/heading; the cast narrows them.
+        cols = Telemetry({k: z[k] for k in z.files if k != "summary"})
+        summary = json.loads(z["summary"].tobytes())
+    return cols, summary
+
+# A stored simulation: the unpacked columns in `stage_memo`, else the sim_cache entry (then memoized).
+def _stored_sim(key: str) -> Optional[Tuple[Telemetry, Dict]]:
+    stored = stage_memo.get("simulate", key)
+    if stored is None:
+        blob = sim_cache.get(key)
+        if blob is None:
+            return None
+        stored = _unpack_sim(blob)
+        stage_memo.put("simulate", key, stored, stored[0].nbytes)
+    return stored
+
+def _replay_sim(cols: Telemetry, summary: Dict, chunk_rows: int) -> Iterator[Tuple[Telemetry, Dict]]:
+    for i in range(0, cols.rows, chunk_rows):
+        yield cols.slice(i, i + chunk_rows), summary
+
+def _simulate_and_store(key: str, geometry: Geometry, sample_every_s: int, speed_profile: str,
+                        seed: int, chunk_points: int, engine: str, stops: Optional[List[int]] = None,
+                        dwell_s: int = 0) -> Iterator[Tuple[Telemetry, Dict]]:
+    # Pass chunks through while keeping a copy; trips too large for one cache entry are not kept.
+    kept: Optional[List[Telemetry]] = []
+    size = 0
+    summary: Dict = {}
+    for cols, summary in _simulate_chunks(geometry, sample_every_s, speed_profile, seed, chunk_points, engine,
+                                          stops, dwell_s):
+        if kept is not None:
+            size += cols.nbytes
+            if size <= SIM_CACHE_MAX_ENTRY_BYTES:
+                kept.append(cols)
+            else:
+                kept = None
+        yield cols, summary
+    if kept:
+        cols = Telemetry.concat(kept)
+        sim_cache.set(key, _pack_sim(cols, summary))
+        stage_memo.put("simulate", key, (cols, summary), cols.nbytes)
+
+def simulate_chunks(geometry: Geometry, sample_every_s: int = 10,
+                    speed_profile: str = "normal", seed: Optional[int] = None,
+                    chunk_points: int = 2048, engine: Optional[str] = None,
+                    stops: Optional[List[int]] = None, dwell_s: int = 0) -> Iterator[Tuple[Telemetry, Dict]]:
+    """
+    Streaming form of `simulate`: yields `(columns, summary_so_far)` per block
+    of at most `chunk_points` resampled points. Resampling and simulation both
+    run block by block, so memory follows the chunk size, not the route
+    length (plus whatever `stage_memo` keeps); concatenated, the blocks equal
+    `simulate` with the same seed, whatever the chunk size.
+
+    `stops` (geometry indices of intermediate waypoints, from the route's
+    `legs`) make a multi-stop trip: each leg is resampled on its own so every
+    stop is a sample point, the vehicle stands for `dwell_s` seconds at each
+    stop (idle rows), and a `leg` column numbers the legs from 1. Speed, fuel
+    and sim time carry over from leg to leg.
+
+    Resampled blocks come from `_resampled_blocks` (memoized per leg). Seeded
+    runs go through `sim_cache`, fronted by the in-process `stage_memo`: a
+    hit replays the stored columns instead of simulating, and concurrent identical runs share one simulation
+    (followers wait up to `SIM_FLIGHT_WAIT_S` for the leader to fill the cache,
+    then simulate on their own). The python reference engine is not chunked
+    and yields a single block.
+    """
+    engine = engine or SIM_ENGINE
+    if stops and engine == "python":
+        raise ValueError("Multi-stop trips need the numpy simulation engine (SIM_ENGINE=numpy)")
+    if seed is None or SIM_CACHE_MAX_BYTES <= 0:
+        yield from _simulate_chunks(geometry, sample_every_s, speed_profile, seed, chunk_points, engine,
+                                    stops, dwell_s)
+        return
+
+    key = _sim_cache_key(geometry, sample_every_s, speed_profile, seed, engine, stops, dwell_s)
+    cached = _stored_sim(key)
+    if cached is None:
+        leader, call = _sim_flight.join(key)
+        if leader:
+            try:
+                yield from _simulate_and_store(key, geometry, sample_every_s, speed_profile, seed,
+                                               chunk_points, engine, stops, dwell_s)
+            finally:
+                _sim_flight.finish(key, call)
+            return
+        # The leader is paced by its own consumer (a slow stream reader can hold it for
+        # minutes), so don't wait on it indefinitely.
+        if call.done.wait(SIM_FLIGHT_WAIT_S):
+            cached = _stored_sim(key)
+    if cached is not None:
+        yield from _replay_sim(*cached, chunk_points)
+    else:
+        # The shared run failed, was too large to cache or is still going: simulate here.
+        yield from _simulate_chunks(geometry, sample_every_s, speed_profile, seed, chunk_points, engine,
+                                    stops, dwell_s)
+
+def _blocks(lat: np.ndarray, lon: np.ndarray, heading: np.ndarray,
+            chunk_points: int) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    for j in range(0, len(lat), chunk_points):
+        yield lat[j:j + chunk_points], lon[j:j + chunk_points], heading[j:j + chunk_points]
+
+def _simulate_chunks(geometry: Geometry, sample_every_s: int, speed_profile: str, seed: Optional[int],
+                     chunk_points: int, engine: str, stops: Optional[List[int]] = None,
+                     dwell_s: int = 0) -> Iterator[Tuple[Telemetry, Dict]]:
+    if engine == "python":
+        sim = simulate(geometry, sample_every_s, speed_profile, seed, engine="python")
+        yield Telemetry.from_rows(sim["telemetry"]), sim["summary"]
+        return
+
+    geometry = as_geometry(geometry)
+    if not stops:
+        for cols, state in sim_engine.simulate_chunks(_resampled_blocks(geometry, chunk_points),
+                                                      sample_every_s=sample_every_s,
+                                                      speed_profile=speed_profile, seed=seed):
+            yield cols, sim_engine.summarize(state)
+        return
+
+    # One random stream and one state across all legs, so the trip is a single continuous run.
+    rng = np.random.default_rng(seed)
+    state = sim_engine.new_state(rng, speed_profile)
+    dwell_rows = -(-dwell_s // sample_every_s) if dwell_s > 0 else 0
+    bounds = [0, *stops, len(geometry) - 1]
+    last = None
+    for leg, (a, b) in enumerate(zip(bounds, bounds[1:]), start=1):
+        if leg > 1 and dwell_rows and last is not None:
+            # Standing at the stop that ended the previous leg.
+            cols = sim_engine.dwell_block(*last, dwell_rows, state, sample_every_s)
+            cols["leg"] = np.full(dwell_rows, leg - 1, dtype=np.int16)
+            yield cols, sim_engine.summarize(state)
+        first = leg > 1
+        for lat, lon, heading in _resampled_blocks(geometry[a:b + 1], chunk_points):
+            if first:
+                # The stop itself was the previous leg's last point.
+                lat, lon, heading, first = lat[1:], lon[1:], heading[1:], False
+            if not len(lat):
+                continue
+            cols = sim_engine.simulate_block(lat, lon, heading, rng, state,
+                                             sample_every_s=sample_every_s, speed_profile=speed_profile)
+            cols["leg"] = np.full(len(cols["ts_s"]), leg, dtype=np.int16)
+            last = (lat[-1], lon[-1], heading[-1])
+            yield cols, sim_engine.summarize(state)
+
+def simulate(geometry: Geometry, sample_every_s: int = 10,
+            speed_profile: str = "normal", seed: Optional[int] = None,
+            engine: Optional[str] = None) -> Dict:
+    """
+    Generate realistic telemetry samples for a route geometry.
+
+    engine="numpy" uses the array-backed engine in `sim_engine` and returns
+    `telemetry` as a `Telemetry` of column arrays; engine="python" runs the original
+    per-point loop below (kept as the reference) and returns a list of rows.
+    Both produce the same summary shape. Defaults to `SIM_ENGINE`.
+    """
+    engine = engine or SIM_ENGINE
+    if engine == "numpy":
+        geometry = as_geometry(geometry)
+        lat, lon, heading = resample_arrays(geometry.lat, geometry.lon, step_m=100.0)
+        return sim_engine.simulate_arrays(lat, lon, heading, sample_every_s=sample_every_s,
+                                          speed_profile=speed_profile, seed=seed)
+    if engine != "python":
+        raise ValueError(f"Unknown simulation engine: {engine}")
 
-def simulate(geometry: List[Dict], sample_every_s: int = 10,
-            speed_profile: str = "normal", seed: Optional[int] = None) -> Dict:
-    """Generate realistic telemetry samples for a route geometry."""
     import random
 
     if seed is not None:
         random.seed(seed)
 
-    caps = {"eco": 40, "normal": 60, "aggressive": 85}
-    cap = caps.get(speed_profile, 60)
+    cap = sim_engine.SPEED_CAPS.get(speed_profile, 60)
     pts = resample_by_distance(geometry, step_m=100.0)
 
     # Behaviour parameters tuned per driving style.
-    event_prob_map = {
-        "eco": (0.04, 0.03, 0.02),        # (HarshAcceleration, HarshBraking, Overspeed)
-        "normal": (0.06, 0.05, 0.05),
-        "aggressive": (0.1, 0.06, 0.08)
-    }
-    idle_prob_map = {"eco": 0.08, "normal": 0.12, "aggressive": 0.07}
-    idle_ranges = {"eco": (1, 3), "normal": (1, 4), "aggressive": (1, 2)}
+    event_prob_map = sim_engine.EVENT_PROB_MAP
+    idle_prob_map = sim_engine.IDLE_PROB_MAP
+    idle_ranges = sim_engine.IDLE_RANGES
 
     out: List[Dict] = []
     ts = 0
@@ -121,7 +591,7 @@ def simulate(geometry: List[Dict], sample_every_s: int = 10,
     current_speed = random.uniform(cap * 0.5, cap * 0.7)
     last_heading = 0.0
 
-    a, b, c = 0.6, 0.04, 0.8  # base fuel model parameters
+    a, b, c = sim_engine.FUEL_MODEL  # base fuel model parameters
 
     def avg_moving_speed() -> float:
         return moving_speed_total / moving_samples if moving_samples else cap * 0.65
@@ -131,7 +601,7 @@ def simulate(geometry: List[Dict], sample_every_s: int = 10,
 
         # Idle fuel burn is lower while the engine runs but vehicle is stopped.
         if speed <= 0.5:
-            fuel_rate_lph = 0.8
+            fuel_rate_lph = sim_engine.IDLE_FUEL_LPH
         else:
             fuel_rate_lph = a + b * speed + (c if event == "HarshAcceleration" else 0.0)
 
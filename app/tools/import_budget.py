@@ -0,0 +1,86 @@
+"""Cold-start import cost of the app's entry modules, checked against a budget.
+
+Each module is imported in a fresh interpreter with `python -X importtime`;
+the report lists its cumulative import time, its heaviest dependencies and
+any heavy package that should have been deferred but was imported anyway.
+
+    python -m app.tools.import_budget                  # report, exit 1 if over budget
+    python -m app.tools.import_budget --budget-ms 800  # one budget for every module
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+# Default budgets (ms, cumulative, median of --repeat runs).
+BUDGETS_MS: Dict[str, float] = {
+    "app.llm_model.llm_model": 300,
+    "app.agents.main_agent": 300,
+    "app.tools.geo_tools": 800,
+    "app.main": 1500,
+    "app.tools.fleet_tools": 2500,
+}
+
+# Packages each module must not pull in at import time (they load on first use).
+DEFERRED: Dict[str, List[str]] = {
+    "app.llm_model.llm_model": ["langchain_openai", "langchain_google_genai"],
+    "app.agents.main_agent": ["langchain_openai", "langchain_google_genai", "langchain.agents", "pandas"],
+    "app.tools.geo_tools": ["geopy", "pandas"],
+    "app.main": ["langchain_openai", "langchain_google_genai", "langchain.agents", "pandas", "geopy"],
+}
+
+
+def _importtime(code: str) -> List[Tuple[str, int]]:
+    # -X importtime writes "import time: self [us] | cumulative | name" lines to stderr.
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{code} failed:\n{proc.stderr[-2000:]}")
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(cumulative)))
+    return rows
+
+
+def measure(module: str, repeat: int = 3) -> Dict:
+    startup = {name for name, _ in _importtime("pass")}   # loaded by the interpreter itself (site, ...)
+    runs = [_importtime(f"import {module}") for _ in range(repeat)]
+    totals = [dict(r)[module] / 1000 for r in runs]
+    last = [(n, us) for n, us in runs[-1] if n not in startup]
+    loaded = {name for name, _ in last}
+    top = sorted(((n, us) for n, us in last if n != module and "." not in n), key=lambda x: -x[1])[:5]
+    return {
+        "module": module,
+        "ms": round(statistics.median(totals), 1),
+        "top": [(n, round(us / 1000, 1)) for n, us in top],
+        "eager": [pkg for pkg in DEFERRED.get(module, []) if pkg in loaded],
+    }
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("modules", nargs="*", default=list(BUDGETS_MS))
+    ap.add_argument("--budget-ms", type=float, help="Budget for every module (overrides the defaults)")
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args(argv)
+
+    failed = False
+    for module in args.modules:
+        r = measure(module, args.repeat)
+        budget = args.budget_ms or BUDGETS_MS.get(module)
+        over = budget is not None and r["ms"] > budget
+        status = "OVER" if over or r["eager"] else "ok"
+        failed |= status != "ok"
+        print(f"{status:4}  {module:28} {r['ms']:8.1f} ms  (budget {budget or '-'} ms)")
+        print("      heaviest: " + ", ".join(f"{n} {ms} ms" for n, ms in r["top"]))
+        if r["eager"]:
+            print("      imported eagerly (should be deferred): " + ", ".join(r["eager"]))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
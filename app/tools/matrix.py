@@ -0,0 +1,177 @@
+"""Travel distance/duration matrices from the OSRM table service, cached per cell.
+
+`route_matrix(origins, destinations)` answers N x M distances and times
+without fetching any geometry. Cells already in `table_cache` are not asked
+for again. The rest are split into blocks of at most OSRM_TABLE_MAX_SIZE
+sources x OSRM_TABLE_MAX_SIZE destinations (OSRM's `--max-table-size`
+check), one table request per block, sent concurrently over the shared
+routing client. A cold 200 x 200 matrix is 4 requests instead of 40,000
+route calls; a warm one is none.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .cache import PersistentCache
+from .geo_tools import _osrm_profile
+from .routing_client import get_routing_client
+from ..config import (CACHE_DB_PATH, ROUTE_CACHE_TTL_S, TABLE_CACHE_MAX_ENTRIES, OSRM_TABLE_MAX_SIZE,
+                      ROUTING_MAX_CONCURRENCY)
+
+# One entry per (origin, destination, profile, excludes) cell: float32 distance_km and duration_sec.
+# Same file and TTL as the route cache; unreachable cells are stored as NaN.
+table_cache = PersistentCache(CACHE_DB_PATH, "table", ttl_s=ROUTE_CACHE_TTL_S, max_entries=TABLE_CACHE_MAX_ENTRIES)
+
+Coord = Tuple[float, float]
+# (origin rows, destination columns) of one table request.
+Block = Tuple[np.ndarray, np.ndarray]
+
+
+def _point_key(p: Coord) -> str:
+    # Same rounding as the route cache: 5 decimal places is ~1 m.
+    return f"{p[0]:.5f},{p[1]:.5f}"
+
+
+class _Matrix:
+    """Matrix being filled: cells from the cache first, then from table responses."""
+
+    def __init__(self, origins: List[Coord], destinations: Optional[List[Coord]], profile: str,
+                 avoid: Optional[List[str]], max_size: int):
+        self.origins = list(origins)
+        self.destinations = self.origins if destinations is None else list(destinations)
+        self.osrm_profile, self.excludes = _osrm_profile(profile, avoid)
+        self.max_size = max(1, max_size)
+        prefix = f"{get_routing_client().base_url}|{self.osrm_profile}|{self.excludes}|"
+        okeys = [_point_key(p) for p in self.origins]
+        dkeys = [_point_key(p) for p in self.destinations]
+        self.keys = [[f"{prefix}{o}>{d}" for d in dkeys] for o in okeys]
+        n, m = len(self.origins), len(self.destinations)
+        self.distance_km = np.full((n, m), np.nan, dtype=np.float32)
+        self.duration_sec = np.full((n, m), np.nan, dtype=np.float32)
+        self.missing = np.ones((n, m), dtype=bool)
+
+        found = table_cache.get_many([k for row in self.keys for k in row]) if n and m else {}
+        for i, row in enumerate(self.keys):
+            for j, key in enumerate(row):
+                value = found.get(key)
+                if value is not None:
+                    self.distance_km[i, j], self.duration_sec[i, j] = np.frombuffer(value, dtype=np.float32)
+                    self.missing[i, j] = False
+        self.cached_cells = int((~self.missing).sum())
+
+    def blocks(self) -> List[Block]:
+        """Blocks covering every missing cell, skipping rows and columns that are complete."""
+        out = []
+        rows = np.flatnonzero(self.missing.any(axis=1))
+        for r0 in range(0, len(rows), self.max_size):
+            r = rows[r0:r0 + self.max_size]
+            cols = np.flatnonzero(self.missing[r].any(axis=0))
+            for c0 in range(0, len(cols), self.max_size):
+                out.append((r, cols[c0:c0 + self.max_size]))
+        return out
+
+    def request(self, block: Block) -> Tuple[List[Coord], Dict]:
+        """Coordinates and query of one table request; points shared by both sides are sent once."""
+        rows, cols = block
+        coords: List[Coord] = []
+        index: Dict[str, int] = {}
+
+        def at(p: Coord) -> int:
+            key = _point_key(p)
+            if key not in index:
+                index[key] = len(coords)
+                coords.append(p)
+            return index[key]
+
+        sources = [at(self.origins[i]) for i in rows]
+        destinations = [at(self.destinations[j]) for j in cols]
+        query = {"sources": ";".join(map(str, sources)), "destinations": ";".join(map(str, destinations)),
+                 "annotations": "distance,duration"}
+        if self.excludes:
+            query["exclude"] = self.excludes
+        return coords, query
+
+    def store(self, block: Block, data: Dict) -> None:
+        rows, cols = block
+        # OSRM reports unreachable pairs as null, which becomes NaN here.
+        dist = np.array(data["distances"], dtype=np.float64) / 1000.0
+        dur = np.array(data["durations"], dtype=np.float64)
+        self.distance_km[np.ix_(rows, cols)] = dist
+        self.duration_sec[np.ix_(rows, cols)] = dur
+        self.missing[np.ix_(rows, cols)] = False
+        cells = np.stack([dist, dur], axis=-1).astype(np.float32)
+        table_cache.set_many({self.keys[i][j]: cells[a, b].tobytes()
+                              for a, i in enumerate(rows) for b, j in enumerate(cols)})
+
+    def result(self, requests: int) -> Dict:
+        return {"distance_km": self.distance_km, "duration_sec": self.duration_sec,
+                "requests": requests, "cached_cells": self.cached_cells}
+
+
+def _split(block: Block) -> List[Block]:
+    # Halve the longer side; used when the server's table limit is below OSRM_TABLE_MAX_SIZE.
+    rows, cols = block
+    if len(rows) >= len(cols):
+        return [(rows[:len(rows) // 2], cols), (rows[len(rows) // 2:], cols)]
+    return [(rows, cols[:len(cols) // 2]), (rows, cols[len(cols) // 2:])]
+
+
+def _checked(data: Dict, block: Block) -> bool:
+    """True if `data` answers the block; False if it was too big for the server and should be split."""
+    if data.get("code") == "TooBig" and len(block[0]) * len(block[1]) > 1:
+        return False
+    if data.get("code") != "Ok" or "distances" not in data or "durations" not in data:
+        raise ValueError(f"OSRM error: {data.get('message', data.get('code'))}")
+    return True
+
+
+# Fill one block; returns the number of table requests it took.
+def _fetch(matrix: _Matrix, block: Block) -> int:
+    coords, query = matrix.request(block)
+    data = get_routing_client().table(coords, matrix.osrm_profile, query)
+    if not _checked(data, block):
+        return 1 + sum(_fetch(matrix, part) for part in _split(block))
+    matrix.store(block, data)
+    return 1
+
+
+async def _afetch(matrix: _Matrix, block: Block) -> int:
+    coords, query = matrix.request(block)
+    data = await get_routing_client().atable(coords, matrix.osrm_profile, query)
+    if not _checked(data, block):
+        return 1 + sum(await asyncio.gather(*(_afetch(matrix, part) for part in _split(block))))
+    await asyncio.to_thread(matrix.store, block, data)
+    return 1
+
+
+def route_matrix(origins: List[Coord], destinations: Optional[List[Coord]] = None,
+                 profile: str = "driving-car", avoid: Optional[List[str]] = None,
+                 max_size: int = OSRM_TABLE_MAX_SIZE) -> Dict:
+    """
+    Travel distances and times from every origin to every destination
+    ((lat, lon) pairs; `destinations` defaults to `origins`).
+
+    Returns float32 `distance_km` and `duration_sec` arrays of shape
+    (len(origins), len(destinations)), NaN where no route exists, plus the
+    number of table `requests` sent and of `cached_cells` reused.
+    """
+    matrix = _Matrix(origins, destinations, profile, avoid, max_size)
+    blocks = matrix.blocks()
+    if len(blocks) <= 1:
+        requests = sum(_fetch(matrix, b) for b in blocks)
+    else:
+        with ThreadPoolExecutor(max_workers=min(len(blocks), ROUTING_MAX_CONCURRENCY)) as pool:
+            requests = sum(pool.map(lambda b: _fetch(matrix, b), blocks))
+    return matrix.result(requests)
+
+
+async def aroute_matrix(origins: List[Coord], destinations: Optional[List[Coord]] = None,
+                        profile: str = "driving-car", avoid: Optional[List[str]] = None,
+                        max_size: int = OSRM_TABLE_MAX_SIZE) -> Dict:
+    """Async `route_matrix` over the routing client's async pool; shares the cell cache."""
+    # The cell cache is SQLite: its reads (in _Matrix) and writes (store) run off the event loop.
+    matrix = await asyncio.to_thread(_Matrix, origins, destinations, profile, avoid, max_size)
+    requests = await asyncio.gather(*(_afetch(matrix, b) for b in matrix.blocks()))
+    return matrix.result(sum(requests))
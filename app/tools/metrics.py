@@ -0,0 +1,201 @@
+"""In-process metrics rendered in the Prometheus text format (stdlib only).
+
+Counters and histograms live in one module-level registry and are served by
+the API at `GET /metrics`. Gauges for values owned elsewhere (cache stats,
+the in-flight count) are read at scrape time through `register_collector`.
+`StageTimer` times the stages of one request for both `ToolResult.meta` and
+the `fleet_stage_duration_seconds` histogram.
+"""
+import math
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# (sample name, labels, value) triples of one metric family; histograms emit _bucket/_sum/_count.
+Samples = List[Tuple[str, Dict[str, str], float]]
+# (name, type, help, samples) of one metric family.
+Family = Tuple[str, str, str, Samples]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def _labels(self, key: Tuple[str, ...]) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+
+class Counter(_Metric):
+    """Monotonic total per label set."""
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def collect(self) -> Iterable[Family]:
+        with self._lock:
+            samples = [(self.name, self._labels(k), v) for k, v in self._values.items()]
+        yield self.name, self.kind, self.help, samples
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram per label set, plus `_sum` and `_count`."""
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], List] = {}   # key -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(key)
+            if s is None:
+                s = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            if i < len(self.buckets):
+                s[i] += 1
+            s[-2] += value
+            s[-1] += 1
+
+    def collect(self) -> Iterable[Family]:
+        with self._lock:
+            series = [(k, list(s)) for k, s in self._series.items()]
+        samples: Samples = []
+        for key, s in series:
+            labels = self._labels(key)
+            running = 0
+            for le, n in zip(self.buckets, s):
+                running += n
+                samples.append((self.name + "_bucket", {**labels, "le": _fmt(le)}, running))
+            samples.append((self.name + "_bucket", {**labels, "le": "+Inf"}, s[-1]))
+            samples.append((self.name + "_sum", labels, s[-2]))
+            samples.append((self.name + "_count", labels, s[-1]))
+        yield self.name, self.kind, self.help, samples
+
+
+_registry: List[_Metric] = []
+_collectors: List[Callable[[], Iterable[Family]]] = []
+
+
+def register_collector(fn: Callable[[], Iterable[Family]]) -> None:
+    """Add a callable returning `(name, type, help, samples)` families, evaluated on every scrape."""
+    _collectors.append(fn)
+
+
+def _fmt(v: float) -> str:
+    if isinstance(v, int):
+        return str(v)
+    if math.isinf(v):
+        return "+Inf" if v > 0 else "-Inf"
+    return repr(float(v))
+
+
+def _escape(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    families: List[Family] = []
+    for m in _registry:
+        families.extend(m.collect())
+    for fn in _collectors:
+        families.extend(fn())
+    lines = []
+    for name, kind, help, samples in families:
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {kind}")
+        for sample, labels, value in samples:
+            label_str = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+            lines.append(f"{sample}{{{label_str}}} {_fmt(value)}" if label_str else f"{sample} {_fmt(value)}")
+    return "\n".join(lines) + "\n"
+
+
+STAGE_SECONDS = Histogram("fleet_stage_duration_seconds",
+                          "Time spent per pipeline stage and per LLM call, per request.", ["stage"])
+HTTP_SECONDS = Histogram("fleet_http_request_duration_seconds",
+                         "API request latency until the response starts.", ["method", "route", "status"])
+ROWS_GENERATED = Counter("fleet_rows_generated_total", "Telemetry rows written to files or streamed.",
+                         ["format", "mode"])
+LLM_TOKENS = Counter("fleet_llm_tokens_total", "LLM tokens used by the agent.", ["kind"])
+
+
+class StageTimer:
+    """
+    Accumulate wall time per stage for one request; stages may be entered
+    many times (once per chunk) and are summed. `finish()` records the
+    totals in STAGE_SECONDS once and returns them in seconds, with `total`
+    measured from the timer's creation.
+    """
+
+    def __init__(self):
+        self._t0 = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self._finished: Optional[Dict[str, float]] = None
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - t0
+
+    def timed(self, name: str, it: Iterable) -> Iterator:
+        """Yield from `it`, counting the time spent producing each item as stage `name`."""
+        it = iter(it)
+        try:
+            while True:
+                with self.stage(name):
+                    try:
+                        item = next(it)
+                    except StopIteration:
+                        return
+                yield item
+        finally:
+            # closing early must still run the source generator's cleanup (e.g. single-flight release)
+            if hasattr(it, "close"):
+                it.close()
+
+    def finish(self) -> Dict[str, float]:
+        if self._finished is None:
+            for name, seconds in self.stages.items():
+                STAGE_SECONDS.observe(seconds, stage=name)
+            self._finished = {name: round(s, 4) for name, s in self.stages.items()}
+            self._finished["total"] = round(time.perf_counter() - self._t0, 4)
+        return self._finished
+
+
+def observe_stages(timings: Dict[str, float]) -> None:
+    """Record stage timings measured in another process (e.g. a fleet batch worker)."""
+    for name, seconds in timings.items():
+        if name != "total":
+            STAGE_SECONDS.observe(seconds, stage=name)
@@ -0,0 +1,127 @@
+"""Minimal local stand-in for the OSRM HTTP API, for tests and offline runs.
+
+Routes are straight lines between the requested coordinates, densified to
+roughly one vertex per kilometre, driven at a constant 50 km/h. The table
+service answers with the same straight-line distances and durations, and
+like OSRM's default `--max-table-size` refuses more than 100 x 100 cells.
+"""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import polyline
+from haversine import haversine
+
+STUB_SPEED_KMPH = 50.0
+STUB_MAX_TABLE_SIZE = 100
+
+
+def _parse_coords(part: str) -> List[Tuple[float, float]]:
+    # OSRM order is lon,lat;lon,lat
+    pts = []
+    for pair in part.split(";"):
+        lon, lat = [float(x) for x in pair.split(",")]
+        pts.append((lat, lon))
+    return pts
+
+
+def _straight_route(pts: List[Tuple[float, float]]) -> dict:
+    line: List[Tuple[float, float]] = [pts[0]]
+    legs = []
+    for a, b in zip(pts, pts[1:]):
+        km = haversine(a, b)
+        n = max(1, int(km))
+        line.extend((a[0] + (b[0] - a[0]) * i / n, a[1] + (b[1] - a[1]) * i / n) for i in range(1, n + 1))
+        legs.append({"distance": km * 1000.0, "duration": km / STUB_SPEED_KMPH * 3600.0})
+    return {
+        "distance": sum(l["distance"] for l in legs),
+        "duration": sum(l["duration"] for l in legs),
+        "geometry": polyline.encode(line, precision=5),
+        "legs": legs,
+    }
+
+
+def _indices(value: Optional[str], n: int) -> List[int]:
+    if value is None or value == "all":
+        return list(range(n))
+    return [int(i) for i in value.split(";")]
+
+
+def _straight_table(pts: List[Tuple[float, float]], query: dict) -> dict:
+    sources = _indices(query.get("sources", [None])[0], len(pts))
+    destinations = _indices(query.get("destinations", [None])[0], len(pts))
+    if len(sources) * len(destinations) > STUB_MAX_TABLE_SIZE ** 2:
+        raise OverflowError("Too many table coordinates")
+    km = [[haversine(pts[s], pts[d]) for d in destinations] for s in sources]
+    return {
+        "code": "Ok",
+        "distances": [[k * 1000.0 for k in row] for row in km],
+        "durations": [[k / STUB_SPEED_KMPH * 3600.0 for k in row] for row in km],
+        "sources": [{"location": [pts[i][1], pts[i][0]]} for i in sources],
+        "destinations": [{"location": [pts[i][1], pts[i][0]]} for i in destinations],
+    }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real server
+    disable_nagle_algorithm = True  # headers and body go out in separate writes
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        parts = url.path.strip("/").split("/")
+        try:
+            service, coords = parts[0], _parse_coords(parts[3])
+            if service == "table" and coords:
+                body = _straight_table(coords, parse_qs(url.query))
+            elif service == "route" and len(coords) >= 2:
+                body = {
+                    "code": "Ok",
+                    "routes": [_straight_route(coords)],
+                    "waypoints": [{"location": [lon, lat]} for lat, lon in coords],
+                }
+            else:
+                raise ValueError(f"Unsupported request: {self.path}")
+            status = 200
+        except OverflowError as e:
+            body, status = {"code": "TooBig", "message": str(e)}, 400
+        except Exception as e:
+            body, status = {"code": "InvalidQuery", "message": str(e)}, 400
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubOSRMServer:
+    """Serve the stub API on a background thread: `with StubOSRMServer() as base_url: ...`."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> str:
+        self._thread.start()
+        return self.base_url
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> str:
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
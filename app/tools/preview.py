@@ -0,0 +1,88 @@
+"""Downsampled previews of generated trip files, for maps and charts.
+
+A multi-day trip at 1 s sampling is hundreds of thousands of rows; a browser
+map or chart needs a few thousand. `trip_preview` reads only the columns it
+plots (column projection for Parquet/Arrow, `include_columns` for CSV) and
+keeps the points chosen by Largest-Triangle-Three-Buckets on the speed series,
+which preserves stops, peaks and dips that plain striding would skip.
+"""
+from pathlib import Path
+from typing import Dict
+
+import numpy as np
+
+PREVIEW_COLUMNS = ["timestamp", "lat", "lon", "speed_kmph"]
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Indices of the `n_out` points of (x, y) kept by Largest-Triangle-Three-Buckets.
+
+    The first and last points are always kept. The rest are split into
+    `n_out - 2` equal buckets, and each bucket keeps the point forming the
+    largest triangle with the previously kept point and the mean of the next
+    bucket. `x` must be increasing.
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    # Bucket means via prefix sums; the "next bucket" of the last one is the final point.
+    cx = np.concatenate(([0.0], np.cumsum(x)))
+    cy = np.concatenate(([0.0], np.cumsum(y)))
+    lo, hi = edges[1:], np.append(edges[2:], n)
+    counts = hi - lo
+    mean_x = (cx[hi] - cx[lo]) / counts
+    mean_y = (cy[hi] - cy[lo]) / counts
+
+    out = np.empty(n_out, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, stop = edges[i], edges[i + 1]
+        xs, ys = x[start:stop], y[start:stop]
+        area = np.abs((x[a] - mean_x[i]) * (ys - y[a]) - (x[a] - xs) * (mean_y[i] - y[a]))
+        a = start + int(np.argmax(area))
+        out[i + 1] = a
+    return out
+
+
+def read_preview_columns(path: Path) -> Dict[str, np.ndarray]:
+    """The plotted columns of a trip file as arrays, without parsing the other columns."""
+    path = Path(path)
+    suffix = path.suffix.lower()
+    if suffix == ".parquet":
+        import pyarrow.parquet as pq
+        table = pq.read_table(path, columns=PREVIEW_COLUMNS)
+    elif suffix in (".feather", ".arrow"):
+        import pyarrow.feather as feather
+        table = feather.read_table(path, columns=PREVIEW_COLUMNS, memory_map=True)
+    else:
+        import pyarrow as pa
+        import pyarrow.csv as pv
+        table = pv.read_csv(path, convert_options=pv.ConvertOptions(
+            include_columns=PREVIEW_COLUMNS,
+            column_types={"lat": pa.float64(), "lon": pa.float64(), "speed_kmph": pa.float64()},
+        ))
+    return {name: table.column(name).to_numpy() for name in PREVIEW_COLUMNS}
+
+
+def trip_preview(path: Path, n_points: int = 2000):
+    """
+    A DataFrame of at most `n_points` rows (timestamp, lat, lon, speed_kmph)
+    downsampled from the trip file at `path`, plus the file's row count in
+    `attrs["rows"]`.
+    """
+    import pandas as pd
+    cols = read_preview_columns(path)
+    speed = cols["speed_kmph"]
+    # Rows are evenly spaced in simulated time, so the row number is the x axis
+    # (wall-clock timestamps jump over off-duty nights).
+    idx = lttb_indices(np.arange(len(speed)), speed, n_points)
+    df = pd.DataFrame({name: values[idx] for name, values in cols.items()})
+    # Parquet/Arrow files store float32; charting libraries serialize only float64 to JSON.
+    df = df.astype({"lat": "float64", "lon": "float64", "speed_kmph": "float64"})
+    df.attrs["rows"] = len(speed)
+    return df
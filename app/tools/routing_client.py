@@ -0,0 +1,191 @@
+"""Pooled HTTP client for the routing backend (OSRM or the local stub)."""
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from ..config import (ROUTING_BACKEND, OSRM_BASE, OSRM_PUBLIC_BASE, ROUTING_TIMEOUT_S,
+                      ROUTING_MAX_CONNECTIONS, ROUTING_MAX_CONCURRENCY, ROUTING_RETRIES)
+
+_RETRY_STATUS = {429, 502, 503, 504}
+
+
+class RoutingClient:
+    """
+    Keep-alive connection pool to one OSRM-compatible server.
+
+    At most `max_concurrency` requests run at once (extra callers wait),
+    transient failures are retried with jittered exponential backoff, and the
+    latency of every successful call is recorded.
+    """
+
+    def __init__(self, base_url: str, backend: str = "osrm", timeout_s: float = 20.0,
+                 max_connections: int = 20, max_concurrency: int = 8,
+                 retries: int = 3, backoff_s: float = 0.25):
+        self.base_url = base_url.rstrip("/")
+        self.backend = backend
+        self.retries = retries
+        self.backoff_s = backoff_s
+        self._client_kwargs = dict(
+            base_url=self.base_url,
+            timeout=timeout_s,
+            headers={"User-Agent": "route-agent-demo"},
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+        self._client = httpx.Client(**self._client_kwargs)
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._max_concurrency = max_concurrency
+        # Async pool and limiter belong to one event loop: created on first async use inside
+        # the running loop, and again from a new loop (e.g. repeated asyncio.run, a worker restart).
+        self._aloop: Optional[asyncio.AbstractEventLoop] = None
+        self._aclient: Optional[httpx.AsyncClient] = None
+        self._aslots: Optional[asyncio.Semaphore] = None
+        self._latencies = deque(maxlen=2000)
+        self.retried = 0
+        self.failed = 0
+
+    def _retry_delay(self, attempt: int, resp: Optional[httpx.Response]) -> float:
+        delay = random.uniform(0, self.backoff_s * (2 ** attempt))  # "full jitter"
+        if resp is not None and resp.headers.get("Retry-After", "").isdigit():
+            delay = max(delay, float(resp.headers["Retry-After"]))
+        self.retried += 1
+        return delay
+
+    def _finish(self, resp: httpx.Response, t0: float) -> Dict:
+        self._latencies.append(time.perf_counter() - t0)
+        if resp.status_code >= 500 or resp.status_code == 429:
+            self.failed += 1
+            resp.raise_for_status()
+        # OSRM reports bad queries as 4xx with a JSON body; let the caller read `code`.
+        return resp.json()
+
+    def get_json(self, path: str, params: Optional[Dict] = None) -> Dict:
+        for attempt in range(self.retries + 1):
+            resp = None
+            with self._slots:
+                t0 = time.perf_counter()
+                try:
+                    resp = self._client.get(path, params=params)
+                except httpx.TransportError:
+                    if attempt == self.retries:
+                        self.failed += 1
+                        raise
+                else:
+                    if resp.status_code not in _RETRY_STATUS or attempt == self.retries:
+                        return self._finish(resp, t0)
+            time.sleep(self._retry_delay(attempt, resp))
+        raise RuntimeError("unreachable")
+
+    async def aget_json(self, path: str, params: Optional[Dict] = None) -> Dict:
+        """Async `get_json`: same pooling, concurrency bound, retries and latency recording."""
+        loop = asyncio.get_running_loop()
+        if self._aloop is not loop or self._aclient is None:
+            # A previous loop's pool can't be used (or closed) from this one; its connections go with it.
+            self._aloop = loop
+            self._aclient = httpx.AsyncClient(**self._client_kwargs)
+            self._aslots = asyncio.Semaphore(self._max_concurrency)
+        client, slots = self._aclient, self._aslots
+        for attempt in range(self.retries + 1):
+            resp = None
+            async with slots:
+                t0 = time.perf_counter()
+                try:
+                    resp = await client.get(path, params=params)
+                except httpx.TransportError:
+                    if attempt == self.retries:
+                        self.failed += 1
+                        raise
+                else:
+                    if resp.status_code not in _RETRY_STATUS or attempt == self.retries:
+                        return self._finish(resp, t0)
+            await asyncio.sleep(self._retry_delay(attempt, resp))
+        raise RuntimeError("unreachable")
+
+    def route(self, coords: List[Tuple[float, float]], osrm_profile: str = "driving",
+              query: Optional[Dict] = None) -> Dict:
+        """Call the OSRM route service for (lat, lon) coordinates; returns the raw response."""
+        return self.get_json(self._service_path("route", coords, osrm_profile), params=query)
+
+    async def aroute(self, coords: List[Tuple[float, float]], osrm_profile: str = "driving",
+                     query: Optional[Dict] = None) -> Dict:
+        return await self.aget_json(self._service_path("route", coords, osrm_profile), params=query)
+
+    def table(self, coords: List[Tuple[float, float]], osrm_profile: str = "driving",
+              query: Optional[Dict] = None) -> Dict:
+        """Call the OSRM table (matrix) service; `query` selects sources/destinations by index."""
+        return self.get_json(self._service_path("table", coords, osrm_profile), params=query)
+
+    async def atable(self, coords: List[Tuple[float, float]], osrm_profile: str = "driving",
+                     query: Optional[Dict] = None) -> Dict:
+        return await self.aget_json(self._service_path("table", coords, osrm_profile), params=query)
+
+    @staticmethod
+    def _service_path(service: str, coords: List[Tuple[float, float]], osrm_profile: str) -> str:
+        coords_part = ";".join(f"{lon},{lat}" for lat, lon in coords)
+        return f"/{service}/v1/{osrm_profile}/{coords_part}"
+
+    def latency_stats(self) -> Dict:
+        lat = sorted(self._latencies)
+        if not lat:
+            return {"backend": self.backend, "calls": 0, "retried": self.retried, "failed": self.failed}
+        pick = lambda q: round(lat[min(len(lat) - 1, int(q * len(lat)))] * 1000, 1)
+        return {
+            "backend": self.backend,
+            "calls": len(lat),
+            "mean_ms": round(sum(lat) / len(lat) * 1000, 1),
+            "p50_ms": pick(0.5),
+            "p95_ms": pick(0.95),
+            "retried": self.retried,
+            "failed": self.failed,
+        }
+
+    def close(self) -> None:
+        self._client.close()
+
+    async def aclose(self) -> None:
+        if self._aclient is not None and self._aloop is asyncio.get_running_loop():
+            await self._aclient.aclose()
+        self._aclient = self._aloop = None
+
+
+_client: Optional[RoutingClient] = None
+_client_lock = threading.Lock()
+_stub_server = None
+
+
+def _backend_url(backend: str) -> str:
+    global _stub_server
+    if backend == "osrm-public":
+        return OSRM_PUBLIC_BASE
+    if backend == "osrm-self-hosted":
+        return OSRM_BASE
+    if backend == "stub":
+        # Run the stub in-process; handy for tests and offline demos.
+        from .osrm_stub import StubOSRMServer
+        _stub_server = StubOSRMServer()
+        return _stub_server.start()
+    raise ValueError(f"Unknown routing backend: {backend}")
+
+
+def get_routing_client() -> RoutingClient:
+    """Shared client for the configured ROUTING_BACKEND, created on first use."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = RoutingClient(
+                _backend_url(ROUTING_BACKEND), backend=ROUTING_BACKEND, timeout_s=ROUTING_TIMEOUT_S,
+                max_connections=ROUTING_MAX_CONNECTIONS, max_concurrency=ROUTING_MAX_CONCURRENCY,
+                retries=ROUTING_RETRIES,
+            )
+        return _client
+
+
+def set_routing_client(client: Optional[RoutingClient]) -> None:
+    """Swap the shared client (e.g. point tests at a StubOSRMServer); None resets to the configured backend."""
+    global _client
+    with _client_lock:
+        _client = client
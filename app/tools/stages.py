@@ -0,0 +1,122 @@
+"""In-process memo of trip pipeline stage outputs, for incremental regeneration.
+
+`plan_route_to_csv` runs geocode -> route -> resample -> simulate ->
+schedule -> write. Geocoding and routing are memoized by their persistent
+caches. `stage_memo` keeps the most recent outputs of the later stages in
+memory, each keyed on the inputs that stage reads (including the key of the
+stage it consumes), so a changed parameter reruns only the stages after the
+first one that reads it:
+
+- resample: route geometry (per leg) and chunk size
+- simulate: + sample_every_s, speed_profile, seed, stop_dwell_s
+- schedule: + start time, driver_hours, duty_windows, split_across_days
+- write:    + vehicle_id, trip_id, output format, per_day_files, path
+
+Outputs too large for the memo are recomputed as before.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+from ..config import STAGE_MEMO_MAX_BYTES
+
+
+class StageMemo:
+    """
+    LRU of stage outputs bounded by their total size; safe to share between threads.
+
+    Values are returned as stored, so callers must treat them as read-only.
+    One entry may use at most a quarter of `max_bytes`, so a single huge trip
+    doesn't flush everything else. `max_bytes` <= 0 disables the memo.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_bytes // 4
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[Any, int]]" = OrderedDict()
+        self._bytes = 0
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+
+    @staticmethod
+    def key(stage: str, *parts) -> str:
+        payload = json.dumps([stage, *parts], sort_keys=True, separators=(",", ":"), default=str)
+        return f"{stage}:{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+    def get(self, stage: str, key: str) -> Optional[Any]:
+        if self.max_bytes <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            counts = self.misses if entry is None else self.hits
+            counts[stage] = counts.get(stage, 0) + 1
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, stage: str, key: str, value: Any, nbytes: int) -> None:
+        if self.max_bytes <= 0 or nbytes > self.max_entry_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (value, nbytes)
+            self._bytes += nbytes
+            while self._bytes > self.max_bytes:
+                _, (_, size) = self._entries.popitem(last=False)
+                self._bytes -= size
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            hits, misses = sum(self.hits.values()), sum(self.misses.values())
+            lookups = hits + misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": hits,
+                "misses": misses,
+                "hit_ratio": round(hits / lookups, 3) if lookups else 0.0,
+                "stages": {s: {"hits": self.hits.get(s, 0), "misses": self.misses.get(s, 0)}
+                           for s in sorted(set(self.hits) | set(self.misses))},
+            }
+
+
+stage_memo = StageMemo(STAGE_MEMO_MAX_BYTES)
+
+
+def memo_chunks(stage: str, key: str, produce: Callable[[], Iterator], nbytes: Callable[[Any], int]) -> Iterator:
+    """
+    Replay the chunks stored under `key`, or pass `produce()`'s chunks through
+    and store them once it has run to the end (and if they fit in the memo).
+    """
+    stored = stage_memo.get(stage, key)
+    if stored is not None:
+        yield from stored
+        return
+    kept, size = [], 0
+    items = produce()
+    try:
+        for item in items:
+            if kept is not None:
+                size += nbytes(item)
+                if size <= stage_memo.max_entry_bytes:
+                    kept.append(item)
+                else:
+                    kept = None
+            yield item
+    finally:
+        # stopping early must still run the producer's cleanup (e.g. single-flight release)
+        if hasattr(items, "close"):
+            items.close()
+    if kept is not None:
+        stage_memo.put(stage, key, kept, size)
@@ -0,0 +1,28 @@
+"""Pre-warm the route cache from a corridor file: `python -m app.tools.warm_routes corridors.txt`.
+
+Each non-empty line is "start;end" (place names or "lat,lon"); lines starting with # are ignored.
+"""
+import json
+import sys
+from typing import List, Tuple
+
+from .geo_tools import warm_route_cache
+
+
+def read_corridors(path: str) -> List[Tuple[str, str]]:
+    corridors = []
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            start, end = [x.strip() for x in line.split(";", 1)]
+            corridors.append((start, end))
+    return corridors
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.exit("usage: python -m app.tools.warm_routes CORRIDORS_FILE [profile]")
+    profile = sys.argv[2] if len(sys.argv) > 2 else "driving-car"
+    print(json.dumps(warm_route_cache(read_corridors(sys.argv[1]), profile=profile), indent=2))
@@ -232,12 +232,12 @@
 
 from __future__ import annotations
 
-import json
 import sys
+import uuid
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from datetime import datetime
-import glob
+from urllib.parse import quote, urlencode
 
 import streamlit as st
 
@@ -247,14 +247,17 @@ if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
 
 # --- App imports
-from app.agents.main_agent import run_general_chat_agent
+from app.models.schemas import PlanRouteCSVParams
 from app.config import (
     DEFAULT_PROFILE,
     DEFAULT_SPEED_PROFILE,
     DEFAULT_DRIVER_HOURS,
     DEFAULT_SAMPLE_EVERY_S,
     DEFAULT_START_LOCAL,
-    OUTPUT_DIR,
+    DEFAULT_OUTPUT_FORMAT,
+    FLEET_API_URL,
+    UI_DOWNLOAD_MAX_MB,
+    UI_PREVIEW_POINTS,
 )
 
 # -------------------------- Streamlit Page Config ---------------------------
@@ -271,6 +274,13 @@ st.write(
 )
 
 # ----------------------------- Helpers -------------------------------------
+_MIME_TYPES = {
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+    "feather": "application/vnd.apache.arrow.file",
+    "arrow": "application/vnd.apache.arrow.file",
+}
+
 def _build_params(form_values: Dict[str, Any]) -> Dict[str, Any]:
     params: Dict[str, Any] = {
         "start": form_values["start"],
@@ -282,6 +292,7 @@ def _build_params(form_values: Dict[str, Any]) -> Dict[str, Any]:
         "trip_id": form_values["trip_id"],
         "split_across_days": form_values["split_across_days"],
         "per_day_files": form_values["per_day_files"],
+        "output_format": form_values["output_format"],
     }
     if form_values["start_time_local"].strip():
         params["start_time_local"] = form_values["start_time_local"].strip()
@@ -289,6 +300,9 @@ def _build_params(form_values: Dict[str, Any]) -> Dict[str, Any]:
         params["out_name"] = form_values["out_name"].strip()
     if form_values["profile"]:
         params["profile"] = form_values["profile"]
+    stops = [p.strip() for p in form_values.get("waypoints", "").split(";") if p.strip()]
+    if stops:
+        params["waypoints"] = stops
     return params
 
 
@@ -304,8 +318,100 @@ def _display_summary(tool_result: Dict[str, Any]) -> None:
         st.subheader("Event Summary")
         st.json(meta["events"])
 
+
+# Streamlit reruns this script on every interaction. What is costly to build (the pipeline, the
+# agent) is cached once per server process; what is costly to compute (a trip, a preview) is
+# cached per input.
+@st.cache_resource(show_spinner=False)
+def _generator():
+    # Imported on first use so the form renders before the pipeline (pandas etc.) loads.
+    from app.tools.fleet_tools import generate_trip
+    return generate_trip
+
+
+@st.cache_resource(show_spinner=False)
+def _agent():
+    from app.agents.main_agent import run_general_chat_agent
+    return run_general_chat_agent
+
+
+def _pin_start_time(params: Dict[str, Any]) -> Dict[str, Any]:
+    # A blank start time means "today 08:00" in the pipeline; resolve it before the cached call,
+    # or a result cached on an earlier day would be served with that day's timestamps.
+    if params.get("start_time_local"):
+        return params
+    from app.tools.fleet_tools import _parse_dt
+    return {**params, "start_time_local": _parse_dt(None).isoformat(sep=" ", timespec="minutes")}
+
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def _generate_direct(params: Dict[str, Any]) -> Dict[str, Any]:
+    # The params carry no seed, so every trip uses generate_trip's fixed default (42) and the
+    # same params give the same file: a repeat submission reuses it instead of regenerating.
+    return _generator()(**PlanRouteCSVParams(**params).model_dump())
+
+
+@st.cache_resource(show_spinner=False)
+def _catalog():
+    from app.tools.catalog import get_output_catalog
+    return get_output_catalog()
+
+
+def _latest_output(vehicle_id: Optional[str], trip_id: Optional[str]) -> Optional[str]:
+    # Indexed catalog lookups: this trip's newest file, else the newest file of any trip.
+    record = _catalog().latest(vehicle_id, trip_id) or _catalog().latest()
+    return record["path"] if record else None
+
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def _trip_preview(path: str, mtime_ns: int, n_points: int):
+    # Keyed on mtime too, so a file rewritten under the same name is read again.
+    from app.tools.preview import trip_preview
+    return trip_preview(Path(path), n_points)
+
+
+def _display_preview(path: Path) -> None:
+    try:
+        df = _trip_preview(str(path), path.stat().st_mtime_ns, UI_PREVIEW_POINTS)
+    except Exception as e:
+        st.info(f"No preview for {path.name}: {e}")
+        return
+    st.subheader("Preview")
+    st.caption(f"{len(df):,} of {df.attrs.get('rows', len(df)):,} rows, downsampled on speed (LTTB).")
+    st.map(df, latitude="lat", longitude="lon", size=20)
+    st.line_chart(df, x="timestamp", y="speed_kmph")
+
+
+def _display_download(path: Path) -> None:
+    size_mb = path.stat().st_size / 2**20
+    label = f"⬇️ Download {path.suffix.lstrip('.').upper()} ({size_mb:,.1f} MB)"
+    if FLEET_API_URL:
+        # The API sends the file from disk in chunks; none of it passes through this process.
+        st.link_button(label, f"{FLEET_API_URL.rstrip('/')}/files/{quote(path.name)}")
+    elif size_mb <= UI_DOWNLOAD_MAX_MB:
+        # download_button keeps the whole file in this process's memory, hence the size cap.
+        # on_click="ignore" spares the rerun a click would otherwise trigger.
+        with path.open("rb") as fh:
+            st.download_button(
+                label=label,
+                data=fh,
+                file_name=path.name,
+                mime=_MIME_TYPES.get(path.suffix.lstrip("."), "application/octet-stream"),
+                on_click="ignore",
+            )
+    else:
+        st.info(f"`{path}` is {size_mb:,.1f} MB, over UI_DOWNLOAD_MAX_MB ({UI_DOWNLOAD_MAX_MB:g} MB). "
+                "Set FLEET_API_URL to download it through the API, or copy it from the outputs directory.")
+
+
 # ----------------------------- Form UI -------------------------------------
 with st.form("telemetry_form"):
+    mode = st.radio(
+        "Mode",
+        options=["Direct (parameters only)", "Agent (natural-language prompt)"],
+        horizontal=True,
+        help="Direct mode runs the generator with the parameters below and skips the LLM entirely.",
+    )
     prompt = st.text_area(
         "Prompt",
         placeholder="Describe the telemetry you need (e.g., 'Kolkata → Patna, 6-hour duty, realistic idle times')...",
@@ -324,6 +430,12 @@ with st.form("telemetry_form"):
             ),
         )
 
+        waypoints = st.text_input(
+            "Stops on the way (optional)",
+            value="",
+            help="Places between Start and End, in order, separated by ';'. The vehicle stands at each stop.",
+        )
+
         col_d, col_e, col_f = st.columns(3)
         speed_profile = col_d.selectbox(
             "Speed profile",
@@ -357,18 +469,26 @@ with st.form("telemetry_form"):
         # Keep these two inputs to feed the tool; UI won’t show per-day files anyway.
         split_across_days = col_j.checkbox("Split across days", value=True)
         per_day_files = col_k.checkbox("Generate per-day files (tool may write them)", value=False)
+        output_format = col_k.selectbox(
+            "Output format",
+            options=list(_MIME_TYPES),
+            index=list(_MIME_TYPES).index(DEFAULT_OUTPUT_FORMAT) if DEFAULT_OUTPUT_FORMAT in _MIME_TYPES else 0,
+            help="Parquet and Feather/Arrow are compressed columnar files with compact dtypes.",
+        )
 
     submitted = st.form_submit_button("Generate telemetry", use_container_width=True)
 
 # -------------------------- Submit Handling ---------------------------------
 if submitted:
-    if not prompt.strip():
+    use_agent = mode.startswith("Agent")
+    if use_agent and not prompt.strip():
         st.error("Please describe what you need in the prompt before generating.")
         st.stop()
 
     form_values = {
         "start": start.strip() or "Kolkata",
         "end": end.strip() or "Patna",
+        "waypoints": waypoints,
         "profile": profile,
         "speed_profile": speed_profile,
         "driver_hours": driver_hours,
@@ -379,21 +499,41 @@ if submitted:
         "out_name": out_name,
         "split_across_days": split_across_days,
         "per_day_files": per_day_files,
+        "output_format": output_format,
     }
     params = _build_params(form_values)
 
+    if use_agent:
+        with st.spinner("Generating telemetry..."):
+            # one conversation per browser session, not one shared by every user of the app
+            session_id = st.session_state.setdefault("chat_session_id", uuid.uuid4().hex)
+            result = _agent()(prompt.strip(), session_id=session_id, params=params)
+    else:
+        # Same path as the API's POST /generate: validated params straight into the pipeline.
+        with st.spinner("Generating telemetry..."):
+            direct_params = _pin_start_time(params)
+            tool_json = _generate_direct(direct_params)
+            if not tool_json.get("ok") or not Path(tool_json.get("path") or "").exists():
+                # Don't keep failures, or a result whose file has since been deleted.
+                _generate_direct.clear(direct_params)
+                if tool_json.get("ok"):
+                    tool_json = _generate_direct(direct_params)
+        result = {"response": tool_json.get("message", ""), "tool_result": tool_json}
+
+    # Kept across reruns, so the results below survive later interactions with the page.
+    st.session_state["last_run"] = {"use_agent": use_agent, "params": params, "result": result}
+
+last_run = st.session_state.get("last_run")
+if last_run:
+    use_agent, params, result = last_run["use_agent"], last_run["params"], last_run["result"]
+
     # show last used params somewhere lightweight (not sidebar)
     with st.expander("Last used parameters", expanded=False):
         st.json(params)
 
-    request_text = f"{prompt.strip()}\n\nParams: {json.dumps(params)}"
-
-    with st.spinner("Generating telemetry..."):
-        result = run_general_chat_agent(request_text, session_id="streamlit-ui")
-
     # ---------------- Agent Response ----------------
     response_text = result.get("response") if isinstance(result, dict) else str(result)
-    st.subheader("Agent response")
+    st.subheader("Agent response" if use_agent else "Result")
     st.write(response_text)
 
     # ---------------- Unified Download Button ----------------
@@ -411,38 +551,45 @@ if submitted:
             if p.exists():
                 csv_file_path = p
             else:
-                st.warning(f"CSV path returned by tool not found on disk: {p}")
+                st.warning(f"File path returned by tool not found on disk: {p}")
         # Show summary if we have it
         try:
             _display_summary(tool_result)
         except Exception:
             pass
 
-    # 2) Fallback: newest CSV in OUTPUT_DIR
-    if csv_file_path is None:
-        try:
-            pat = str(Path(OUTPUT_DIR) / "*.csv")
-            candidates = glob.glob(pat)
-            if candidates:
-                newest = max(candidates, key=lambda x: Path(x).stat().st_mtime)
-                csv_file_path = Path(newest)
-                st.info("Tool JSON not found; offering the most recently created CSV in outputs.")
-            else:
-                st.info("No CSV found in outputs directory.")
-        except Exception as e:
-            st.warning(f"Could not scan outputs directory: {e}")
+    # Several tool calls in one turn (e.g. one per truck): list every file, the last is offered below
+    tool_results = (result.get("tool_results") if isinstance(result, dict) else None) or []
+    if len(tool_results) > 1:
+        st.subheader(f"{len(tool_results)} trips generated")
+        st.dataframe([{"ok": r.get("ok"), "message": r.get("message"), "path": r.get("path"),
+                       "rows": (r.get("meta") or {}).get("rows"),
+                       "distance_km": (r.get("meta") or {}).get("distance_km")} for r in tool_results])
 
-    # 3) If we found a CSV file, show the download button
+    # 2) Fallback: the newest catalogued output for these params' vehicle/trip, else any
+    if csv_file_path is None:
+        latest = _latest_output(params.get("vehicle_id"), params.get("trip_id"))
+        if latest:
+            csv_file_path = Path(latest)
+            st.info("Tool JSON not found; offering the most recently created file in the output catalog.")
+        else:
+            st.info("No output file found in the output catalog.")
+
+    # 3) If we found a file, offer it and preview it
     if csv_file_path and csv_file_path.exists():
-        with csv_file_path.open("rb") as fh:
-            st.download_button(
-                label="⬇️ Download CSV",
-                data=fh.read(),
-                file_name=csv_file_path.name,
-                mime="text/csv",
-            )
+        _display_download(csv_file_path)
+        _display_preview(csv_file_path)
     else:
-        st.info("No structured tool output was returned and no CSV file was located.")
+        st.info("No structured tool output was returned and no output file was located.")
+
+    # 4) With an API configured, also offer the trip as a stream: the browser downloads rows as they
+    #    are generated, and neither the API nor this process holds the whole file.
+    if FLEET_API_URL:
+        query = {k: v for k, v in params.items() if k not in ("out_name", "per_day_files", "output_format")}
+        st.link_button(
+            "⬇️ Stream CSV from the API",
+            f"{FLEET_API_URL.rstrip('/')}/generate/stream?{urlencode({**query, 'format': 'csv'}, doseq=True)}",
+        )
 
 # Note: no sidebar content — cleaner layout.
 # Outputs are still written to OUTPUT_DIR on disk, but we surface a single download button above.
@@ -0,0 +1,44 @@
+import os
+import tempfile
+
+# Settings are read when app.config is imported: point caches, outputs and routing at
+# throwaway, offline locations before any test module imports the app.
+_TMP = tempfile.mkdtemp(prefix="fleet-tests-")
+os.environ.setdefault("CACHE_DB_PATH", os.path.join(_TMP, "cache.sqlite"))
+os.environ.setdefault("OUTPUT_DIR", os.path.join(_TMP, "outputs"))
+os.environ.setdefault("OUTPUT_CATALOG_PATH", os.path.join(_TMP, "catalog.sqlite"))
+os.environ.setdefault("ROUTING_BACKEND", "stub")
+
+import pytest
+
+
+@pytest.fixture
+def fake_agent(monkeypatch):
+    """Build the agent around a scripted chat model and stand-in generation tools.
+
+    Returns `(setup, llm_calls)`: `setup(turns, route_tool, fleet_tool=None)` installs the
+    model's replies (AIMessages, cycled) and the tools; `llm_calls` counts model invocations.
+    """
+    from langchain_core.language_models.fake_chat_models import FakeMessagesListChatModel
+    from app.agents import main_agent
+    import app.tools.fleet_tools as fleet_tools
+
+    llm_calls = []
+
+    class ScriptedChatModel(FakeMessagesListChatModel):
+        def bind_tools(self, tools, **kwargs):
+            return self
+
+        def _generate(self, *args, **kwargs):
+            llm_calls.append(1)
+            return super()._generate(*args, **kwargs)
+
+    def setup(turns, route_tool, fleet_tool=None):
+        monkeypatch.setattr(main_agent, "get_llm", lambda: ScriptedChatModel(responses=turns))
+        monkeypatch.setattr(fleet_tools, "plan_route_to_csv", route_tool)
+        if fleet_tool is not None:
+            monkeypatch.setattr(fleet_tools, "plan_fleet_batch_to_csv", fleet_tool)
+        monkeypatch.setattr(main_agent, "_executor", None)
+
+    yield setup, llm_calls
+    main_agent._executor = None
@@ -0,0 +1,54 @@
+"""ParallelAgentExecutor: one turn's tool calls run concurrently and come back in call order."""
+import asyncio
+import json
+import threading
+import time
+import uuid
+
+from langchain_core.messages import AIMessage
+from langchain_core.tools import tool
+
+from app.agents import main_agent
+
+TRIPS = [("V1", 0.3), ("V2", 0.0), ("V3", 0.15)]   # (vehicle, delay): the first call finishes last
+
+
+def _turns():
+    calls = [{"name": "plan_route_to_csv", "id": f"call-{i}",
+              "args": {"start": "Kolkata", "end": "Durgapur", "vehicle_id": v, "delay_s": d}}
+             for i, (v, d) in enumerate(TRIPS)]
+    return [AIMessage(content="", tool_calls=calls), AIMessage(content="Three trips generated.")]
+
+
+def _route_tool(finished, barrier):
+    @tool("plan_route_to_csv")
+    def plan_route_to_csv(start: str, end: str, vehicle_id: str, delay_s: float) -> str:
+        """Stand-in for the generation tool."""
+        barrier.wait()            # times out unless all three calls are running at once
+        time.sleep(delay_s)
+        finished.append(vehicle_id)
+        return json.dumps({"ok": True, "message": "Trip generated", "path": f"outputs/{vehicle_id}.csv"})
+    return plan_route_to_csv
+
+
+def test_parallel_calls_keep_call_order(fake_agent):
+    setup, _ = fake_agent
+    finished = []
+    setup(_turns(), _route_tool(finished, threading.Barrier(len(TRIPS), timeout=5)))
+    result = main_agent.run_general_chat_agent("three trips", f"s-{uuid.uuid4().hex}")
+
+    assert finished == ["V2", "V3", "V1"]
+    assert [t["path"] for t in result["tool_results"]] == ["outputs/V1.csv", "outputs/V2.csv", "outputs/V3.csv"]
+    assert result["tool_result"]["path"] == "outputs/V3.csv"   # the model's last call, not the last to finish
+    assert isinstance(main_agent.get_agent_executor(), main_agent._parallel_executor_class())
+
+
+def test_async_parallel_calls_keep_call_order(fake_agent):
+    setup, _ = fake_agent
+    finished = []
+    # Sync tools run in worker threads under ainvoke, so the barrier still proves they overlap.
+    setup(_turns(), _route_tool(finished, threading.Barrier(len(TRIPS), timeout=5)))
+    result = asyncio.run(main_agent.arun_general_chat_agent("three trips", f"s-{uuid.uuid4().hex}"))
+
+    assert finished == ["V2", "V3", "V1"]
+    assert [t["path"] for t in result["tool_results"]] == ["outputs/V1.csv", "outputs/V2.csv", "outputs/V3.csv"]
@@ -0,0 +1,97 @@
+"""PersistentCache: TTL expiry, LRU and byte-bounded eviction, the memory tier and batch calls."""
+import time
+
+import pytest
+
+import app.tools.cache as cache_module
+from app.tools.cache import PersistentCache
+
+
+class _Clock:
+    """Stands in for the `time` module inside cache.py; `advance` moves wall-clock time on."""
+
+    def __init__(self):
+        self.offset = 0.0
+
+    def time(self) -> float:
+        return time.time() + self.offset
+
+    def advance(self, s: float) -> None:
+        self.offset += s
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = _Clock()
+    monkeypatch.setattr(cache_module, "time", c)
+    return c
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "cache.sqlite")
+
+
+@pytest.mark.parametrize("memory_entries", [0, 16])
+def test_entries_expire_after_ttl(path, clock, memory_entries):
+    c = PersistentCache(path, "t", ttl_s=60, max_entries=100, memory_entries=memory_entries)
+    c.set("a", b"1")
+    c.set("b", b"2", ttl_s=600)
+    clock.advance(59)
+    assert c.get("a") == b"1"
+    clock.advance(2)
+    assert c.get("a") is None
+    assert c.get("b") == b"2"
+    assert c.get_many(["a", "b"]) == {"b": b"2"}
+    assert [k for k, _, _ in c.items()] == ["b"]
+
+
+def test_least_recently_read_entries_are_evicted(path, clock):
+    c = PersistentCache(path, "t", ttl_s=3600, max_entries=3)
+    for k in "abc":
+        c.set(k, k.encode())
+        clock.advance(1)
+    assert c.get("a") == b"a"     # now more recent than b and c
+    clock.advance(1)
+    c.set("d", b"d")
+    assert c.get("b") is None
+    assert {k for k, _, _ in c.items()} == {"a", "c", "d"}
+    assert c.stats()["evictions"] == 1
+
+
+def test_byte_bound_evicts_oldest_first(path, clock):
+    c = PersistentCache(path, "t", ttl_s=3600, max_entries=100, memory_entries=16, max_bytes=250)
+    for k in "abcd":
+        c.set(k, k.encode() * 100)
+        clock.advance(1)
+    # a and b had to go to get back under 250 bytes, from memory as well as from disk
+    assert [c.get(k) is not None for k in "abcd"] == [False, False, True, True]
+    assert c.stats()["bytes"] == 200
+
+
+def test_namespaces_share_a_file_independently(path):
+    a = PersistentCache(path, "a", ttl_s=3600, max_entries=1)
+    b = PersistentCache(path, "b", ttl_s=3600, max_entries=1)
+    a.set("k", b"from a")
+    b.set("k", b"from b")
+    b.set("k2", b"evicts only b's k")
+    assert a.get("k") == b"from a"
+    assert b.get("k") is None
+    a.clear()
+    assert a.stats()["entries"] == 0 and b.stats()["entries"] == 1
+
+
+def test_values_survive_a_new_instance(path):
+    PersistentCache(path, "t", ttl_s=3600, max_entries=10).set("k", b"\x00\xffbytes")
+    c = PersistentCache(path, "t", ttl_s=3600, max_entries=10)
+    assert c.get("k") == b"\x00\xffbytes"
+    assert (c.stats()["hits"], c.stats()["misses"]) == (1, 0)
+
+
+def test_set_many_and_get_many(path):
+    c = PersistentCache(path, "t", ttl_s=3600, max_entries=2000)
+    c.set_many({f"k{i}": str(i).encode() for i in range(1200)})   # more keys than one SQL batch
+    found = c.get_many([f"k{i}" for i in range(0, 1300, 3)])
+    assert found == {f"k{i}": str(i).encode() for i in range(0, 1200, 3)}
+    st = c.stats()
+    assert (st["hits"], st["misses"]) == (400, 34)
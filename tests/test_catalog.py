@@ -0,0 +1,60 @@
+"""The output catalog: filters, ordering and the indexes behind them."""
+import sqlite3
+
+import pytest
+from sqlalchemy import text
+
+from app.tools.catalog import OutputCatalog
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    c = OutputCatalog(str(tmp_path / "catalog.sqlite"))
+    for i, (vehicle, trip, fmt) in enumerate([("V1", "t1", "csv"), ("V2", "t1", "parquet"),
+                                              ("V1", "t2", "csv"), ("V3", "t3", "arrow")]):
+        c.record(str(tmp_path / f"{vehicle}-{trip}.{fmt}"), vehicle, trip, "A", "B", "2026-10-17T08:00:00",
+                 "2026-10-17T14:00:00", 100 + i, 1000 + i, fmt, f"{i:064x}")
+    yield c
+    c.close()
+
+
+def test_filters_and_newest_first(catalog, tmp_path):
+    assert [r["vehicle_id"] for r in catalog.list(trip_id="t1")] == ["V2", "V1"]
+    assert [r["trip_id"] for r in catalog.list(format="csv")] == ["t2", "t1"]
+    assert catalog.count(vehicle_id="V1", format="csv") == 2
+    assert catalog.latest()["vehicle_id"] == "V3"
+    # rewriting a path replaces its record
+    catalog.record(str(tmp_path / "V1-t1.csv"), "V1", "t1", "A", "B", None, None, 7, 70, "csv", "f" * 64)
+    assert catalog.count() == 4
+    assert catalog.get("V1-t1.csv")["rows"] == 7
+    assert catalog.latest(trip_id="t1")["rows"] == 7
+
+
+def _plan(catalog, where: str) -> str:
+    with catalog._engine.connect() as conn:
+        rows = conn.execute(text(f"EXPLAIN QUERY PLAN SELECT * FROM outputs WHERE {where} "
+                                 "ORDER BY created_at DESC LIMIT 50")).fetchall()
+    return " ".join(str(r[-1]) for r in rows)
+
+
+@pytest.mark.parametrize("where, index", [
+    ("trip_id = 't1'", "ix_outputs_trip_created"),
+    ("format = 'csv'", "ix_outputs_format_created"),
+    ("vehicle_id = 'V1'", "ix_outputs_vehicle_created"),
+    ("vehicle_id = 'V1' AND trip_id = 't1'", "ix_outputs_vehicle_trip_created"),
+])
+def test_filtered_listings_use_an_index(catalog, where, index):
+    plan = _plan(catalog, where)
+    assert index in plan and "SCAN outputs" not in plan
+
+
+def test_existing_catalogs_gain_new_indexes(tmp_path):
+    path = str(tmp_path / "old.sqlite")
+    OutputCatalog(path).close()
+    with sqlite3.connect(path) as conn:
+        conn.execute("DROP INDEX ix_outputs_trip_created")
+        conn.execute("DROP INDEX ix_outputs_format_created")
+    c = OutputCatalog(path)
+    assert "ix_outputs_trip_created" in _plan(c, "trip_id = 't1'")
+    assert "ix_outputs_format_created" in _plan(c, "format = 'csv'")
+    c.close()
@@ -0,0 +1,52 @@
+"""Chunked resampling and simulation: the chunk size never changes the output."""
+import numpy as np
+import pytest
+
+from app.tools.columnar import Geometry, Telemetry
+from app.tools.geo_tools import _simulate_chunks, iter_resample, resample_arrays
+from app.tools.stages import stage_memo
+
+
+def _route(n: int = 3000) -> Geometry:
+    # Irregular vertex spacing (5 m to 400 m), so resample blocks and vertex blocks don't line up.
+    rng = np.random.default_rng(1)
+    step = rng.uniform(5.0, 400.0, n - 1) / 111_320.0
+    heading = np.cumsum(rng.normal(0.0, 0.2, n - 1))
+    lat = np.concatenate(([21.0], 21.0 + np.cumsum(step * np.cos(heading))))
+    lon = np.concatenate(([72.0], 72.0 + np.cumsum(step * np.sin(heading))))
+    return Geometry(lat, lon)
+
+
+def _run(chunk_points: int, stops=None) -> Telemetry:
+    stage_memo.clear()
+    chunks = list(_simulate_chunks(_route(), 10, "normal", 5, chunk_points, "numpy", stops, 300))
+    return Telemetry.concat([cols for cols, _ in chunks]), chunks[-1][1]
+
+
+@pytest.mark.parametrize("stops", [None, [700, 1900]])
+def test_chunk_size_does_not_change_output(stops):
+    ref_cols, ref_summary = _run(100_000, stops)
+    for chunk_points in (1, 7, 256, 2048):
+        cols, summary = _run(chunk_points, stops)
+        assert list(cols) == list(ref_cols)
+        for name in ref_cols:
+            assert cols[name].tobytes() == ref_cols[name].tobytes(), (chunk_points, name)
+        assert summary == ref_summary
+
+
+def test_memoized_blocks_replay_identically():
+    stage_memo.clear()
+    cold = Telemetry.concat([c for c, _ in _simulate_chunks(_route(), 10, "eco", 3, 256, "numpy")])
+    warm = Telemetry.concat([c for c, _ in _simulate_chunks(_route(), 10, "eco", 3, 256, "numpy")])
+    assert stage_memo.stats()["stages"]["resample"]["hits"] == 1
+    for name in cold:
+        assert cold[name].tobytes() == warm[name].tobytes()
+
+
+@pytest.mark.parametrize("chunk_vertices", [1, 2, 50, 4096])
+def test_iter_resample_matches_resample_arrays(chunk_vertices):
+    g = _route()
+    ref = resample_arrays(g.lat, g.lon, 100.0)
+    blocks = list(iter_resample(g, 100.0, chunk_vertices=chunk_vertices))
+    for got, want in zip((np.concatenate(b) for b in zip(*blocks)), ref):
+        assert got.tobytes() == want.tobytes()
@@ -0,0 +1,99 @@
+"""Columnar containers: polyline decoding and Telemetry's pandas/Arrow views."""
+import numpy as np
+import pandas as pd
+import polyline
+import pyarrow as pa
+import pytest
+
+from app.tools.columnar import EVENT_NAMES, Geometry, Telemetry, decode_polyline
+
+
+def _random_line(seed, n):
+    rng = np.random.default_rng(seed)
+    lat = 22.5 + np.cumsum(rng.normal(0, 0.01, n))
+    lon = 88.3 + np.cumsum(rng.normal(0, 0.01, n))
+    return list(zip(lat.round(6), lon.round(6)))
+
+
+@pytest.mark.parametrize("precision", [5, 6])
+@pytest.mark.parametrize("seed, n", [(0, 1), (1, 2), (2, 500), (3, 5000)])
+def test_decode_matches_polyline(seed, n, precision):
+    encoded = polyline.encode(_random_line(seed, n), precision=precision)
+    lat, lon = decode_polyline(encoded, precision)
+    expected = np.array(polyline.decode(encoded, precision=precision))
+    assert lat.dtype == lon.dtype == np.float64
+    np.testing.assert_array_equal(np.column_stack([lat, lon]), expected)
+
+
+def test_decode_edge_values():
+    # Large deltas (multi-group varints), negative coordinates and repeated points.
+    points = [(0.0, 0.0), (-89.99999, 179.99999), (89.99999, -179.99999), (89.99999, -179.99999), (0.00001, -0.00001)]
+    encoded = polyline.encode(points)
+    np.testing.assert_array_equal(np.column_stack(decode_polyline(encoded)), polyline.decode(encoded))
+    assert [len(a) for a in decode_polyline("")] == [0, 0]
+    assert Geometry.from_polyline(encoded).lat.tolist() == [p[0] for p in polyline.decode(encoded)]
+
+
+@pytest.mark.parametrize("bad", [
+    "_p~iF~ps|U_ulLnnqC_mqNvxq`",   # truncated: last value still has its continuation bit
+    "_p~iF~ps|U_ulL",               # odd number of values: a latitude without its longitude
+    "_p~iF ~ps|U",                  # space is below the encoding range
+    "_p~iF\x7f~ps|U",               # DEL is above it
+    "_p~iF~ps|Ué",             # not ASCII
+])
+def test_decode_malformed_raises(bad):
+    with pytest.raises(ValueError):
+        decode_polyline(bad)
+
+
+ROWS = [
+    {"ts_s": 1_790_000_000 + 10 * i, "lat": 22.5 + i * 1e-3, "lon": 88.3 - i * 1e-3, "speed_kmph": 40.5 + i,
+     "heading_deg": 90.25, "event": event, "fuel_l_cumulative": 0.01 * i}
+    for i, event in enumerate([None, "HarshAcceleration", None, "Overspeed", "Idle", "HarshBraking", None])
+]
+
+
+def test_to_pandas_round_trip():
+    t = Telemetry.from_rows(ROWS)
+    df = t.to_pandas()
+    assert list(df.columns) == list(ROWS[0])
+    assert isinstance(df["event"].dtype, pd.CategoricalDtype)
+    assert list(df["event"].cat.categories) == list(EVENT_NAMES[1:])
+    # No event is NaN, not a "None" category.
+    assert df["event"].isna().tolist() == [r["event"] is None for r in ROWS]
+    assert [None if pd.isna(e) else e for e in df["event"]] == [r["event"] for r in ROWS]
+    assert df["speed_kmph"].dtype == np.float32 and df["ts_s"].dtype == np.int64
+    for name in ("lat", "lon", "fuel_l_cumulative", "ts_s"):
+        assert df[name].tolist() == [r[name] for r in ROWS]
+    assert np.shares_memory(df["lat"].to_numpy(), t["lat"])
+
+    back = Telemetry({name: df[name].to_numpy() for name in df.columns if name != "event"})
+    back["event"] = np.array([None if pd.isna(e) else e for e in df["event"]], dtype=object)
+    for name in t:
+        np.testing.assert_array_equal(back[name], t[name])
+
+
+def test_to_arrow_round_trip():
+    t = Telemetry.from_rows(ROWS)
+    table = t.to_arrow()
+    assert table.column_names == list(ROWS[0])
+    event = table.column("event").combine_chunks()
+    assert pa.types.is_dictionary(event.type)
+    assert event.dictionary.to_pylist() == list(EVENT_NAMES[1:])
+    # No event is null, and the decoded values are the row names.
+    assert event.is_null().to_pylist() == [r["event"] is None for r in ROWS]
+    assert event.to_pylist() == [r["event"] for r in ROWS]
+    assert table.column("speed_kmph").type == pa.float32()
+    assert table.to_pylist() == [{**r, "speed_kmph": pytest.approx(r["speed_kmph"]),
+                                  "heading_deg": pytest.approx(r["heading_deg"])} for r in ROWS]
+    # pandas via Arrow gives the same frame as the direct view.
+    pd.testing.assert_frame_equal(table.to_pandas(), t.to_pandas(), check_categorical=False)
+
+
+def test_all_or_no_events():
+    quiet = Telemetry.from_rows([{**r, "event": None} for r in ROWS])
+    assert quiet.to_pandas()["event"].isna().all()
+    assert quiet.to_arrow().column("event").null_count == len(ROWS)
+    idle = Telemetry.from_rows([{**r, "event": "Idle"} for r in ROWS])
+    assert idle.to_arrow().column("event").to_pylist() == ["Idle"] * len(ROWS)
+    assert (idle.event_names() == "Idle").all()
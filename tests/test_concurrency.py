@@ -0,0 +1,99 @@
+"""SingleFlight, AsyncSingleFlight and RateLimiter."""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.tools.concurrency import AsyncSingleFlight, RateLimiter, SingleFlight
+
+
+def test_single_flight_coalesces_concurrent_calls():
+    flight, calls, release = SingleFlight(), [], threading.Event()
+
+    def work():
+        calls.append(1)
+        release.wait(5)
+        return "result"
+
+    with ThreadPoolExecutor(8) as ex:
+        futs = [ex.submit(flight.do, "k", work) for _ in range(8)]
+        while flight.coalesced < 7:
+            time.sleep(0.001)
+        release.set()
+        assert [f.result() for f in futs] == ["result"] * 8
+    assert len(calls) == 1
+    assert flight.in_flight() == 0
+    # a later call runs again: results are shared, not cached
+    assert flight.do("k", lambda: "again") == "again"
+
+
+def test_single_flight_shares_the_error():
+    flight, release = SingleFlight(), threading.Event()
+
+    def fail():
+        release.wait(5)
+        raise ValueError("boom")
+
+    with ThreadPoolExecutor(4) as ex:
+        futs = [ex.submit(flight.do, "k", fail) for _ in range(4)]
+        while flight.coalesced < 3:
+            time.sleep(0.001)
+        release.set()
+        for f in futs:
+            with pytest.raises(ValueError, match="boom"):
+                f.result()
+
+
+def test_single_flight_keys_are_independent():
+    flight = SingleFlight()
+    assert flight.do("a", lambda: 1) == 1
+    assert flight.do("b", lambda: 2) == 2
+    assert flight.coalesced == 0
+
+
+def test_async_single_flight_coalesces_and_shields():
+    flight, calls = AsyncSingleFlight(), []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return len(calls)
+
+    async def main():
+        tasks = [asyncio.ensure_future(flight.do("k", work)) for _ in range(5)]
+        await asyncio.sleep(0.01)
+        tasks[0].cancel()       # one impatient caller must not cancel the shared lookup
+        results = await asyncio.gather(*tasks[1:])
+        return results, await flight.do("k", work)
+
+    results, later = asyncio.run(main())
+    assert results == [1, 1, 1, 1]
+    assert flight.coalesced == 4
+    assert later == 2
+
+
+def test_rate_limiter_spaces_sync_and_async_callers():
+    limiter, stamps = RateLimiter(0.05), []
+
+    def sync_call():
+        limiter.acquire()
+        stamps.append(time.monotonic())
+
+    async def async_call():
+        await limiter.acquire_async()
+        stamps.append(time.monotonic())
+
+    threads = [threading.Thread(target=sync_call) for _ in range(3)]
+    for t in threads:
+        t.start()
+
+    async def main():
+        await asyncio.gather(*(async_call() for _ in range(3)))
+
+    asyncio.run(main())
+    for t in threads:
+        t.join()
+    stamps.sort()
+    assert all(b - a >= 0.04 for a, b in zip(stamps, stamps[1:]))
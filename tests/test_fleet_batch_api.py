@@ -0,0 +1,58 @@
+"""POST /generate/batch against the in-process OSRM stub."""
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.tools.routing_client import get_routing_client
+
+KOLKATA, DURGAPUR, ASANSOL = "22.5726,88.3639", "23.5204,87.3119", "23.6739,86.9524"
+
+
+def _trip(vehicle_id, trip_id, start=KOLKATA, end=DURGAPUR, **extra):
+    return {"vehicle_id": vehicle_id, "trip_id": trip_id, "start": start, "end": end, "sample_every_s": 60,
+            "start_time_local": "2026-10-17 08:00", **extra}
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(app) as c:
+        yield c
+
+
+def test_batch_reports_each_trip_and_totals(client):
+    calls = get_routing_client().latency_stats()["calls"]
+    trips = [
+        _trip("V1", "t1"),
+        _trip("V2", "t1"),                              # same trip ID and route: a file of its own
+        _trip("V3", "t2", end=ASANSOL, output_format="parquet"),
+        _trip("V4", "t3", out_name="../escape.csv"),    # rejected by the output path checks
+        _trip("V5", "t4", out_name="shared.csv"),
+        _trip("V6", "t5", out_name="shared.csv"),       # would overwrite V5's file
+    ]
+    r = client.post("/generate/batch", json={"trips": trips, "max_workers": 2})
+    assert r.status_code == 200
+    body = r.json()
+    assert body["ok"] is True
+    results = body["meta"]["trips"]
+    assert [(t["vehicle_id"], t["ok"]) for t in results] == [
+        ("V1", True), ("V2", True), ("V3", True), ("V4", False), ("V5", True), ("V6", False)]
+    assert "without directories" in results[3]["message"]
+    assert "already used by V5/t4" in results[5]["message"]
+
+    paths = [t["path"] for t in results if t["ok"]]
+    assert len(set(paths)) == len(paths)
+    assert paths[2].endswith(".parquet") and paths[3].endswith("shared.csv")
+    done = [t["meta"] for t in results if t["ok"]]
+    totals = body["meta"]["totals"]
+    assert (totals["trips"], totals["succeeded"], totals["failed"]) == (6, 4, 2)
+    assert totals["rows"] == sum(m["rows"] for m in done)
+    assert totals["distance_km"] == pytest.approx(sum(m["distance_km"] for m in done), abs=1e-3)
+    assert totals["fuel_used_l"] == pytest.approx(sum(m["fuel_used_l"] for m in done), abs=0.01)
+    # two distinct routes among six trips, each fetched once
+    assert (totals["unique_places"], totals["unique_routes"]) == (3, 2)
+    assert get_routing_client().latency_stats()["calls"] - calls <= 2
+
+
+def test_batch_validates_the_body(client):
+    r = client.post("/generate/batch", json={"trips": [{"vehicle_id": "V1", "start": KOLKATA}]})
+    assert r.status_code == 422
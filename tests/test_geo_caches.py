@@ -0,0 +1,163 @@
+"""Route, geocode and simulation caches in geo_tools, with their request coalescing."""
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+import app.tools.cache as cache_module
+import app.tools.geo_tools as geo
+from app.config import GEOCODE_NEGATIVE_TTL_S, ROUTE_CACHE_TTL_S
+from app.tools.columnar import Geometry, Telemetry
+from app.tools.concurrency import RateLimiter
+from app.tools.routing_client import get_routing_client
+from app.tools.stages import stage_memo
+
+
+class _Clock:
+    def __init__(self):
+        self.offset = 0.0
+
+    def time(self) -> float:
+        return time.time() + self.offset
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = _Clock()
+    monkeypatch.setattr(cache_module, "time", c)
+    return c
+
+
+def _backend_calls() -> int:
+    return get_routing_client().latency_stats()["calls"]
+
+
+def test_route_is_fetched_once_then_again_after_ttl(clock):
+    a, b = (20.1, 73.1), (20.4, 73.5)
+    before = _backend_calls()
+    first = geo.route_coords(a, b)
+    second = geo.route_coords(a, b)
+    assert _backend_calls() - before == 1
+    assert second["polyline"] == first["polyline"]
+    clock.offset += ROUTE_CACHE_TTL_S + 1
+    geo.route_coords(a, b)
+    assert _backend_calls() - before == 2
+
+
+class _FakeNominatim:
+    def __init__(self, answers, delay_s=0.0):
+        self.answers, self.delay_s, self.calls = answers, delay_s, []
+
+    def geocode(self, q, timeout=None):
+        self.calls.append(q)
+        time.sleep(self.delay_s)
+        hit = self.answers.get(q.strip().title())
+        return SimpleNamespace(latitude=hit[0], longitude=hit[1], address=hit[2]) if hit else None
+
+
+@pytest.fixture
+def nominatim(monkeypatch):
+    fake = _FakeNominatim({"Testville": (10.0, 20.0, "Testville, Nowhere")}, delay_s=0.1)
+    monkeypatch.setattr(geo, "_geocoder", fake)
+    monkeypatch.setattr(geo, "_nominatim_limiter", RateLimiter(0.0))
+    geo.geocode_cache.clear()
+    yield fake
+    geo.geocode_cache.clear()
+
+
+def test_concurrent_identical_geocodes_make_one_lookup(nominatim):
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(geo.geocode("  testville "))) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == [(10.0, 20.0, "Testville, Nowhere")] * 6
+    assert len(nominatim.calls) == 1
+    assert geo.geocode("TESTVILLE") == results[0]   # normalised query, served from the cache
+    assert len(nominatim.calls) == 1
+
+
+def test_failed_geocodes_are_cached_for_the_negative_ttl(nominatim, clock):
+    for _ in range(3):
+        with pytest.raises(ValueError, match="Could not geocode"):
+            geo.geocode("Atlantis")
+    assert nominatim.calls == ["Atlantis"]
+    clock.offset += GEOCODE_NEGATIVE_TTL_S + 1
+    with pytest.raises(ValueError):
+        geo.geocode("Atlantis")
+    assert nominatim.calls == ["Atlantis", "Atlantis"]
+
+
+def test_lat_lon_literals_need_no_lookup(nominatim):
+    assert geo.geocode("12.5, 77.25") == (12.5, 77.25, "12.5,77.25")
+    assert nominatim.calls == []
+
+
+def _route(km: int = 60) -> Geometry:
+    n = km + 1
+    return Geometry(np.full(n, 21.0), 72.0 + np.arange(n) / 103.9)
+
+
+@pytest.fixture
+def sim_runs(monkeypatch):
+    # Count the simulations that actually run (cache and flight followers don't).
+    runs = []
+    real = geo._simulate_chunks
+
+    def counting(*args, **kwargs):
+        runs.append(args[3])
+        yield from real(*args, **kwargs)
+
+    monkeypatch.setattr(geo, "_simulate_chunks", counting)
+    stage_memo.clear()
+    return runs
+
+
+def _columns(chunks) -> Telemetry:
+    return Telemetry.concat([cols for cols, _ in chunks])
+
+
+def test_seeded_simulation_is_replayed_from_the_cache(sim_runs):
+    first = _columns(geo.simulate_chunks(_route(), seed=9001, chunk_points=64))
+    stage_memo.clear()   # force the persistent tier
+    hits = geo.sim_cache.stats()["hits"]
+    second = _columns(geo.simulate_chunks(_route(), seed=9001, chunk_points=64))
+    assert sim_runs == [9001]
+    assert geo.sim_cache.stats()["hits"] == hits + 1
+    for name in first:
+        assert first[name].tobytes() == second[name].tobytes()
+
+
+def test_follower_waits_for_the_leader_and_replays(sim_runs):
+    leader = geo.simulate_chunks(_route(), seed=9002, chunk_points=16)
+    first = [next(leader)]            # the leader is now in flight
+    follower_out = []
+    follower = threading.Thread(target=lambda: follower_out.extend(
+        geo.simulate_chunks(_route(), seed=9002, chunk_points=16)))
+    follower.start()
+    time.sleep(0.05)
+    first.extend(leader)              # finish (and store) the shared run
+    follower.join(5)
+    assert not follower.is_alive()
+    assert sim_runs == [9002]
+    a, b = _columns(first), _columns(follower_out)
+    for name in a:
+        assert a[name].tobytes() == b[name].tobytes()
+
+
+def test_follower_stops_waiting_after_sim_flight_wait(sim_runs, monkeypatch):
+    monkeypatch.setattr(geo, "SIM_FLIGHT_WAIT_S", 0.1)
+    leader = geo.simulate_chunks(_route(), seed=9003, chunk_points=16)
+    first = [next(leader)]            # a stalled consumer holds the leader mid-run
+    t0 = time.perf_counter()
+    alone = list(geo.simulate_chunks(_route(), seed=9003, chunk_points=16))
+    waited = time.perf_counter() - t0
+    assert 0.1 <= waited < 2
+    assert sim_runs == [9003, 9003]
+    first.extend(leader)
+    a, b = _columns(first), _columns(alone)
+    for name in a:
+        assert a[name].tobytes() == b[name].tobytes()
@@ -0,0 +1,78 @@
+"""route_matrix against the in-process OSRM stub: blocking, cell cache and TooBig splits."""
+import asyncio
+
+import numpy as np
+import pytest
+from haversine import haversine
+
+from app.tools import osrm_stub
+from app.tools.matrix import aroute_matrix, route_matrix, table_cache
+from app.tools.routing_client import get_routing_client
+
+POINTS = [(22.5726 + 0.1 * i, 88.3639 - 0.13 * i) for i in range(8)]
+
+
+def _expected(origins, destinations):
+    km = np.array([[haversine(o, d) for d in destinations] for o in origins])
+    return km.astype(np.float32), (km / osrm_stub.STUB_SPEED_KMPH * 3600.0).astype(np.float32)
+
+
+def _calls():
+    return get_routing_client().latency_stats()["calls"]
+
+
+@pytest.fixture(autouse=True)
+def cold():
+    table_cache.clear()
+    yield
+    table_cache.clear()
+
+
+def test_blocks_of_max_size_and_cached_cells():
+    origins, destinations = POINTS[:7], POINTS[2:7]
+    calls = _calls()
+    m = route_matrix(origins, destinations, max_size=3)
+    # 7 rows x 5 columns in blocks of 3 x 3: 3 row blocks x 2 column blocks.
+    assert m["requests"] == 6 and _calls() - calls == 6 and m["cached_cells"] == 0
+    dist, dur = _expected(origins, destinations)
+    np.testing.assert_allclose(m["distance_km"], dist, rtol=1e-6)
+    np.testing.assert_allclose(m["duration_sec"], dur, rtol=1e-6)
+    assert m["distance_km"].dtype == np.float32 and m["distance_km"].shape == (7, 5)
+
+    # Warm: no requests at all; one new origin only asks for its own row.
+    again = route_matrix(origins, destinations, max_size=3)
+    assert again["requests"] == 0 and again["cached_cells"] == 35
+    np.testing.assert_array_equal(again["distance_km"], m["distance_km"])
+    grown = route_matrix(origins + [POINTS[7]], destinations, max_size=3)
+    assert grown["requests"] == 2 and grown["cached_cells"] == 35
+    np.testing.assert_allclose(grown["distance_km"][7], _expected([POINTS[7]], destinations)[0][0], rtol=1e-6)
+
+
+def test_square_matrix_defaults_to_origins():
+    m = route_matrix(POINTS[:4])
+    assert m["requests"] == 1 and m["distance_km"].shape == (4, 4)
+    np.testing.assert_array_equal(np.diag(m["distance_km"]), 0)
+
+
+def test_too_big_blocks_are_split(monkeypatch):
+    # A server whose table limit (3 x 3 cells) is below the client's block size.
+    monkeypatch.setattr(osrm_stub, "STUB_MAX_TABLE_SIZE", 3)
+    calls = _calls()
+    m = route_matrix(POINTS[:5], POINTS[3:8], max_size=5)
+    # 5x5 -> 2x5 + 3x5 (both too big) -> 2x2, 2x3, 3x2, 3x3: 1 + 2 + 4 requests.
+    assert m["requests"] == 7 and _calls() - calls == 7
+    np.testing.assert_allclose(m["distance_km"], _expected(POINTS[:5], POINTS[3:8])[0], rtol=1e-6)
+    assert not np.isnan(m["duration_sec"]).any()
+
+
+def test_async_matches_sync_and_shares_the_cache(monkeypatch):
+    monkeypatch.setattr(osrm_stub, "STUB_MAX_TABLE_SIZE", 3)
+    m = asyncio.run(aroute_matrix(POINTS[:5], POINTS[3:8], max_size=5))
+    assert m["requests"] == 7
+    np.testing.assert_allclose(m["distance_km"], _expected(POINTS[:5], POINTS[3:8])[0], rtol=1e-6)
+    assert route_matrix(POINTS[:5], POINTS[3:8], max_size=5)["requests"] == 0
+
+
+def test_server_errors_raise():
+    with pytest.raises(ValueError, match="OSRM error"):
+        route_matrix([(95.0, 88.0)], POINTS[:1])   # latitude out of range is an InvalidQuery
@@ -0,0 +1,97 @@
+"""The opt-in prompt cache: a repeated context-free prompt replays its tool calls without the LLM."""
+import asyncio
+import json
+import uuid
+
+import pytest
+from langchain_core.messages import AIMessage
+from langchain_core.tools import tool
+
+from app.agents import main_agent, prompt_cache
+
+CALL = {"start": "Kolkata", "end": "Durgapur", "vehicle_id": "V1", "trip_id": "t1"}
+
+
+def _turns(args=CALL):
+    return [AIMessage(content="", tool_calls=[{"name": "plan_route_to_csv", "args": args, "id": "call-1"}]),
+            AIMessage(content="Done: outputs/V1-t1.csv")]
+
+
+def _route_tool(invocations, ok=True):
+    @tool("plan_route_to_csv")
+    def plan_route_to_csv(start: str, end: str, vehicle_id: str, trip_id: str) -> str:
+        """Stand-in for the generation tool."""
+        invocations.append((start, end, vehicle_id, trip_id))
+        if not ok:
+            return json.dumps({"ok": False, "message": "Tool error: geocoder unavailable"})
+        return json.dumps({"ok": True, "message": "Trip generated", "path": f"outputs/{vehicle_id}-{trip_id}.csv",
+                           "meta": {"rows": 12, "distance_km": 170.2, "days": 1, "fuel_used_l": 14.1}})
+    return plan_route_to_csv
+
+
+@pytest.fixture
+def cache_on(monkeypatch):
+    monkeypatch.setattr(prompt_cache, "PROMPT_CACHE_MAX_ENTRIES", 8)
+    prompt_cache.response_cache.clear()
+    yield
+    prompt_cache.response_cache.clear()
+
+
+def _session():
+    return f"s-{uuid.uuid4().hex}"
+
+
+def test_repeat_prompt_replays_without_llm(fake_agent, cache_on):
+    setup, llm_calls = fake_agent
+    invocations = []
+    setup(_turns(), _route_tool(invocations))
+
+    first = main_agent.run_general_chat_agent("Generate a trip from Kolkata to Durgapur", _session())
+    assert len(llm_calls) == 2 and first["usage"]["prompt_cache"] == "miss"
+    assert first["tool_result"]["path"] == "outputs/V1-t1.csv"
+
+    # Case, spacing and trailing punctuation don't matter; the tool runs again, the LLM doesn't.
+    session = _session()
+    again = main_agent.run_general_chat_agent("generate a trip  from Kolkata to Durgapur.", session)
+    assert len(llm_calls) == 2
+    assert again["usage"]["prompt_cache"] == "hit" and again["usage"]["llm_calls"] == 0
+    assert invocations == [("Kolkata", "Durgapur", "V1", "t1")] * 2
+    assert again["tool_results"] == [first["tool_result"]]
+    assert "outputs/V1-t1.csv" in again["response"]
+    # The replayed turn is in the session history like an agent turn would be.
+    assert [m.type for m in main_agent._get_history(session).messages] == ["human", "ai"]
+
+
+def test_async_replay_without_llm(fake_agent, cache_on):
+    setup, llm_calls = fake_agent
+    invocations = []
+    setup(_turns(), _route_tool(invocations))
+
+    asyncio.run(main_agent.arun_general_chat_agent("async trip please", _session()))
+    calls = len(llm_calls)
+    again = asyncio.run(main_agent.arun_general_chat_agent("Async trip please!", _session()))
+    assert len(llm_calls) == calls
+    assert again["usage"]["prompt_cache"] == "hit" and len(invocations) == 2
+
+
+def test_failed_or_contextual_turns_are_not_cached(fake_agent, cache_on):
+    setup, llm_calls = fake_agent
+    setup(_turns(), _route_tool([], ok=False))
+    main_agent.run_general_chat_agent("trip that fails", _session())
+    assert prompt_cache.get(prompt_cache.prompt_cache_key("trip that fails")) is None
+
+    # A session with history depends on that context: neither looked up nor stored.
+    setup(_turns(), _route_tool([]))
+    session = _session()
+    main_agent.run_general_chat_agent("hello", session)
+    calls = len(llm_calls)
+    result = main_agent.run_general_chat_agent("hello", session)
+    assert len(llm_calls) == calls + 2 and "prompt_cache" not in result["usage"]
+
+
+def test_disabled_by_default(fake_agent):
+    setup, llm_calls = fake_agent
+    setup(_turns(), _route_tool([]))
+    for _ in range(2):
+        assert "prompt_cache" not in main_agent.run_general_chat_agent("same prompt", _session())["usage"]
+    assert len(llm_calls) == 4
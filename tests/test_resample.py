@@ -0,0 +1,72 @@
+"""`resample_arrays` against the original per-segment resampling loop it replaced."""
+import numpy as np
+import pytest
+from haversine import Unit, haversine
+
+from app.tools.geo_tools import _bearing, resample_arrays, resample_by_distance
+
+
+def _reference(points, step_m=100.0):
+    # The original resample_by_distance loop, kept verbatim as the reference.
+    out = [points[0]]
+    carry = 0.0
+    for i in range(len(points) - 1):
+        A, B = points[i], points[i + 1]
+        seg = haversine((A["lat"], A["lon"]), (B["lat"], B["lon"]), unit=Unit.METERS)
+        if seg == 0:
+            continue
+        cursor = carry
+        while cursor + step_m <= seg:
+            t = (cursor + step_m) / seg
+            out.append({"lat": A["lat"] + (B["lat"] - A["lat"]) * t, "lon": A["lon"] + (B["lon"] - A["lon"]) * t})
+            cursor += step_m
+        carry = seg - cursor
+    if out[-1] != points[-1]:
+        out.append(points[-1])
+    return out
+
+
+def _walk(seed: int, n: int, sigma: float) -> list:
+    rng = np.random.default_rng(seed)
+    lat = 21.0 + np.cumsum(rng.normal(0.0, sigma, n))
+    lon = 72.0 + np.cumsum(rng.normal(0.0, sigma, n))
+    lat[5:8], lon[5:8] = lat[5], lon[5]   # repeated vertices: zero-length segments
+    return [{"lat": a, "lon": b} for a, b in zip(lat.tolist(), lon.tolist())]
+
+
+GEOMETRIES = {
+    **{f"walk-{seed}": _walk(seed, 300, 0.003) for seed in range(10)},
+    "short-segments": _walk(42, 500, 0.0002),   # mostly shorter than one step
+    "long-segments": _walk(7, 20, 0.05),
+    "straight": [{"lat": 22.5, "lon": 88.3}, {"lat": 25.6, "lon": 85.1}],
+    "exact-steps": [{"lat": 0.0, "lon": 0.0}, {"lat": 0.0, "lon": 0.0089932}, {"lat": 0.0, "lon": 0.0179864}],
+    "single-point": [{"lat": 21.0, "lon": 72.0}],
+    "same-point": [{"lat": 21.0, "lon": 72.0}, {"lat": 21.0, "lon": 72.0}],
+}
+
+
+@pytest.mark.parametrize("name", sorted(GEOMETRIES))
+@pytest.mark.parametrize("step_m", [100.0, 37.5])
+def test_matches_reference_loop_at_written_precision(name, step_m):
+    points = GEOMETRIES[name]
+    ref = _reference(points, step_m)
+    lat, lon, heading = resample_arrays([p["lat"] for p in points], [p["lon"] for p in points], step_m)
+    assert len(lat) == len(ref)
+    ref_lat = np.array([p["lat"] for p in ref])
+    ref_lon = np.array([p["lon"] for p in ref])
+    np.testing.assert_array_equal(np.round(lat, 6), np.round(ref_lat, 6))
+    np.testing.assert_array_equal(np.round(lon, 6), np.round(ref_lon, 6))
+    np.testing.assert_allclose(lat, ref_lat, rtol=0, atol=1e-12)
+    np.testing.assert_allclose(lon, ref_lon, rtol=0, atol=1e-12)
+    # The reference simulator's headings: the first point reuses the first segment.
+    ref_heading = [_bearing(ref[max(0, i - 1)], ref[max(1, i)]) if len(ref) > 1 else 0.0
+                   for i in range(len(ref))]
+    np.testing.assert_array_equal(np.round(heading, 1), np.round(ref_heading, 1))
+
+
+def test_resample_by_distance_keeps_its_shape():
+    points = GEOMETRIES["walk-0"]
+    out = resample_by_distance(points)
+    assert out[0] == points[0] and out[-1] == points[-1]
+    assert all(set(p) == {"lat", "lon"} and isinstance(p["lat"], float) for p in out)
+    assert len(out) == len(_reference(points))
@@ -0,0 +1,41 @@
+"""The pooled routing client against the in-process OSRM stub."""
+import asyncio
+
+import pytest
+
+from app.tools.osrm_stub import StubOSRMServer
+from app.tools.routing_client import RoutingClient
+
+A, B = (21.0, 72.0), (21.3, 72.4)
+
+
+@pytest.fixture
+def client():
+    with StubOSRMServer() as base_url:
+        c = RoutingClient(base_url, backend="stub", retries=0)
+        yield c
+        c.close()
+
+
+def test_aroute_works_from_separate_event_loops(client):
+    # Each asyncio.run is a new loop; the async pool must not stay bound to the first one.
+    first = asyncio.run(client.aroute([A, B]))
+    second = asyncio.run(client.aroute([A, B]))
+    assert first["code"] == second["code"] == "Ok"
+    assert first["routes"][0]["geometry"] == second["routes"][0]["geometry"]
+    assert client.latency_stats()["calls"] == 2
+
+
+def test_sync_and_async_calls_agree(client):
+    async def both():
+        return await asyncio.gather(client.aroute([A, B]), client.atable([A, B]))
+
+    route, table = asyncio.run(both())
+    assert route == client.route([A, B])
+    assert table == client.table([A, B])
+
+
+def test_aclose_from_a_later_loop(client):
+    asyncio.run(client.aroute([A, B]))
+    asyncio.run(client.aclose())
+    assert asyncio.run(client.aroute([A, B]))["code"] == "Ok"
@@ -0,0 +1,143 @@
+"""The closed-form day scheduler against the per-row loops it replaced."""
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from app.tools.fleet_tools import _duty_timestamps, _parse_duty_windows, _schedule_frame
+
+
+def _reference_days(n, start_time, driver_hours, sample_every_s):
+    # The original _schedule_across_days loop (timestamps and drive_day only).
+    sec_per_day = int(driver_hours * 3600)
+    cur = start_time
+    duty_end = cur + timedelta(seconds=sec_per_day)
+    ts, days = [], []
+    remaining_today, day = sec_per_day, 1
+    for _ in range(n):
+        if remaining_today <= 0:
+            cur = (cur + timedelta(days=1)).replace(hour=start_time.hour, minute=start_time.minute,
+                                                    second=0, microsecond=0)
+            duty_end = cur + timedelta(seconds=sec_per_day)
+            remaining_today = sec_per_day
+            day += 1
+        ts.append(cur)
+        days.append(day)
+        cur = cur + timedelta(seconds=sample_every_s)
+        remaining_today -= sample_every_s
+        if cur > duty_end and remaining_today < 0:
+            cur = duty_end
+    return ts, days
+
+
+def _reference_windows(n, start_time, windows, sample_every_s):
+    # Row by row: each day runs every window in turn, one row per sample slot; day 1 starts
+    # at the first slot not before start_time.
+    midnight = start_time.replace(hour=0, minute=0, second=0, microsecond=0)
+    ts, days, day = [], [], 0
+    while len(ts) < n:
+        for ws, we in windows:
+            t = ws
+            while t < we and len(ts) < n:
+                at = midnight + timedelta(days=day, seconds=t)
+                if at >= start_time:
+                    ts.append(at)
+                t += sample_every_s
+        day += 1
+    first = (ts[0].date() - start_time.date()).days if ts else 0
+    days = [(t.date() - start_time.date()).days - first + 1 for t in ts]
+    return ts, days
+
+
+def _check(got, want):
+    ts, day = got
+    want_ts, want_day = want
+    np.testing.assert_array_equal(ts, np.array(want_ts, dtype="datetime64[ns]"))
+    assert day.tolist() == want_day
+
+
+@pytest.mark.parametrize("start, hours, step", [
+    ("2026-10-17 08:00", 6.0, 10),
+    ("2026-10-17 08:00:37", 6.0, 7),       # seconds are dropped after day 1
+    ("2026-10-17 20:00", 6.0, 10),         # the shift crosses midnight
+    ("2026-10-17 23:59:50", 2.5, 30),
+    ("2026-10-17 06:15", 0.75, 60),        # budget isn't a multiple of the step
+    ("2026-10-17 12:00", 23.9, 600),
+    ("2026-12-31 22:00", 4.0, 45),         # year rollover
+])
+@pytest.mark.parametrize("row_offset", [0, 1234])
+def test_driver_hours_match_reference_loop(start, hours, step, row_offset):
+    start_dt = datetime.fromisoformat(start)
+    n = 5000
+    want_ts, want_day = _reference_days(row_offset + n, start_dt, hours, step)
+    got = _duty_timestamps(n, start_dt, hours, step, None, row_offset)
+    _check(got, (want_ts[row_offset:], want_day[row_offset:]))
+    assert got[1][-1] > 1
+
+
+def test_random_schedules_match_reference_loop():
+    rng = np.random.default_rng(0)
+    for _ in range(100):
+        start_dt = datetime(2026, 3, 1) + timedelta(seconds=int(rng.integers(0, 86400 * 30)))
+        hours = float(rng.choice([0.5, 1.0, 6.0, 8.25, 13.0, 20.0]))
+        step = int(rng.choice([1, 5, 10, 17, 60]))
+        n = int(rng.integers(1, 3000))
+        _check(_duty_timestamps(n, start_dt, hours, step), _reference_days(n, start_dt, hours, step))
+
+
+@pytest.mark.parametrize("start", ["2026-10-17 00:00", "2026-10-17 07:00", "2026-10-17 10:03:20",
+                                   "2026-10-17 12:30", "2026-10-17 18:00"])
+@pytest.mark.parametrize("windows", [
+    ["08:00-12:00", "13:00-17:00"],
+    ["13:00-17:00", "06:00-10:00"],      # given out of order
+    ["00:00-02:00", "22:00-24:00"],      # a night shift split at midnight
+    ["09:15-09:16"],
+])
+@pytest.mark.parametrize("step", [10, 7, 3600])
+def test_duty_windows_match_reference_loop(start, windows, step):
+    start_dt = datetime.fromisoformat(start)
+    parsed = _parse_duty_windows(windows)
+    n = 4000
+    want_ts, want_day = _reference_windows(n, start_dt, parsed, step)
+    _check(_duty_timestamps(n, start_dt, 6.0, step, parsed), (want_ts, want_day))
+    # a chunk of the trip schedules the same as the matching slice of the whole
+    _check(_duty_timestamps(100, start_dt, 6.0, step, parsed, 1500),
+           (want_ts[1500:1600], want_day[1500:1600]))
+
+
+@pytest.mark.parametrize("windows", [
+    ["22:00-02:00"],                     # crosses midnight: split it into two windows
+    ["12:00-08:00"],
+    ["08:00-08:00"],
+    ["08:00-12:00", "11:00-13:00"],      # overlapping
+    ["08:00-24:30"],
+    ["8am-noon"],
+    ["08:00"],
+    ["08:00-12:00:00"],
+    [""],
+])
+def test_bad_duty_windows_are_rejected(windows):
+    with pytest.raises(ValueError):
+        _parse_duty_windows(windows)
+
+
+def test_no_duty_windows():
+    assert _parse_duty_windows(None) is None
+    assert _parse_duty_windows([]) is None
+
+
+def test_non_positive_driver_hours_rejected():
+    with pytest.raises(ValueError):
+        _duty_timestamps(10, datetime(2026, 10, 17, 8), 0.0, 10)
+
+
+def test_legacy_single_window_matches_reference():
+    # split_across_days=False: start + ts_s, truncated to driver_hours, all on day 1.
+    start_dt = datetime(2026, 10, 17, 8, 0, 15)
+    ts_s = np.arange(0, 40_000, 10, dtype=np.int32)
+    df = _schedule_frame({"ts_s": ts_s, "speed_kmph": np.zeros(len(ts_s))}, start_dt, 6.0, 10,
+                         split_across_days=False)
+    want = [start_dt + timedelta(seconds=int(t)) for t in ts_s]
+    want = [t for t in want if t <= start_dt + timedelta(hours=6.0)]
+    np.testing.assert_array_equal(df["timestamp"].to_numpy(), np.array(want, dtype="datetime64[ns]"))
+    assert (df["drive_day"] == 1).all()
@@ -0,0 +1,94 @@
+"""SessionStore compaction racing with turns appended by other threads."""
+import re
+import threading
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from app.agents.session_store import SessionStore
+
+
+def _turn(i: int):
+    return [HumanMessage(content=f"question {i} " + "x" * 40), AIMessage(content=f"answer {i} " + "y" * 40)]
+
+
+def _turn_no(message):
+    m = re.match(r"(?:question|answer) (\d+) ", message.content)
+    return int(m.group(1)) if m else None
+
+
+def _fill(store: SessionStore, session_id: str, turns: int):
+    history = store.get(session_id)
+    for i in range(turns):
+        history.add_messages(_turn(i))
+    return history
+
+
+def test_turns_appended_during_compaction_are_kept():
+    entered, release = threading.Event(), threading.Event()
+    summarized = []
+
+    def summarize(messages):
+        summarized.append(len(messages))
+        entered.set()
+        release.wait(5)
+        return "earlier turns"
+
+    store = SessionStore(ttl_s=3600, max_sessions=10, max_tokens=300, summarize=summarize)
+    history = _fill(store, "s", 20)
+    compactions = [threading.Thread(target=store.compact, args=("s",)) for _ in range(2)]
+    for t in compactions:
+        t.start()
+    entered.wait(5)
+    # Turns finishing while the summary is being written, from several threads.
+    writers = [threading.Thread(target=history.add_messages, args=(_turn(i),)) for i in range(100, 110)]
+    for t in writers:
+        t.start()
+    for t in writers:
+        t.join()
+    release.set()
+    for t in compactions:
+        t.join(5)
+
+    messages = history.messages
+    summaries = [m for m in messages if m.content.startswith("Summary of our earlier conversation")]
+    assert len(summaries) == 1 and messages[0] is summaries[0]
+    assert store.stats()["summaries"] == 1
+    numbers = [_turn_no(m) for m in messages[2:]]
+    assert None not in numbers
+    assert sorted(n for n in numbers if n >= 100) == [n for n in range(100, 110) for _ in (0, 1)]
+    # what was kept of the original turns is contiguous and ends with the last of them
+    kept = [n for n in numbers if n < 100]
+    assert kept == sorted(kept) and kept[-1] == 19 and set(kept) == set(range(kept[0], 20))
+    assert store.stats()["trimmed_messages"] == summarized[0]
+
+
+def test_trimming_without_a_summarizer_keeps_whole_recent_turns():
+    store = SessionStore(ttl_s=3600, max_sessions=10, max_tokens=300)
+    history = _fill(store, "s", 20)
+    store.compact("s")
+    messages = history.messages
+    assert isinstance(messages[0], HumanMessage)
+    assert messages[-1].content.startswith("answer 19")
+    assert store.stats()["trimmed_messages"] == 40 - len(messages)
+    store.compact("s")   # already fits: a no-op
+    assert history.messages == messages
+
+
+def test_compacting_unknown_or_small_sessions_is_a_no_op():
+    store = SessionStore(ttl_s=3600, max_sessions=10, max_tokens=10_000, summarize=lambda m: 1 / 0)
+    store.compact("missing")
+    history = _fill(store, "s", 3)
+    store.compact("s")
+    assert len(history.messages) == 6
+
+
+def test_sessions_are_bounded_and_independent():
+    store = SessionStore(ttl_s=3600, max_sessions=2, max_tokens=10_000)
+    _fill(store, "a", 1)
+    _fill(store, "b", 2)
+    store.get("a")           # a is now the most recently used
+    _fill(store, "c", 1)
+    stats = store.stats()
+    assert (stats["sessions"], stats["evicted"]) == (2, 1)
+    assert len(store.get("a").messages) == 2
+    assert store.get("b").messages == []   # evicted, so a fresh history
@@ -0,0 +1,57 @@
+"""The numpy engine (`sim_engine`) against the reference per-point loop in `geo_tools.simulate`.
+
+The engines draw their random numbers differently, so rows don't match one
+for one; over several seeds their row counts, speeds, fuel and event counts
+must agree within a few percent for every speed profile.
+"""
+import numpy as np
+import pytest
+
+from app.tools.columnar import Geometry
+from app.tools.geo_tools import simulate
+
+SEEDS = range(8)
+
+
+def _route(km: float = 200.0) -> Geometry:
+    # ~1 km segments wandering east, like the OSRM stub's straight lines but with turns.
+    n = int(km)
+    rng = np.random.default_rng(0)
+    heading = np.radians(90.0 + np.cumsum(rng.normal(0.0, 4.0, n)).clip(-60.0, 60.0))
+    lat = np.concatenate(([21.0], 21.0 + np.cumsum(np.cos(heading)) / 111.32))
+    lon = np.concatenate(([72.0], 72.0 + np.cumsum(np.sin(heading) / (111.32 * np.cos(np.radians(lat[:-1]))))))
+    return Geometry(lat, lon)
+
+
+def _totals(engine: str, speed_profile: str) -> dict:
+    rows, speed_sum, fuel, events = 0, 0.0, 0.0, {}
+    for seed in SEEDS:
+        sim = simulate(_route(), sample_every_s=10, speed_profile=speed_profile, seed=seed, engine=engine)
+        telemetry = sim["telemetry"]
+        speeds = [r["speed_kmph"] for r in telemetry] if engine == "python" else telemetry["speed_kmph"]
+        rows += len(speeds)
+        speed_sum += float(np.sum(speeds))
+        fuel += sim["summary"]["fuel_used_l"]
+        for name, count in sim["summary"]["events"].items():
+            events[name] = events.get(name, 0) + count
+    return {"rows": rows, "mean_speed": speed_sum / rows, "fuel": fuel, "events": events}
+
+
+@pytest.mark.parametrize("speed_profile", ["eco", "normal", "aggressive"])
+def test_numpy_engine_matches_reference(speed_profile):
+    ref = _totals("python", speed_profile)
+    new = _totals("numpy", speed_profile)
+    assert new["rows"] == pytest.approx(ref["rows"], rel=0.03)
+    assert new["mean_speed"] == pytest.approx(ref["mean_speed"], rel=0.04)
+    assert new["fuel"] == pytest.approx(ref["fuel"], rel=0.03)
+    assert set(new["events"]) == set(ref["events"])
+    for name, count in ref["events"].items():
+        assert new["events"][name] == pytest.approx(count, rel=0.15), name
+
+
+def test_numpy_engine_is_deterministic_per_seed():
+    a = simulate(_route(50), sample_every_s=10, seed=7, engine="numpy")
+    b = simulate(_route(50), sample_every_s=10, seed=7, engine="numpy")
+    for name in a["telemetry"]:
+        np.testing.assert_array_equal(a["telemetry"][name], b["telemetry"][name])
+    assert a["summary"] == b["summary"]
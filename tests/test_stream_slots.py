@@ -0,0 +1,76 @@
+"""Streamed trips hold an in-flight slot until the response ends, however it ends."""
+import asyncio
+
+import pytest
+
+from app import main
+from app.models.schemas import PlanRouteCSVParams
+
+PARAMS = PlanRouteCSVParams(start="22.5726,88.3639", end="23.5204,87.3119", sample_every_s=60,
+                            start_time_local="2026-10-17 08:00")
+
+
+def _scope(spec_version):
+    return {"type": "http", "asgi": {"version": "3.0", "spec_version": spec_version}, "method": "POST",
+            "path": "/generate/stream", "headers": []}
+
+
+async def _disconnected():
+    return {"type": "http.disconnect"}
+
+
+async def _serve(spec_version, send):
+    response = await main._stream_trip(PARAMS, "csv")
+    assert main._inflight["active"] == 1
+    try:
+        await response(_scope(spec_version), _disconnected, send)
+    except Exception:
+        pass
+    return main._inflight["active"]
+
+
+@pytest.fixture(autouse=True)
+def idle():
+    assert main._inflight["active"] == 0
+    yield
+    main._inflight["active"] = 0
+
+
+def test_slot_released_after_full_body():
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    async def serve():
+        response = await main._stream_trip(PARAMS, "csv")
+        await response(_scope("2.4"), _disconnected, send)
+
+    asyncio.run(serve())
+    assert sent[-1] == {"type": "http.response.body", "body": b"", "more_body": False}
+    assert main._inflight["active"] == 0
+
+
+def test_slot_released_when_client_leaves_before_body():
+    # The disconnect listener wins before the body generator is ever started.
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    assert asyncio.run(_serve("2.0", send)) == 0
+    assert not any(m["type"] == "http.response.body" and m.get("body") for m in sent)
+
+
+def test_slot_released_when_first_send_fails():
+    async def send(message):
+        raise OSError("connection reset")
+
+    assert asyncio.run(_serve("2.4", send)) == 0
+
+
+def test_release_is_idempotent():
+    slot = main._StreamSlot()
+    slot.release()
+    slot.release()
+    assert main._inflight["active"] == 0